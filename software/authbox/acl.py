@@ -0,0 +1,237 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Local, offline list of who may use which tools.
+
+The list is a compact file that's memory-mapped, so lookups are a hash and a
+probe or two regardless of how many members there are, and only the pages
+touched are ever read.  Build one from a text file with
+
+    python -m authbox.acl members.txt members.acl
+
+where each line is a badge id optionally followed by a comma-separated list of
+tool names (as in [auth] tool); a badge with no tools may use all of them.
+Lines starting with # are ignored, so a plain authorized.txt works as-is.
+
+File layout (little-endian):
+  header: magic, slot count (a power of 2), record count, tool table length
+  tool table: newline-separated names, padded to 8 bytes; bit i is tool i
+  slots: (key, tool mask) pairs of uint64, an open-addressing hash table keyed
+    by the first 8 bytes of sha256(badge id); key 0 marks an empty slot.
+"""
+
+from __future__ import print_function
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+MAGIC = b"AUTHACL1"
+HEADER = struct.Struct("<8sIII4x")
+SLOT = struct.Struct("<QQ")
+MAX_TOOLS = 64
+# Badges listed without tools; also matches tools not in the table.
+ALL_TOOLS = (1 << 64) - 1
+
+
+def badge_key(badge_id):
+    if not isinstance(badge_id, bytes):
+        badge_id = badge_id.encode("utf-8")
+    key = struct.unpack_from("<Q", hashlib.sha256(badge_id).digest())[0]
+    # 0 means an empty slot.
+    return key or 1
+
+
+def build(path, entries):
+    """Writes an ACL file from (badge_id, tool names) pairs.
+
+    An empty list of tools means all tools.  Repeated badges get the union of
+    their tools.  The file is replaced atomically.
+    """
+    tools = []
+    tool_bits = {}
+    masks = {}
+    for badge_id, badge_tools in entries:
+        mask = 0
+        for tool in badge_tools:
+            if tool not in tool_bits:
+                if len(tools) == MAX_TOOLS:
+                    raise ValueError("More than %d tools" % MAX_TOOLS)
+                tool_bits[tool] = 1 << len(tools)
+                tools.append(tool)
+            mask |= tool_bits[tool]
+        key = badge_key(badge_id)
+        masks[key] = masks.get(key, 0) | (mask or ALL_TOOLS)
+    _write(path, masks, tools)
+
+
+def update(path, changes, replace=False):
+    """Applies (badge_id, tools) changes to the ACL file at path.
+
+    tools of None removes the badge, otherwise it replaces what they had (an
+    empty list still meaning all tools).  If replace, or there's no file yet,
+    changes is the whole list.  Returns the number of badges now listed.
+    """
+    # key -> set of tool names, or None for all
+    members = {}
+    if not replace and os.path.exists(path):
+        acl = AclIndex(path)
+        try:
+            for key, mask in acl.entries():
+                members[key] = acl._names(mask)
+        finally:
+            acl.close()
+    for badge_id, badge_tools in changes:
+        key = badge_key(badge_id)
+        if badge_tools is None:
+            members.pop(key, None)
+        else:
+            members[key] = set(badge_tools) or None
+
+    tools = sorted(set().union(*[t for t in members.values() if t]))
+    if len(tools) > MAX_TOOLS:
+        raise ValueError("More than %d tools" % MAX_TOOLS)
+    tool_bits = {t: 1 << i for i, t in enumerate(tools)}
+    masks = {}
+    for key, badge_tools in members.items():
+        if badge_tools is None:
+            masks[key] = ALL_TOOLS
+        else:
+            masks[key] = sum(tool_bits[t] for t in badge_tools)
+    _write(path, masks, tools)
+    return len(masks)
+
+
+def _write(path, masks, tools):
+    # Keep the table at most half full so probes stay short.
+    slot_count = 8
+    while slot_count < 2 * len(masks):
+        slot_count *= 2
+    slots = bytearray(SLOT.size * slot_count)
+    for key, mask in masks.items():
+        i = key & (slot_count - 1)
+        while SLOT.unpack_from(slots, i * SLOT.size)[0]:
+            i = (i + 1) & (slot_count - 1)
+        SLOT.pack_into(slots, i * SLOT.size, key, mask)
+
+    tool_table = "\n".join(tools).encode("utf-8")
+    tool_table += b"\0" * (-len(tool_table) % 8)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".acl")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, slot_count, len(masks), len(tool_table)))
+            f.write(tool_table)
+            f.write(slots)
+        os.rename(tmp, path)
+    except Exception:
+        os.unlink(tmp)
+        raise
+
+
+def parse_lines(lines):
+    """Yields (badge_id, tools) from the text format described above."""
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = line.split(None, 1)
+        tools = []
+        if len(parts) > 1:
+            tools = [t.strip() for t in parts[1].split(",") if t.strip()]
+        yield parts[0], tools
+
+
+class AclIndex(object):
+    """Read-only view of an ACL file written by build()."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise ValueError("Not an ACL file", path)
+        header = HEADER.unpack_from(self._map)
+        magic, self.slot_count, self.record_count, tool_table_len = header
+        self._slots_offset = HEADER.size + tool_table_len
+        if (
+            magic != MAGIC
+            or self.slot_count & (self.slot_count - 1)
+            or len(self._map) != self._slots_offset + SLOT.size * self.slot_count
+        ):
+            raise ValueError("Not an ACL file", path)
+        table = self._map[HEADER.size : self._slots_offset].rstrip(b"\0")
+        self.tools = table.decode("utf-8").split("\n") if table else []
+        self._tool_bits = {t: 1 << i for i, t in enumerate(self.tools)}
+
+    def _mask(self, badge_id):
+        key = badge_key(badge_id)
+        mask = self.slot_count - 1
+        i = key & mask
+        while True:
+            slot_key, tools = SLOT.unpack_from(
+                self._map, self._slots_offset + i * SLOT.size
+            )
+            if slot_key == key:
+                return tools
+            if slot_key == 0:
+                return 0
+            i = (i + 1) & mask
+
+    def lookup(self, badge_id, tool):
+        """Returns whether badge_id may use tool."""
+        tools = self._mask(badge_id)
+        return tools == ALL_TOOLS or bool(tools & self._tool_bits.get(tool, 0))
+
+    def tools_for(self, badge_id):
+        """Returns the tool names badge_id may use; None means all of them."""
+        names = self._names(self._mask(badge_id))
+        return None if names is None else sorted(names, key=self.tools.index)
+
+    def _names(self, mask):
+        if mask == ALL_TOOLS:
+            return None
+        return set(t for t in self.tools if mask & self._tool_bits[t])
+
+    def entries(self):
+        """Yields (key, tool mask) for every badge, in no particular order."""
+        for i in range(self.slot_count):
+            key, mask = SLOT.unpack_from(self._map, self._slots_offset + i * SLOT.size)
+            if key:
+                yield key, mask
+
+    def __len__(self):
+        return self.record_count
+
+    def close(self):
+        self._map.close()
+
+
+def main(args):
+    if len(args) != 2:
+        print("Usage: python -m authbox.acl <members.txt> <output.acl>")
+        return 1
+    with open(args[0]) as f:
+        build(args[1], parse_lines(f))
+    acl = AclIndex(args[1])
+    print("Wrote", len(acl), "badges,", len(acl.tools), "tools to", args[1])
+    acl.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,103 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Keeps the local ACL (see authbox.acl) up to date from a server.
+
+Every [acl_sync] interval, asks [acl_sync] url for what changed since the
+version it last applied (see docs/server/Protocol.md), rewrites the ACL file
+with the changes, and switches the LocalAcl over to it.  This happens on its
+own thread; scans keep using the previous file until the new one is ready.
+Revoking someone's access reaches the box within about one interval.
+"""
+
+from __future__ import print_function
+
+import json
+import os
+import time
+import traceback
+
+from authbox import acl
+from authbox.api import BaseDerivedThread
+from authbox.compat import urlencode, urlsplit
+from authbox.http_client import ConnectionPool
+
+
+class AclSync(BaseDerivedThread):
+    def __init__(self, config, local_acl, auth_cache=None, config_name="acl_sync"):
+        super(AclSync, self).__init__(None, config_name)
+        self.local_acl = local_acl
+        self.auth_cache = auth_cache
+        self.path = local_acl.index.path
+        self.version_path = self.path + ".version"
+        self.interval = config.get_int_seconds("acl_sync", "interval", "5m")
+        self.timeout = config.get_int_seconds("auth", "timeout", "30s")
+        parts = urlsplit(config.get("acl_sync", "url"))
+        self.url_path = parts.path
+        self.pool = ConnectionPool("%s://%s" % (parts.scheme, parts.netloc), 1)
+        self.params = {}
+        for name in ("tool", "location", "api_key"):
+            if config.has_option("auth", name):
+                self.params[name] = config.get("auth", name)
+        try:
+            with open(self.version_path) as f:
+                self.version = f.read().strip()
+        except IOError:
+            self.version = ""
+        self.syncs = 0
+
+    @classmethod
+    def from_config(cls, config, local_acl, auth_cache=None):
+        """Returns an AclSync if [acl_sync] url is set, otherwise None."""
+        if local_acl is None or not config.has_option("acl_sync", "url"):
+            return None
+        return cls(config, local_acl, auth_cache)
+
+    def run_inner(self):
+        try:
+            self.sync()
+        except Exception:
+            # Keep the ACL we have, and try again next time.
+            traceback.print_exc()
+        time.sleep(self.interval)
+
+    def sync(self):
+        """Fetches and applies one round of changes; returns how many."""
+        params = dict(self.params, since=self.version)
+        status, body = self.pool.request(
+            "GET", self.url_path + "?" + urlencode(sorted(params.items())), self.timeout
+        )
+        if status != 200:
+            raise IOError("ACL sync got HTTP status %d" % status)
+        response = json.loads(body.decode("utf-8"))
+        full = response.get("full", False)
+        changes = [(c["badge_id"], c.get("tools")) for c in response["changes"]]
+        if changes or full:
+            count = acl.update(self.path, changes, replace=full)
+            # Lookups in progress finish with the old map before it's closed.
+            self.local_acl.swap(acl.AclIndex(self.path))
+            if self.auth_cache is not None:
+                if full:
+                    self.auth_cache.clear()
+                for badge_id, _ in changes:
+                    self.auth_cache.invalidate(badge_id)
+            print("ACL sync applied", len(changes), "changes;", count, "badges")
+        # Written after the ACL, so a crash in between just re-applies these.
+        self.version = str(response["version"])
+        tmp = self.version_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.version + "\n")
+        os.rename(tmp, self.version_path)
+        self.syncs += 1
+        return len(changes)
@@ -19,11 +19,23 @@ in its __init__ method.  Most simple uses will use callbacks for everything.
 See two_button.py as an example workflow.
 
 Peripherals are kept in other files in this same package, and should be listed
-in CLASS_REGISTRY so they can be loaded lazily.
+in CLASS_REGISTRY so they can be loaded lazily.  Peripherals from other packages
+can register under the "authbox.peripherals" entry point group, e.g. in setup.cfg:
+
+    [options.entry_points]
+    authbox.peripherals =
+        MyReader = mypackage.reader:MyReader
 """
 
 from __future__ import print_function
 
+import collections
+import errno
+import fcntl
+import heapq
+import os
+import select
+import signal
 import sys
 import threading
 import traceback
@@ -31,31 +43,246 @@ import types
 
 from gpiozero import DigitalInputDevice
 
-from authbox.compat import queue
+from authbox.compat import TimeoutExpired, monotonic, queue, subprocess_call
+from authbox.journal import Journal
+from authbox.metrics import HandlerStats, format_stats
 
 # The line above simplifies imports for other modules that are already importing from api.
 
 # TODO give each object a logger and use that instead of prints
 
 
-CLASS_REGISTRY = [
-    "authbox.badgereader_hid_keystroking.HIDKeystrokingReader",
-    "authbox.badgereader_wiegand_gpio.WiegandGPIOReader",
-    "authbox.gpio_button.Button",
-    "authbox.gpio_relay.Relay",
-    "authbox.gpio_buzzer.Buzzer",
-    "authbox.timer.Timer",
-]
+# Short name (as used in config) -> full name, imported on first use.
+CLASS_REGISTRY = {
+    "HIDKeystrokingReader": "authbox.badgereader_hid_keystroking.HIDKeystrokingReader",
+    "WiegandGPIOReader": "authbox.badgereader_wiegand_gpio.WiegandGPIOReader",
+    "WiegandCdevReader": "authbox.badgereader_wiegand_cdev.WiegandCdevReader",
+    "WiegandProcessReader": "authbox.badgereader_wiegand_cdev.WiegandProcessReader",
+    "Button": "authbox.gpio_button.Button",
+    "Relay": "authbox.gpio_relay.Relay",
+    "Buzzer": "authbox.gpio_buzzer.Buzzer",
+    "Timer": "authbox.timer.Timer",
+}
+
+ENTRY_POINT_GROUP = "authbox.peripherals"
+
+# Short name -> class, for those that have been imported.
+_class_cache = {}
+_entry_points_loaded = False
 
 # Add this to event_queue to request a graceful shutdown.
 SHUTDOWN_SENTINEL = object()
 
+# Priority classes for EventQueue.set_priority.  Lower numbers are dispatched
+# first; events within a class stay in FIFO order.
+PRIORITY_SAFETY = 0  # e.g. abort, relay off
+PRIORITY_NORMAL = 1  # the default, e.g. badge scans
+PRIORITY_LOW = 2
+PRIORITY_CLASSES = (PRIORITY_SAFETY, PRIORITY_NORMAL, PRIORITY_LOW)
+
+# Backpressure policies for EventQueue.set_policy, applied when a source already
+# has `limit` events waiting.
+DROP_NEWEST = "drop-newest"
+DROP_OLDEST = "drop-oldest"
+# Like DROP_NEWEST, but additionally an event identical to one that's already
+# waiting is dropped regardless of the limit.
+COALESCE = "coalesce"
+# Never dropped, whatever the limit; for events that mustn't be lost, like
+# WorkerPool's finished jobs (of which there can only be as many as were
+# submitted).
+KEEP_ALL = "keep-all"
+POLICIES = (DROP_NEWEST, DROP_OLDEST, COALESCE, KEEP_ALL)
+
+# No single source (callback) can have more than this many events waiting by
+# default, which keeps memory flat under an event storm.
+DEFAULT_SOURCE_LIMIT = 32
+
+# Threads in BaseDispatcher.workers, unless [dispatcher] worker_threads is set.
+DEFAULT_WORKER_THREADS = 2
+
+
+class EventSource(object):
+    """Settings and counters for one callback's events in an EventQueue."""
+
+    def __init__(self, limit):
+        self.priority = PRIORITY_NORMAL
+        self.policy = DROP_NEWEST
+        self.limit = limit
+        self.pending = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+
+class EventQueue(queue.Queue):
+    """A Queue that also signals a pipe whenever an item is added.
+
+    The read end of the pipe (see fileno) lets a consumer sleep in select()
+    until there is work to do, rather than polling with a timeout.  Unlike a
+    plain blocking get(), select() is interrupted by signals on every Python
+    version we support, so Ctrl-C still works without periodic wakeups.
+
+    Items are (callback, args...) tuples, and each callback is treated as a
+    separate source: set_priority lets, say, an abort skip ahead of a backlog of
+    badge scans, and set_policy decides what happens when a source has too many
+    events waiting.  put() never blocks.
+    """
+
+    def __init__(self, source_limit=DEFAULT_SOURCE_LIMIT):
+        queue.Queue.__init__(self)
+        self.source_limit = source_limit
+        self.sources = {}
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        for fd in (self._wakeup_r, self._wakeup_w):
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        # Number of times wait() returned from select(); an idle dispatcher
+        # should leave this alone.
+        self.wakeups = 0
+        # When the item most recently returned by get() was put(), according to
+        # compat.monotonic.
+        self.last_queued_at = None
+
+    def fileno(self):
+        return self._wakeup_r
+
+    def source(self, callback):
+        """Returns the EventSource for callback, creating it if necessary."""
+        with self.mutex:
+            return self._source(callback)
+
+    def _source(self, callback):
+        src = self.sources.get(callback)
+        if src is None:
+            src = self.sources[callback] = EventSource(self.source_limit)
+        return src
+
+    def set_priority(self, callback, priority):
+        """Dispatch events for callback in the given PRIORITY_* class."""
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError("Unknown priority", priority)
+        self.source(callback).priority = priority
+
+    def set_policy(self, callback, policy, limit=None):
+        """Bound the events waiting for callback using one of POLICIES."""
+        if policy not in POLICIES:
+            raise ValueError("Unknown policy", policy)
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be at least 1", limit)
+        src = self.source(callback)
+        src.policy = policy
+        if limit is not None:
+            src.limit = limit
+
+    # The next four are queue.Queue's storage hooks, called with self.mutex held.
+    # Lanes hold (time queued, item) pairs.
+    def _init(self, maxsize):
+        self.lanes = [collections.deque() for _ in PRIORITY_CLASSES]
+
+    def _qsize(self):
+        return sum(len(lane) for lane in self.lanes)
+
+    def _get(self):
+        for lane in self.lanes:
+            if lane:
+                self.last_queued_at, item = lane.popleft()
+                if item is not SHUTDOWN_SENTINEL:
+                    self.sources[item[0]].pending -= 1
+                return item
+
+    def _put(self, item):
+        if item is SHUTDOWN_SENTINEL:
+            # Never dropped, and graceful: anything queued before it still runs.
+            lane = self.lanes[PRIORITY_NORMAL]
+        else:
+            src = self._source(item[0])
+            lane = self.lanes[src.priority]
+            if src.policy == COALESCE and src.pending:
+                if any(queued == item for _, queued in lane):
+                    src.coalesced += 1
+                    return
+            if src.pending >= src.limit and src.policy != KEEP_ALL:
+                src.dropped += 1
+                if src.policy != DROP_OLDEST or not self._drop_oldest(item[0]):
+                    return
+            src.pending += 1
+        lane.append((monotonic(), item))
+        try:
+            os.write(self._wakeup_w, b"\0")
+        except OSError as e:
+            # A full pipe already guarantees the reader will wake up.
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    def _drop_oldest(self, callback):
+        # Called with self.mutex held.  The source's events may be in more than
+        # one lane if its priority changed; returns whether one was dropped.
+        oldest = None
+        for lane in self.lanes:
+            for i, (queued_at, queued) in enumerate(lane):
+                if queued is not SHUTDOWN_SENTINEL and queued[0] == callback:
+                    if oldest is None or queued_at < oldest[0]:
+                        oldest = (queued_at, lane, i)
+                    break
+        if oldest is None:
+            return False
+        _, lane, i = oldest
+        del lane[i]
+        self.sources[callback].pending -= 1
+        return True
+
+    def _drain_wakeups(self):
+        try:
+            while os.read(self._wakeup_r, 4096):
+                pass
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    def wait(self):
+        """Blocks (without a timeout) until an item is available and returns it."""
+        while True:
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                select.select([self._wakeup_r], [], [])
+            except select.error as e:
+                # Python 2 doesn't retry on EINTR; Python 3 does, and runs
+                # signal handlers (like the one raising KeyboardInterrupt) first.
+                if e.args[0] != errno.EINTR:
+                    raise
+            self.wakeups += 1
+            self._drain_wakeups()
+
+    def close(self):
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
+
 
 class BaseDispatcher(object):
     def __init__(self, config):
         self.config = config
-        self.event_queue = queue.Queue()  # unbounded
+        self.event_queue = EventQueue()
         self.threads = []
+        # Keyed by callback; see handler_stats.
+        self._stats = {}
+        if config is not None:
+            size = config.get_int(
+                "dispatcher", "worker_threads", DEFAULT_WORKER_THREADS
+            )
+            # Names of multi-object pins whose methods run on all at once.
+            self.parallel_fanout = set(config.get_list("dispatcher", "parallel"))
+        else:
+            size = DEFAULT_WORKER_THREADS
+            self.parallel_fanout = set()
+        # For blocking work (like running commands) that shouldn't hold up other
+        # events.  Threads are started on first use.
+        self.workers = WorkerPool(self.event_queue, size)
+        # Optional audit trail of every event handled; see [journal].
+        self.journal = Journal.from_config(config)
+        if self.journal is not None:
+            self.threads.append(self.journal)
 
     def load_config_object(self, name, **kwargs):
         # N.b. args are from config, kwargs are passed from python.
@@ -65,14 +292,8 @@ class BaseDispatcher(object):
         objs = []
         for item in config_items:
             options = list(split_escaped(item.strip(), glue=":"))
-            cls_name = options[0]
-            for c in CLASS_REGISTRY:
-                if c.endswith("." + cls_name):
-                    cls = _import(c)
-                    break
-            else:
-                # This is a Python for-else, which executes if the body above didn't
-                # execute 'break'.
+            cls = lookup_class(options[0])
+            if cls is None:
                 raise Exception("Unknown item", name)
             print("Instantiating", cls, self.event_queue, name, options[1:], kwargs)
             obj = cls(self.event_queue, name, *options[1:], **kwargs)
@@ -81,35 +302,90 @@ class BaseDispatcher(object):
         if len(objs) == 1:
             setattr(self, name, obj)
         else:
-            setattr(self, name, MultiProxy(objs))
+            parallel = name in self.parallel_fanout
+            setattr(self, name, MultiProxy(objs, parallel, self.workers))
 
     def run_loop(self):
         # Doesn't really support calling run_loop() more than once
         for th in self.threads:
             th.start()
+        self._loop_started()
         try:
             while True:
-                # We pass a small timeout because .get(block=True) without it causes
-                # trouble handling Ctrl-C.
-                try:
-                    item = self.event_queue.get(timeout=1.0)
-                except queue.Empty:
-                    continue
+                # This sleeps until an event (or a signal) arrives, so an idle
+                # station doesn't wake up at all.
+                item = self.event_queue.wait()
                 if item is SHUTDOWN_SENTINEL:
                     break
-                # These only happen here to serialize access regardless of what thread
-                # handled it.
-                func, args = item[0], item[1:]
-                try:
-                    func(*args)
-                except Exception as e:
-                    traceback.print_exc()
-                    print("Got exception", repr(e), "executing", func, args)
+                self._dispatch(item)
         except KeyboardInterrupt:
             print("Got Ctrl-C, shutting down.")
+        finally:
+            self._loop_finished()
 
         # Assuming all threads are daemonized, we will now shut down.
 
+    def _dispatch(self, item):
+        # These only happen here to serialize access regardless of what thread
+        # handled it.
+        func, args = item[0], item[1:]
+        t0 = monotonic()
+        try:
+            func(*args)
+        except Exception as e:
+            traceback.print_exc()
+            print("Got exception", repr(e), "executing", func, args)
+        t1 = monotonic()
+
+        stats = self._stats.get(func)
+        if stats is None:
+            stats = self._stats[func] = HandlerStats(_callback_name(func))
+        stats.record(t0 - self.event_queue.last_queued_at, t1 - t0)
+        if self.journal is not None:
+            self.journal.record(stats.name, args=[_journal_arg(a) for a in args])
+
+    def audit(self, event, **fields):
+        """Adds a record to the journal, if there is one."""
+        if self.journal is not None:
+            self.journal.record(event, **fields)
+
+    def handler_stats(self):
+        """Returns {handler name: {"wait": summary, "run": summary}}.
+
+        Each summary is a dict with count, p50, p99 and max, in seconds; "wait" is
+        time spent in event_queue and "run" is time spent in the callback.
+        """
+        return dict(
+            (s.name, {"wait": s.wait.summary(), "run": s.run.summary()})
+            for s in list(self._stats.values())
+        )
+
+    def dump_stats(self, out=None):
+        print(format_stats(list(self._stats.values())), file=out or sys.stderr)
+
+    def _loop_started(self):
+        # Setup shared by every run_loop, before the first event is handled.
+        self._old_stats_handler = self._install_stats_signal()
+
+    def _loop_finished(self):
+        # Teardown shared by every run_loop, however it ends.
+        if self._old_stats_handler is not None:
+            signal.signal(signal.SIGUSR1, self._old_stats_handler)
+            self._old_stats_handler = None
+        if self.journal is not None:
+            self.journal.flush()
+
+    def _install_stats_signal(self):
+        # `kill -USR1 <pid>` dumps handler_stats to stderr.
+        def handler(signum, frame):
+            self.dump_stats()
+
+        try:
+            return signal.signal(signal.SIGUSR1, handler)
+        except ValueError:
+            # Not the main thread, so we can't have signal handlers.
+            return None
+
 
 class BaseDerivedThread(threading.Thread):
     def __init__(self, event_queue, config_name):
@@ -145,6 +421,8 @@ class BaseWiegandPinThread(BaseDerivedThread):
 
         self.d0_pin = d0_pin
         self.d1_pin = d1_pin
+        self.d0_input_device = None
+        self.d1_input_device = None
 
         if self.d0_pin:
             self.d0_input_device = DigitalInputDevice(pin="BOARD" + d0_pin)
@@ -152,10 +430,251 @@ class BaseWiegandPinThread(BaseDerivedThread):
             self.d1_input_device = DigitalInputDevice(pin="BOARD" + d1_pin)
 
 
+class JobTimeout(Exception):
+    """Raised by WorkerPool jobs that gave up waiting."""
+
+
+class Job(object):
+    """Blocking work submitted to a WorkerPool.
+
+    When the job is finished it's passed to its callback on the dispatcher
+    thread with exactly one of `result`, `exception` or `timed_out` set.
+    `context` is whatever was passed to submit, for the callback's benefit.
+    """
+
+    def __init__(self, func, args, callback, timeout, context):
+        self.func = func
+        self.args = args
+        self.callback = callback
+        self.context = context
+        self.deadline = None if timeout is None else monotonic() + timeout
+        self.done = False
+        self.result = None
+        self.exception = None
+        self.timed_out = False
+        self._finished = threading.Event()
+
+    def wait(self, timeout=None):
+        """Waits for the job to finish; returns whether it has."""
+        return self._finished.wait(timeout)
+
+
+class WorkerPool(object):
+    """Runs blocking work off the dispatcher thread.
+
+    Finished jobs are posted back to event_queue as (callback, job) events, so
+    state changes still happen serialized on the dispatcher thread:
+
+        def badge_scan(self, badge_id):
+            self.workers.submit_command(command, self.auth_done, timeout=30)
+
+        def auth_done(self, job):
+            if job.result == 0:
+                ...
+    """
+
+    def __init__(self, event_queue, size=DEFAULT_WORKER_THREADS):
+        self.event_queue = event_queue
+        self.size = size
+        self.jobs = queue.Queue()
+        self.threads = []
+        self._lock = threading.Lock()
+        # Heap of (deadline, sequence, job) for jobs submitted with a timeout.
+        self._deadlines = []
+        self._deadline_changed = threading.Condition(self._lock)
+        self._sequence = 0
+        # Workers not busy with a job, less jobs waiting; below zero is a
+        # backlog.
+        self._idle = 0
+
+    def submit(self, func, args=(), callback=None, timeout=None, context=None):
+        """Calls func(*args) on a worker thread.
+
+        If it hasn't returned after timeout seconds, the job is finished with
+        timed_out set, and its eventual result is discarded.  Python code can't
+        be interrupted, so for commands use submit_command instead.
+        """
+        job = Job(func, args, callback, timeout, context)
+        if callback is not None and isinstance(self.event_queue, EventQueue):
+            # A lost completion would leave the app waiting on the job forever.
+            self.event_queue.set_policy(callback, KEEP_ALL)
+        with self._lock:
+            if not self.threads:
+                self._start()
+            self._idle -= 1
+            if job.deadline is not None:
+                self._sequence += 1
+                heapq.heappush(self._deadlines, (job.deadline, self._sequence, job))
+                self._deadline_changed.notify()
+        self.jobs.put(job)
+        return job
+
+    def try_submit(self, func, args=()):
+        """Like submit, but only if a worker can start func right away.
+
+        Returns the job, or None if every worker is busy.
+        """
+        with self._lock:
+            if self.threads and self._idle <= 0:
+                return None
+        return self.submit(func, args)
+
+    def submit_command(self, command, callback=None, timeout=None, context=None):
+        """Runs subprocess.call(command); its result is the exit status.
+
+        On timeout the command is killed and the job finishes with timed_out.
+        """
+        return self.submit(call_command, (command, timeout), callback, None, context)
+
+    def _start(self):
+        # Called with self._lock held.
+        self._idle = self.size
+        for i in range(self.size):
+            self.threads.append(_Worker(self, "workers %d" % i))
+        self.threads.append(_Watchdog(self, "workers"))
+        for th in self.threads:
+            th.start()
+
+    def finish(self, job, result=None, exception=None, timed_out=False):
+        with self._lock:
+            if job.done:
+                return
+            job.done = True
+            job.result = result
+            job.exception = exception
+            job.timed_out = timed_out
+        job._finished.set()
+        if job.callback is not None:
+            self.event_queue.put((job.callback, job))
+
+    def job_done(self):
+        # Called by a worker that's about to look for another job.
+        with self._lock:
+            self._idle += 1
+
+    def expire_jobs(self):
+        """Waits for, and finishes, the next jobs that run out of time."""
+        with self._lock:
+            if not self._deadlines:
+                self._deadline_changed.wait()
+                return
+            deadline, _, job = self._deadlines[0]
+            now = monotonic()
+            if not job.done and deadline > now:
+                self._deadline_changed.wait(deadline - now)
+                return
+            heapq.heappop(self._deadlines)
+        self.finish(job, timed_out=True)
+
+
+class _Worker(BaseDerivedThread):
+    def __init__(self, pool, config_name):
+        super(_Worker, self).__init__(pool.event_queue, config_name)
+        self.pool = pool
+
+    def run_inner(self):
+        job = self.pool.jobs.get()
+        outcome = {}
+        try:
+            outcome["result"] = job.func(*job.args)
+        except JobTimeout:
+            outcome["timed_out"] = True
+        except Exception as e:
+            traceback.print_exc()
+            outcome["exception"] = e
+        # Counted as free before the job is seen to finish, so whoever was
+        # waiting on it can hand this worker the next one.
+        self.pool.job_done()
+        self.pool.finish(job, **outcome)
+
+
+class _Watchdog(BaseDerivedThread):
+    def __init__(self, pool, config_name):
+        super(_Watchdog, self).__init__(pool.event_queue, config_name)
+        self.pool = pool
+
+    def run_inner(self):
+        self.pool.expire_jobs()
+
+
+def call_command(command, timeout=None):
+    """subprocess.call that kills the command and raises JobTimeout on timeout."""
+    try:
+        return subprocess_call(command, timeout=timeout)
+    except TimeoutExpired:
+        raise JobTimeout(command, timeout)
+
+
 class NoMatchingDevice(Exception):
     """Generic exception for missing devices."""
 
 
+def register_class(short_name, full_name):
+    """Adds (or replaces) a peripheral class usable from config."""
+    CLASS_REGISTRY[short_name] = full_name
+    _class_cache.pop(short_name, None)
+
+
+def lookup_class(short_name):
+    """Returns the peripheral class for a config name, or None if unknown.
+
+    Modules are only imported the first time one of their classes is used.
+    """
+    cls = _class_cache.get(short_name)
+    if cls is None:
+        full_name = CLASS_REGISTRY.get(short_name)
+        if full_name is None and not _entry_points_loaded:
+            _load_entry_points()
+            full_name = CLASS_REGISTRY.get(short_name)
+        if full_name is None:
+            return None
+        cls = _class_cache[short_name] = _import(full_name)
+    return cls
+
+
+def _load_entry_points():
+    # Only reads package metadata; the modules are imported by lookup_class.
+    global _entry_points_loaded
+    _entry_points_loaded = True
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # Python < 3.8
+        try:
+            import pkg_resources
+        except ImportError:
+            return
+        eps = list(pkg_resources.iter_entry_points(ENTRY_POINT_GROUP))
+    else:
+        eps = entry_points()
+        if hasattr(eps, "select"):
+            eps = list(eps.select(group=ENTRY_POINT_GROUP))
+        else:  # Python < 3.10
+            eps = eps.get(ENTRY_POINT_GROUP, [])
+    for ep in eps:
+        if hasattr(ep, "value"):
+            value = ep.value
+        else:
+            value = "%s:%s" % (ep.module_name, ".".join(ep.attrs))
+        CLASS_REGISTRY.setdefault(ep.name, value.replace(":", "."))
+
+
+def _journal_arg(arg):
+    # Peripherals are recorded by their config name, e.g. "on_button".
+    if arg is None or isinstance(arg, (str, int, float)):
+        return arg
+    # Jobs by their context, e.g. the badge id.
+    for attr in ("config_name", "context"):
+        value = getattr(arg, attr, None)
+        if value is not None:
+            return value
+    return repr(arg)
+
+
+def _callback_name(func):
+    name = getattr(func, "__qualname__", None) or getattr(func, "__name__", None)
+    return name or repr(func)
+
+
 def _import(name):
     module, object_name = name.rsplit(".", 1)
     # The return value of __import__ requires walking the dots, so
@@ -165,25 +684,98 @@ def _import(name):
     return getattr(sys.modules[module], object_name)
 
 
+class MultiProxyError(Exception):
+    """Raised when a fanned-out call fails on any of the objects.
+
+    Every object is still called.  results has one entry per object (None where
+    it raised) and errors is a list of (obj, exception).
+    """
+
+    def __init__(self, meth, results, errors):
+        super(MultiProxyError, self).__init__(
+            "%s failed on %d of %d: %s"
+            % (meth, len(errors), len(results), ", ".join(repr(e) for _, e in errors))
+        )
+        self.meth = meth
+        self.results = results
+        self.errors = errors
+
+
 class MultiMethodProxy(object):
-    def __init__(self, objs, meth):
+    """Calls the same method on each of several objects.
+
+    Returns the list of results, in object order.  If workers (a WorkerPool) is
+    given, all but the first call are handed to idle workers while the caller
+    makes the first, so that they happen as close to the same instant as
+    possible.  Calls no worker is free for are made by the caller, so a pool
+    busy with slow jobs delays nothing.
+    """
+
+    def __init__(self, objs, meth, workers=None):
         self.objs = objs
         self.meth = meth
+        self.workers = workers
+        # Resolved once, rather than on every call.
+        self.methods = [getattr(i, meth) for i in objs]
 
     def __call__(self, *args, **kwargs):
-        for i in self.objs:
-            getattr(i, self.meth)(*args, **kwargs)
+        if self.workers is not None and len(self.methods) > 1:
+            outcomes = self._call_parallel(args, kwargs)
+        else:
+            outcomes = [_call(m, args, kwargs) for m in self.methods]
+        results = [result for result, _ in outcomes]
+        errors = [(obj, e) for obj, (_, e) in zip(self.objs, outcomes) if e]
+        if errors:
+            raise MultiProxyError(self.meth, results, errors)
+        return results
+
+    def _call_parallel(self, args, kwargs):
+        jobs = [
+            self.workers.try_submit(_call, (m, args, kwargs)) for m in self.methods[1:]
+        ]
+        outcomes = [_call(self.methods[0], args, kwargs)]
+        for method, job in zip(self.methods[1:], jobs):
+            if job is None:
+                outcomes.append(_call(method, args, kwargs))
+            else:
+                job.wait()
+                outcomes.append(job.result)
+        return outcomes
+
+
+def _call(func, args, kwargs):
+    # Returns (result, None) or (None, exception)
+    try:
+        return func(*args, **kwargs), None
+    except Exception as e:
+        return None, e
 
 
 class MultiProxy(object):
-    def __init__(self, objs):
+    """Stands in for several objects configured under one name.
+
+    Methods are fanned out to all of them (see MultiMethodProxy); other
+    attributes come from the first.  If parallel, the calls are made at once
+    using workers, or a small WorkerPool of its own if that's None.
+    """
+
+    def __init__(self, objs, parallel=False, workers=None):
         self.objs = objs
+        self.parallel = parallel
+        if parallel and workers is None:
+            workers = WorkerPool(None, len(objs) - 1)
+        self.workers = workers if parallel else None
 
     def __getattr__(self, name):
-        if isinstance(getattr(self.objs[0], name), types.MethodType):
-            return MultiMethodProxy(self.objs, name)
-        else:
-            return getattr(self.objs[0], name)
+        # Only called on a miss; method proxies are cached in __dict__ so later
+        # lookups are plain attribute access.
+        if name.startswith("__"):
+            raise AttributeError(name)
+        value = getattr(self.objs[0], name)
+        if isinstance(value, types.MethodType):
+            value = MultiMethodProxy(self.objs, name, self.workers)
+            self.__dict__[name] = value
+        return value
 
 
 def split_escaped(s, glue=",", preserve=False):
@@ -0,0 +1,367 @@
+# Copyright 2017-2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""asyncio-based alternative to BaseDispatcher (Python 3 only).
+
+Peripherals are normally each a thread that mostly sleeps.  AsyncDispatcher
+instead drives the built-in peripherals as coroutines on one asyncio loop, which
+is a lot cheaper on single-core boards.  Your business logic subclasses it
+exactly like BaseDispatcher, with the same config:
+
+    class Dispatcher(AsyncDispatcher):
+        def __init__(self, config):
+            super(Dispatcher, self).__init__(config)
+            self.load_config_object("on_button", on_down=self.on_button_down)
+
+Callbacks still run serialized, on the loop's thread.  Peripherals without an
+entry in ASYNC_ADAPTERS fall back to running as their own thread.
+"""
+
+from __future__ import print_function
+
+import asyncio
+import collections
+import threading
+import traceback
+
+from authbox.api import SHUTDOWN_SENTINEL, BaseDispatcher
+from authbox.compat import queue
+
+
+class LoopQueue(object):
+    """A queue that threads can put into and a coroutine can await.
+
+    This implements the subset of the queue.Queue API the peripherals use, so
+    it can be swapped in for their internal command queues.
+    """
+
+    def __init__(self, loop, maxsize=0):
+        self._loop = loop
+        self.maxsize = maxsize
+        self._items = collections.deque()
+        self._lock = threading.Lock()
+        self._waiters = []
+
+    def put(self, item, block=True, timeout=None):
+        with self._lock:
+            if self.maxsize > 0 and len(self._items) >= self.maxsize:
+                raise queue.Full
+            self._items.append(item)
+            waiters, self._waiters = self._waiters, []
+        for fut in waiters:
+            self._loop.call_soon_threadsafe(_set_result_unless_done, fut)
+
+    def put_nowait(self, item):
+        self.put(item, block=False)
+
+    def get(self, block=True, timeout=None):
+        # Blocking gets are only done from the loop, via async_get.
+        with self._lock:
+            if not self._items:
+                raise queue.Empty
+            return self._items.popleft()
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def empty(self):
+        with self._lock:
+            return not self._items
+
+    def qsize(self):
+        with self._lock:
+            return len(self._items)
+
+    async def async_get(self, timeout=None):
+        """Returns the next item, raising asyncio.TimeoutError after timeout."""
+        while True:
+            with self._lock:
+                if self._items:
+                    return self._items.popleft()
+                fut = self._loop.create_future()
+                self._waiters.append(fut)
+            try:
+                if timeout is None:
+                    await fut
+                else:
+                    await asyncio.wait_for(fut, timeout)
+            finally:
+                with self._lock:
+                    if fut in self._waiters:
+                        self._waiters.remove(fut)
+
+
+class LoopTimerService(object):
+    """A timer.TimerService equivalent that uses the loop's call_at."""
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._lock = threading.Lock()
+        # Timer -> deadline, in loop.time()
+        self._deadlines = {}
+        # Timer -> asyncio.TimerHandle; only touched on the loop's thread.
+        self._handles = {}
+
+    def ensure_started(self):
+        pass
+
+    def set(self, timer, delay):
+        with self._lock:
+            deadline = self._deadlines[timer] = self._loop.time() + delay
+        self._loop.call_soon_threadsafe(self._arm, timer, deadline)
+
+    def extend(self, timer, delta):
+        with self._lock:
+            if timer not in self._deadlines:
+                return False
+            deadline = self._deadlines[timer] = self._deadlines[timer] + delta
+        self._loop.call_soon_threadsafe(self._arm, timer, deadline)
+        return True
+
+    def cancel(self, timer):
+        with self._lock:
+            self._deadlines.pop(timer, None)
+        self._loop.call_soon_threadsafe(self._arm, timer, None)
+
+    def remaining(self, timer):
+        with self._lock:
+            deadline = self._deadlines.get(timer)
+        if deadline is None:
+            return None
+        return max(0, deadline - self._loop.time())
+
+    def _arm(self, timer, deadline):
+        handle = self._handles.pop(timer, None)
+        if handle is not None:
+            handle.cancel()
+        if deadline is not None:
+            self._handles[timer] = self._loop.call_at(
+                deadline, self._fire, timer, deadline
+            )
+
+    def _fire(self, timer, deadline):
+        with self._lock:
+            if self._deadlines.get(timer) != deadline:
+                # Replaced or cancelled after this was armed.
+                return
+            del self._deadlines[timer]
+        del self._handles[timer]
+        timer.fire()
+
+
+def _set_result_unless_done(fut):
+    if not fut.done():
+        fut.set_result(None)
+
+
+def adopt_queue(loop, obj, attr):
+    """Replaces obj.<attr> with a LoopQueue, keeping any pending items."""
+    old = getattr(obj, attr)
+    if isinstance(old, LoopQueue):
+        return old
+    new = LoopQueue(loop, getattr(old, "maxsize", 0))
+    setattr(obj, attr, new)
+    while True:
+        try:
+            new.put_nowait(old.get_nowait())
+        except (queue.Empty, queue.Full):
+            break
+    return new
+
+
+async def _forever(step):
+    # Coroutine equivalent of BaseDerivedThread.run
+    while True:
+        try:
+            await step()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            traceback.print_exc()
+
+
+async def run_button(dispatcher, button):
+    q = adopt_queue(dispatcher.loop, button, "blink_command_queue")
+
+    async def step():
+        # Unlike the thread, don't wake up periodically unless blinking.
+        timeout = button.blink_duration if button.blinking else None
+        try:
+            item = await q.async_get(timeout)
+        except asyncio.TimeoutError:
+            button.blink_timeout()
+        else:
+            button.blink_command(item)
+
+    await _forever(step)
+
+
+async def run_buzzer(dispatcher, buzzer):
+    q = adopt_queue(dispatcher.loop, buzzer, "set_queue")
+
+    async def step():
+        item = await q.async_get()
+        for delay in buzzer.play(item):
+            await asyncio.sleep(delay)
+
+    await _forever(step)
+
+
+async def run_timer(dispatcher, timer):
+    timer.move_to(dispatcher.timer_service)
+
+
+async def run_hid_keystroking_reader(dispatcher, reader):
+    device = reader.f
+    if not hasattr(device, "async_read_loop"):
+        # No way to read it without blocking; use the thread after all.
+        reader.start()
+        return
+    while True:
+        try:
+            async for event in device.async_read_loop():
+                line = reader.feed(event)
+                if line is not None:
+                    reader.event_queue.put((reader._on_scan, line))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            traceback.print_exc()
+
+
+async def run_wiegand_gpio_reader(dispatcher, reader):
+    # The gpiozero callbacks keep calling reader.decode from their own thread,
+    # which tells us when a frame starts (or ends early).
+    changed = asyncio.Event()
+    reader.on_change = lambda: dispatcher.loop.call_soon_threadsafe(changed.set)
+
+    async def step():
+        # Cleared first, so a change after take_frame isn't missed.
+        changed.clear()
+        frame, delay = reader.take_frame()
+        if frame is not None:
+            reader.emit(frame)
+            return
+        try:
+            await asyncio.wait_for(changed.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    await _forever(step)
+
+
+async def run_wiegand_cdev_reader(dispatcher, reader):
+    fd = getattr(reader.chip, "fd", None)
+    if fd is None:
+        # e.g. a fake chip; use the thread after all.
+        reader.start()
+        return
+
+    # Edges are read as the kernel queues them, without a thread.
+    def readable():
+        reader.add_edges(reader.chip.read_events(0))
+
+    dispatcher.loop.add_reader(fd, readable)
+    await run_wiegand_gpio_reader(dispatcher, reader)
+
+
+async def run_wiegand_process_reader(dispatcher, reader):
+    # A capture process that died would never wake us, so look in on it.
+    async def check():
+        await asyncio.sleep(reader.chip.check_interval)
+        reader.chip.check()
+
+    await asyncio.gather(run_wiegand_cdev_reader(dispatcher, reader), _forever(check))
+
+
+async def run_nothing(dispatcher, obj):
+    pass
+
+
+# Keyed by "module.ClassName"; subclasses use their nearest registered base.
+# Anything not found here is started as a thread.
+ASYNC_ADAPTERS = {
+    "authbox.badgereader_hid_keystroking.HIDKeystrokingReader": run_hid_keystroking_reader,
+    "authbox.badgereader_wiegand_gpio.WiegandGPIOReader": run_wiegand_gpio_reader,
+    "authbox.badgereader_wiegand_cdev.WiegandCdevReader": run_wiegand_cdev_reader,
+    "authbox.badgereader_wiegand_cdev.WiegandProcessReader": run_wiegand_process_reader,
+    "authbox.gpio_button.Button": run_button,
+    "authbox.gpio_relay.Relay": run_nothing,
+    "authbox.gpio_buzzer.Buzzer": run_buzzer,
+    "authbox.timer.Timer": run_timer,
+}
+
+
+def find_adapter(obj):
+    for cls in type(obj).__mro__:
+        adapter = ASYNC_ADAPTERS.get(cls.__module__ + "." + cls.__name__)
+        if adapter is not None:
+            return adapter
+    return None
+
+
+class AsyncDispatcher(BaseDispatcher):
+    def __init__(self, config):
+        super(AsyncDispatcher, self).__init__(config)
+        self.loop = asyncio.new_event_loop()
+        self.timer_service = LoopTimerService(self.loop)
+        self.tasks = []
+        self._stopped = None
+
+    def run_loop(self):
+        # Doesn't really support calling run_loop() more than once
+        self._loop_started()
+        try:
+            self.loop.run_until_complete(self._main())
+        except KeyboardInterrupt:
+            print("Got Ctrl-C, shutting down.")
+        finally:
+            self._loop_finished()
+
+    async def _main(self):
+        self._stopped = self.loop.create_future()
+        for obj in self.threads:
+            adapter = find_adapter(obj)
+            if adapter is None:
+                obj.start()
+            else:
+                self.tasks.append(self.loop.create_task(adapter(self, obj)))
+
+        fd = self.event_queue.fileno()
+        self.loop.add_reader(fd, self._on_wakeup)
+        # Handle anything queued before the loop started.
+        self._process_events()
+        try:
+            await self._stopped
+        finally:
+            self.loop.remove_reader(fd)
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def _on_wakeup(self):
+        self.event_queue.wakeups += 1
+        self.event_queue._drain_wakeups()
+        self._process_events()
+
+    def _process_events(self):
+        while not self._stopped.done():
+            try:
+                item = self.event_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is SHUTDOWN_SENTINEL:
+                self._stopped.set_result(None)
+                break
+            self._dispatch(item)
@@ -0,0 +1,561 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Helpers for deciding whether a badge is authorized.
+
+Backends (selected by [auth] backend) ask whoever decides; their authorize()
+blocks, so is meant to be run on a WorkerPool:
+
+    command: runs [auth] command, extend_command or deauth_command for each
+      request; exit status 0 means allowed.
+    coprocess: starts [auth] helper once and sends it a JSON line per request
+      (see authbox.coprocess), e.g.
+        {"id": 1, "state": "initial", "badge_id": "1234", "auth_minutes": 5}
+      and expects back {"id": 1, "allowed": true}.
+    http: sends the same parameters (plus api_key) to [auth] base_url, as in
+      docs/server/Protocol.md, over kept-alive connections; 200 means allowed.
+    acl: the [auth] acl list; only answers for badges it allows, unless
+      acl_mode is only.  Listed here, it's asked in turn instead of first.
+    cache: the last answer for the badge, even if expired (see stale_cache_ttl).
+
+[auth] backends can list several of these, in order, e.g. "http, acl, cache".
+Each is tried after the one before has failed, or hasn't answered within
+[auth] hedge_delay; the first answer wins.
+"""
+
+from __future__ import print_function
+
+import collections
+import math
+import os
+import ssl
+import threading
+
+from authbox import acl
+from authbox.acl import AclIndex
+from authbox.api import JobTimeout, call_command
+from authbox.compat import configparser, monotonic, queue, urlencode
+from authbox.coprocess import Coprocess
+from authbox.http_client import ConnectionPool
+
+# Where an answer came from, for logging.
+SOURCE_CACHE = "cache"
+SOURCE_COMMAND = "command"
+SOURCE_ACL = "acl"
+
+# Request states, as in docs/server/Protocol.md
+STATE_INITIAL = "initial"
+STATE_EXTEND = "extend"
+STATE_CANCEL = "cancel"
+
+# [auth] acl_mode values
+ACL_FIRST = "first"  # Badges the ACL allows skip the command
+ACL_ONLY = "only"  # The command is never run
+ACL_MODES = (ACL_FIRST, ACL_ONLY)
+
+
+class AuthCache(object):
+    """Remembers recent auth answers by badge id.
+
+    Allowed and denied answers expire after positive_ttl and negative_ttl
+    seconds respectively; a ttl of 0 means that kind isn't cached.  At most
+    max_size badges are kept, dropping the least recently used.
+
+    Expired answers are kept for a further stale_ttl, for get_stale; that's
+    for when whoever decides can't be reached (see HedgedBackend).
+    """
+
+    def __init__(
+        self, positive_ttl, negative_ttl, max_size, clock=monotonic, stale_ttl=0
+    ):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self.clock = clock
+        self._lock = threading.Lock()
+        # badge_id -> (expiry, authorized), least recently used first
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, config, section="auth"):
+        return cls(
+            config.get_int_seconds(section, "cache_ttl", "0s"),
+            config.get_int_seconds(section, "negative_cache_ttl", "0s"),
+            config.get_int(section, "cache_size", 1024),
+            stale_ttl=config.get_int_seconds(section, "stale_cache_ttl", "0s"),
+        )
+
+    def get(self, badge_id):
+        """Returns True/False if badge_id has a live answer, otherwise None."""
+        with self._lock:
+            entry = self._entries.pop(badge_id, None)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None and entry[0] + self.stale_ttl > self.clock():
+                    self._entries[badge_id] = entry
+                self.misses += 1
+                return None
+            # Re-inserting marks it most recently used.
+            self._entries[badge_id] = entry
+            self.hits += 1
+            return entry[1]
+
+    def get_stale(self, badge_id):
+        """Like get, but also returns answers that expired within stale_ttl."""
+        with self._lock:
+            entry = self._entries.get(badge_id)
+            if entry is None or entry[0] + self.stale_ttl <= self.clock():
+                return None
+            return entry[1]
+
+    def put(self, badge_id, authorized):
+        ttl = self.positive_ttl if authorized else self.negative_ttl
+        with self._lock:
+            self._entries.pop(badge_id, None)
+            if ttl <= 0 and self.stale_ttl <= 0 or self.max_size <= 0:
+                return
+            self._entries[badge_id] = (self.clock() + ttl, authorized)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, badge_id):
+        """Forgets any answer for badge_id, e.g. when their access changes."""
+        with self._lock:
+            self._entries.pop(badge_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LocalAcl(object):
+    """Answers from an offline ACL file (see authbox.acl) for one tool."""
+
+    def __init__(self, index, tool, mode=ACL_FIRST):
+        if mode not in ACL_MODES:
+            raise ValueError("Unknown acl_mode", mode)
+        self.index = index
+        self.tool = tool
+        self.mode = mode
+        self._lock = threading.Lock()
+        # Lookups in progress, per index; a swapped out index is closed by the
+        # last of them.
+        self._readers = {}
+
+    @classmethod
+    def from_config(cls, config, section="auth"):
+        """Returns a LocalAcl for [section] acl, or None if that isn't set."""
+        if not config.has_option(section, "acl"):
+            return None
+        mode = ACL_FIRST
+        if config.has_option(section, "acl_mode"):
+            mode = config.get(section, "acl_mode")
+        path = os.path.expanduser(config.get(section, "acl"))
+        if not os.path.exists(path) and config.has_option("acl_sync", "url"):
+            # Start empty; AclSync fills it in.
+            acl.build(path, [])
+        return cls(AclIndex(path), config.get(section, "tool"), mode)
+
+    def check(self, badge_id):
+        """Returns True/False if the ACL decides, or None to ask the command."""
+        allowed = self.lookup(badge_id)
+        if allowed or self.mode == ACL_ONLY:
+            return allowed
+        return None
+
+    def lookup(self, badge_id):
+        """Returns whether the ACL allows badge_id to use the tool."""
+        with self._lock:
+            index = self.index
+            self._readers[index] = self._readers.get(index, 0) + 1
+        try:
+            return index.lookup(badge_id, self.tool)
+        finally:
+            with self._lock:
+                self._readers[index] -= 1
+                last = not self._readers[index]
+                if last:
+                    del self._readers[index]
+                retired = last and index is not self.index
+            if retired:
+                index.close()
+
+    def swap(self, index):
+        """Switches to index; the old one is closed once nothing is using it."""
+        with self._lock:
+            old, self.index = self.index, index
+            if old in self._readers:
+                return
+        old.close()
+
+
+class AuthBackend(object):
+    """Base for the backends; subclasses implement authorize."""
+
+    name = None
+
+    def authorize(self, badge_id, state=STATE_INITIAL, timeout=None):
+        """Returns whether badge_id is allowed, or None for no answer."""
+        raise NotImplementedError
+
+    def answer(self, badge_id, state=STATE_INITIAL, timeout=None):
+        """Returns (authorize's result, name of the backend that answered)."""
+        return self.authorize(badge_id, state, timeout), self.name
+
+    def supports(self, state):
+        """Returns whether authorize can answer for state at all."""
+        return True
+
+    def close(self):
+        pass
+
+
+def protocol_params(config, section, badge_id, state):
+    """The request parameters common to the backends that aren't commands."""
+    params = {"badge_id": badge_id, "state": state}
+    for name in ("tool", "location"):
+        if config.has_option(section, name):
+            params[name] = config.get(section, name)
+    duration_option = {STATE_INITIAL: "duration", STATE_EXTEND: "extend"}.get(state)
+    if duration_option and config.has_option(section, duration_option):
+        seconds = config.get_int_seconds(section, duration_option, "0s")
+        params["auth_minutes"] = int(math.ceil(seconds / 60.0))
+    return params
+
+
+class CommandBackend(AuthBackend):
+    """Runs a command per request; exit status 0 means allowed."""
+
+    name = SOURCE_COMMAND
+    OPTIONS = {
+        STATE_INITIAL: "command",
+        STATE_EXTEND: "extend_command",
+        STATE_CANCEL: "deauth_command",
+    }
+
+    def __init__(self, config, section="auth"):
+        self.section = section
+        # Parsed once, so a bad template fails at startup rather than mid-scan.
+        # extend_command and deauth_command are optional until they're needed.
+        self.templates = {}
+        for state, option in self.OPTIONS.items():
+            if state == STATE_INITIAL or config.has_option(section, option):
+                self.templates[state] = config.get_command(section, option)
+
+    def supports(self, state):
+        return state in self.templates
+
+    def authorize(self, badge_id, state=STATE_INITIAL, timeout=None):
+        template = self.templates.get(state)
+        if template is None:
+            raise configparser.NoOptionError(self.OPTIONS[state], self.section)
+        # Malicious badge "numbers" that contain spaces are still one arg.
+        return call_command(template.format(badge_id), timeout) == 0
+
+
+class CoprocessBackend(AuthBackend):
+    """Sends each request to a long-lived helper process."""
+
+    name = "coprocess"
+
+    def __init__(self, config, section="auth"):
+        self.config = config
+        self.section = section
+        # Like the other commands, but there's no badge to fill in.
+        helper = config.get_command(section, "helper", nargs=0)
+        self.helper = Coprocess(helper.format())
+
+    def authorize(self, badge_id, state=STATE_INITIAL, timeout=None):
+        params = protocol_params(self.config, self.section, badge_id, state)
+        response = self.helper.call(params, timeout)
+        if response.get("error"):
+            # Not an answer about the badge, like the http backend's 5xx.
+            print("Helper error for", badge_id, response["error"])
+            return None
+        return response.get("allowed") is True
+
+    def close(self):
+        self.helper.close()
+
+
+class HttpBackend(AuthBackend):
+    """Asks an HTTP server speaking docs/server/Protocol.md."""
+
+    name = "http"
+
+    def __init__(self, config, section="auth"):
+        self.config = config
+        self.section = section
+        self.api_key = None
+        if config.has_option(section, "api_key"):
+            self.api_key = config.get(section, "api_key")
+        self.path = "/api/v1/check"
+        if config.has_option(section, "path"):
+            self.path = config.get(section, "path")
+        base_url = config.get(section, "base_url")
+        context = None
+        if base_url.startswith("https:"):
+            context = ssl.create_default_context()
+            if config.has_option(section, "ca_file"):
+                context.load_verify_locations(
+                    os.path.expanduser(config.get(section, "ca_file"))
+                )
+            if config.has_option(section, "client_cert"):
+                # client_key may be omitted if client_cert also has the key.
+                key = None
+                if config.has_option(section, "client_key"):
+                    key = os.path.expanduser(config.get(section, "client_key"))
+                context.load_cert_chain(
+                    os.path.expanduser(config.get(section, "client_cert")), key
+                )
+        # One connection per worker that might be making requests.
+        size = config.get_int("dispatcher", "worker_threads", 2)
+        self.pool = ConnectionPool(base_url, size, context)
+
+    def authorize(self, badge_id, state=STATE_INITIAL, timeout=None):
+        params = protocol_params(self.config, self.section, badge_id, state)
+        if self.api_key is not None:
+            params["api_key"] = self.api_key
+        query = urlencode(sorted(params.items()))
+        status, _ = self.pool.request("GET", self.path + "?" + query, timeout)
+        if status == 200:
+            return True
+        if status == 403:
+            return False
+        # Not an answer about the badge (a server error, a bad path, ...)
+        print("Auth server gave status", status, "for", badge_id)
+        return None
+
+    def close(self):
+        self.pool.close()
+
+
+class AclBackend(AuthBackend):
+    """Answers as LocalAcl.check does: only for allowed badges, unless only."""
+
+    name = SOURCE_ACL
+
+    def __init__(self, local_acl):
+        self.local_acl = local_acl
+
+    def authorize(self, badge_id, state=STATE_INITIAL, timeout=None):
+        if state != STATE_INITIAL:
+            return None
+        return self.local_acl.check(badge_id)
+
+    def supports(self, state):
+        return state == STATE_INITIAL
+
+
+class CacheBackend(AuthBackend):
+    """The last answer from any backend, if still within stale_cache_ttl."""
+
+    name = SOURCE_CACHE
+
+    def __init__(self, auth_cache):
+        self.auth_cache = auth_cache
+
+    def authorize(self, badge_id, state=STATE_INITIAL, timeout=None):
+        if state != STATE_INITIAL:
+            return None
+        return self.auth_cache.get_stale(badge_id)
+
+    def supports(self, state):
+        return state == STATE_INITIAL
+
+
+class NoAnswer(Exception):
+    """None of the backends could answer."""
+
+
+class HedgedBackend(AuthBackend):
+    """Asks backends in order, starting the next after hedge_delay seconds.
+
+    Slower backends that were already asked keep going, and the first answer
+    (True or False; None means no answer) from any of them is used.  A backend
+    that fails or has no answer moves straight on to the next.
+    """
+
+    name = "hedged"
+
+    def __init__(self, backends, hedge_delay):
+        self.backends = backends
+        self.hedge_delay = hedge_delay
+
+    def authorize(self, badge_id, state=STATE_INITIAL, timeout=None):
+        return self.answer(badge_id, state, timeout)[0]
+
+    def answer(self, badge_id, state=STATE_INITIAL, timeout=None):
+        deadline = None if timeout is None else monotonic() + timeout
+        answers = queue.Queue()
+        started = 0
+        outstanding = 0
+        next_start = monotonic()
+        while True:
+            now = monotonic()
+            if started < len(self.backends) and (now >= next_start or not outstanding):
+                self._start(self.backends[started], answers, badge_id, state, deadline)
+                started += 1
+                outstanding += 1
+                next_start = now + self.hedge_delay
+            if not outstanding:
+                raise NoAnswer(badge_id)
+            wait_until = deadline
+            if started < len(self.backends):
+                wait_until = min(next_start, deadline or next_start)
+            try:
+                backend, result = answers.get(
+                    timeout=None if wait_until is None else max(0, wait_until - now)
+                )
+            except queue.Empty:
+                if deadline is not None and monotonic() >= deadline:
+                    raise JobTimeout(badge_id, timeout)
+                continue
+            outstanding -= 1
+            if result is not None:
+                return result, backend.name
+
+    def supports(self, state):
+        return any(backend.supports(state) for backend in self.backends)
+
+    def _start(self, backend, answers, badge_id, state, deadline):
+        def run():
+            timeout = None if deadline is None else max(0, deadline - monotonic())
+            try:
+                result = backend.authorize(badge_id, state, timeout)
+            except Exception as e:
+                print("Auth backend", backend.name, "failed:", repr(e))
+                result = None
+            answers.put((backend, result))
+
+        th = threading.Thread(target=run, name="hedged %s" % backend.name)
+        th.daemon = True
+        th.start()
+
+    def close(self):
+        for backend in self.backends:
+            backend.close()
+
+
+AUTH_BACKENDS = {
+    "command": CommandBackend,
+    "coprocess": CoprocessBackend,
+    "http": HttpBackend,
+}
+
+
+def backend_from_config(config, section="auth", local_acl=None, auth_cache=None):
+    """Returns the backend for [section] backends (or backend)."""
+    names = config.get_list(section, "backends")
+    if not names:
+        names = ["command"]
+        if config.has_option(section, "backend"):
+            names = [config.get(section, "backend")]
+    backends = []
+    for name in names:
+        if name == "acl":
+            if local_acl is None:
+                raise ValueError("The acl backend needs [auth] acl")
+            backends.append(AclBackend(local_acl))
+        elif name == "cache":
+            if auth_cache is None:
+                raise ValueError("The cache backend needs a cache")
+            backends.append(CacheBackend(auth_cache))
+        elif name in AUTH_BACKENDS:
+            backends.append(AUTH_BACKENDS[name](config, section))
+        else:
+            raise ValueError("Unknown auth backend", name)
+    if len(backends) == 1:
+        return backends[0]
+    return HedgedBackend(backends, config.get_int_seconds(section, "hedge_delay", "1s"))
+
+
+def log_answer(badge_id, authorized, source, journal=None):
+    print("Auth", badge_id, "allowed" if authorized else "denied", "from", source)
+    if journal is not None:
+        journal.record("auth", badge_id=badge_id, allowed=authorized, source=source)
+
+
+class ScanChecker(object):
+    """Answers badge scans for a dispatcher, calling on_answer(badge_id, allowed).
+
+    Fresh cached answers, and the ACL (unless it's one of [auth] backends), are
+    used right away; otherwise the backend is asked on a worker thread and
+    on_answer is called from the event queue.  A later scan, or cancel(),
+    discards the answer to one still in progress.
+    """
+
+    def __init__(self, config, workers, on_answer, journal=None):
+        self.workers = workers
+        self.on_answer = on_answer
+        self.journal = journal
+        self.timeout = config.get_int_seconds("auth", "timeout", "30s")
+        # Repeat scans within the TTLs are answered without running the command.
+        self.auth_cache = AuthCache.from_config(config)
+        # Optional offline list of members; None unless [auth] acl is set.
+        self.local_acl = LocalAcl.from_config(config)
+        # Runs the auth command, or talks to a helper; see [auth] backend.
+        self.backend = backend_from_config(
+            config, local_acl=self.local_acl, auth_cache=self.auth_cache
+        )
+        backends = getattr(self.backend, "backends", [self.backend])
+        self.acl_first = self.local_acl is not None and not any(
+            isinstance(b, AclBackend) for b in backends
+        )
+        # The Job for the backend request in progress, if any.
+        self.pending = None
+
+    def check(self, badge_id):
+        self.pending = None
+        if self.acl_first:
+            allowed = self.local_acl.check(badge_id)
+            if allowed is not None:
+                self._answered(badge_id, allowed, SOURCE_ACL)
+                return
+        cached = self.auth_cache.get(badge_id)
+        if cached is not None:
+            self._answered(badge_id, cached, SOURCE_CACHE)
+            return
+        self.pending = self.workers.submit(
+            self.backend.answer,
+            (badge_id, STATE_INITIAL, self.timeout),
+            self._checked,
+            context=badge_id,
+        )
+
+    def cancel(self):
+        self.pending = None
+
+    def _checked(self, job):
+        if job is not self.pending:
+            # Superseded by a later scan, or cancelled.
+            return
+        self.pending = None
+        badge_id = job.context
+        answer, source = job.result or (None, self.backend.name)
+        if job.timed_out:
+            print("Auth timed out for", badge_id)
+        elif answer is not None and source not in (SOURCE_ACL, SOURCE_CACHE):
+            # Timeouts, failures, non-answers and fallback answers aren't cached.
+            self.auth_cache.put(badge_id, answer is True)
+        self._answered(badge_id, answer is True, source)
+
+    def _answered(self, badge_id, allowed, source):
+        log_answer(badge_id, allowed, source, self.journal)
+        self.on_answer(badge_id, allowed)
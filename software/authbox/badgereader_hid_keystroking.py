@@ -21,6 +21,23 @@ import evdev
 
 from authbox.api import BaseDerivedThread, NoMatchingDevice
 
+EV_KEY = evdev.ecodes.EV_KEY
+KEY_ENTER = evdev.ecodes.KEY_ENTER
+KEY_DOWN = evdev.events.KeyEvent.key_down
+
+# Longer badges are cut off here.
+MAX_BADGE_LENGTH = 256
+
+
+def _key_table(codes):
+    """Turns {scancode: text} into a list indexed by scancode, of bytes or None."""
+    table = [None] * (max(codes) + 1)
+    for code, text in codes.items():
+        if text is not None:
+            table[code] = text.encode("ascii")
+    return table
+
+
 class HIDKeystrokingReader(BaseDerivedThread):
     """Badge reader hardware abstraction.
 
@@ -173,6 +190,12 @@ class HIDKeystrokingReader(BaseDerivedThread):
         super(HIDKeystrokingReader, self).__init__(event_queue, config_name)
         self._on_scan = on_scan
         self._device_name = device_name
+        # feed runs for every event, so it indexes lists and fills a buffer
+        # rather than looking up dicts and building strings.
+        self._keys = _key_table(self.scancodes)
+        self._caps_keys = _key_table(self.capscancodes)
+        self._buffer = bytearray(MAX_BADGE_LENGTH)
+        self._reset()
         self.f = self.get_scanner_device()
         self.f.grab()
 
@@ -208,26 +231,49 @@ class HIDKeystrokingReader(BaseDerivedThread):
           badge value as string
         """
 
-        rfid = ""
-        capitalized = 0
+        self._reset()
         device = self.f
-        print("About to read_input")
         for event in device.read_loop():
-            # print("read_input event", event)
-            data = evdev.categorize(event)
-            if event.type == evdev.ecodes.EV_KEY and data.keystate == 1:
-                if data.scancode == self.LSHIFT_SCANCODE:
-                    capitalized = 1
-                if data.keycode == "KEY_ENTER":
-                    break
-                if data.scancode != self.LSHIFT_SCANCODE:
-                    if capitalized:
-                        rfid += self.capscancodes[data.scancode]
-                        capitalized ^= 1
-                    else:
-                        rfid += self.scancodes[data.scancode]
-        print("Badge read:", rfid)
-        return rfid
+            rfid = self.feed(event)
+            if rfid is not None:
+                return rfid
+        # The device stopped producing events mid-badge.
+        return self._badge()
+
+    def _reset(self):
+        self._length = 0
+        self._capitalized = 0
+
+    def _badge(self):
+        return self._buffer[: self._length].decode("ascii")
+
+    def feed(self, event):
+        """Consumes one evdev event.
+
+        Returns:
+          The badge value as a string once ENTER is seen, otherwise None.
+        """
+        if event.type != EV_KEY or event.value != KEY_DOWN:
+            return None
+        code = event.code
+        if code == self.LSHIFT_SCANCODE:
+            self._capitalized = 1
+            return None
+        if code == KEY_ENTER:
+            rfid = self._badge()
+            self._reset()
+            return rfid
+        table = self._caps_keys if self._capitalized else self._keys
+        self._capitalized = 0
+        text = table[code] if code < len(table) else None
+        if text is None:
+            # Not a key we know; ignore it rather than lose the badge.
+            return None
+        end = self._length + len(text)
+        if end <= MAX_BADGE_LENGTH:
+            self._buffer[self._length : end] = text
+            self._length = end
+        return None
 
     def run_inner(self):
         line = self.read_input()
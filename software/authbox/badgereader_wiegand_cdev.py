@@ -0,0 +1,158 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Wiegand badge reader using kernel-timestamped GPIO edges.
+"""
+
+from __future__ import print_function
+
+import threading
+import traceback
+
+from authbox import gpio_capture, gpio_cdev
+from authbox.badgereader_wiegand_gpio import (
+    DEFAULT_MAX_BITS,
+    DEFAULT_TIMEOUT_IN_MS,
+    OUTPUT_BITS,
+    WiegandGPIOReader,
+)
+
+
+class WiegandCdevReader(WiegandGPIOReader):
+    """WiegandGPIOReader that reads edges from /dev/gpiochipN instead.
+
+    With gpiozero, Python runs once per edge, and a 50us pulse that arrives
+    while another thread holds the GIL can be missed.  Here the kernel notes
+    the time of each falling edge as it happens, and the reader's thread gets
+    them in batches.  Those times are exact, so once bits have been seen the
+    gap that ends a frame is a few bit intervals, usually well under the
+    maximum.  Config is the same, with the chip device at the end:
+
+      [pins]
+      name = WiegandCdevReader:7:13:100:15:card:0:/dev/gpiochip0
+
+    Pins are still physical numbers, for a Raspberry Pi's 40-pin header.
+    """
+
+    adaptive_gap = True
+
+    def __init__(
+        self,
+        event_queue,
+        config_name,
+        d0_pin,
+        d1_pin,
+        max_bits=DEFAULT_MAX_BITS,
+        timeout_in_ms=DEFAULT_TIMEOUT_IN_MS,
+        output=OUTPUT_BITS,
+        frame_bits=0,
+        chip_path=gpio_cdev.DEFAULT_CHIP,
+        on_scan=None,
+        chip=None,
+    ):
+        # No pins, so no gpiozero devices (which would claim the lines).
+        super(WiegandCdevReader, self).__init__(
+            event_queue,
+            config_name,
+            None,
+            None,
+            max_bits,
+            timeout_in_ms,
+            output,
+            frame_bits,
+            on_scan,
+        )
+        self.d0_pin = d0_pin
+        self.d1_pin = d1_pin
+        self.d0_line = gpio_cdev.board_to_line(d0_pin)
+        self.d1_line = gpio_cdev.board_to_line(d1_pin)
+        # chip is for tests, see fake_gpio_cdev_for_testing.
+        if chip is None:
+            chip = gpio_cdev.LineEventReader(
+                chip_path, [self.d0_line, self.d1_line], "authbox " + config_name
+            )
+        self.chip = chip
+
+    def add_edges(self, events):
+        """Adds edges from chip.read_events to the frames."""
+        self.add_bits([(t, 0 if line == self.d0_line else 1) for t, line, _ in events])
+
+    def run_inner(self):
+        frame, delay = self.take_frame()
+        if frame is not None:
+            self.emit(frame)
+        else:
+            # Returns early with whatever edges arrive meanwhile.
+            self.add_edges(self.chip.read_events(delay))
+
+    def close(self):
+        self.chip.close()
+
+
+class WiegandProcessReader(WiegandCdevReader):
+    """WiegandCdevReader that captures edges in a process of its own.
+
+    Decoding still happens here, but reading edges as they arrive doesn't wait
+    on anything else this process is doing; see authbox.gpio_capture.  The
+    last option is the capture process's real-time priority, 0 for none:
+
+      [pins]
+      name = WiegandProcessReader:7:13:100:15:card:0:/dev/gpiochip0:20
+    """
+
+    def __init__(
+        self,
+        event_queue,
+        config_name,
+        d0_pin,
+        d1_pin,
+        max_bits=DEFAULT_MAX_BITS,
+        timeout_in_ms=DEFAULT_TIMEOUT_IN_MS,
+        output=OUTPUT_BITS,
+        frame_bits=0,
+        chip_path=gpio_cdev.DEFAULT_CHIP,
+        priority=0,
+        on_scan=None,
+        chip=None,
+    ):
+        super(WiegandProcessReader, self).__init__(
+            event_queue,
+            config_name,
+            d0_pin,
+            d1_pin,
+            max_bits,
+            timeout_in_ms,
+            output,
+            frame_bits,
+            chip_path,
+            on_scan,
+            chip,
+        )
+        self.chip = gpio_capture.CaptureProcess(self.chip, priority)
+
+    def run(self):
+        # Like BaseDerivedThread.run, but ends once close() has stopped the chip.
+        while not self.chip.stopped:
+            try:
+                self.run_inner()
+            except Exception:
+                traceback.print_exc()
+
+    def close(self):
+        # The thread has to be out of read_events before the capture process's
+        # pipe is closed.
+        self.chip.stop()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(2 * gpio_capture.CHECK_INTERVAL)
+        self.chip.close()
@@ -17,11 +17,22 @@
 
 from __future__ import division, print_function
 
+import collections
+import threading
+
+from authbox import wiegand
 from authbox.api import BaseWiegandPinThread
-from authbox.compat import queue
+from authbox.compat import monotonic
 
-DEFAULT_QUEUE_SIZE = 100  # more than enough for a scan
+DEFAULT_MAX_BITS = 100  # more than enough for a scan
 DEFAULT_TIMEOUT_IN_MS = 15
+# With exact bit times (adaptive_gap), a frame ends after a gap of GAP_FACTOR
+# bit intervals (as measured so far), but at least MIN_GAP seconds and at most
+# timeout_in_ms.
+GAP_FACTOR = 4
+MIN_GAP = 0.005
+OUTPUT_BITS = "bits"
+OUTPUT_CARD = "card"
 
 
 class WiegandGPIOReader(BaseWiegandPinThread):
@@ -42,6 +53,21 @@ class WiegandGPIOReader(BaseWiegandPinThread):
         Pin 5: 12v
         Pin 6: No connection
 
+    Further options are the most bits in one frame (more are dropped), the
+    longest gap in ms within a frame, what the app is given for each scan, and
+    how many bits a frame has if all your cards are the same:
+
+      name = WiegandGPIOReader:7:13:100:15:card:26
+
+    Frames are split by the time of each bit, taken as it arrives, so a busy
+    system can't merge or split them.  With the last option, a frame is passed
+    on as soon as it has that many bits.
+
+    "bits" (the default) passes the frame as a string of 0's and 1's; "card"
+    passes "<facility>-<card>" for the formats in authbox.wiegand.  Either way,
+    frames of those formats with bad parity are dropped rather than passed on,
+    and with "card" so are frames of any other length.
+
     Pin 6 is used for the switched +12v provided by the ULN2003AD chip
     (L5_LOGIC).  As we want to constantly power the RFID reader, there is no need
     to populate Pin 6.
@@ -53,36 +79,126 @@ class WiegandGPIOReader(BaseWiegandPinThread):
     event that two way communication is needed a level shifter should be used.
     """
 
+    # Whether the gap that ends a frame shrinks to a few bit intervals.  Only
+    # for bit times from the kernel; gpiozero callbacks can run late enough to
+    # look like a gap that short.
+    adaptive_gap = False
+
     def __init__(
         self,
         event_queue,
         config_name,
         d0_pin,
         d1_pin,
-        on_scan=None,
-        queue_size=DEFAULT_QUEUE_SIZE,
+        max_bits=DEFAULT_MAX_BITS,
         timeout_in_ms=DEFAULT_TIMEOUT_IN_MS,
+        output=OUTPUT_BITS,
+        frame_bits=0,
+        on_scan=None,
     ):
         super(WiegandGPIOReader, self).__init__(
             event_queue, config_name, d0_pin, d1_pin
         )
         self._on_scan = on_scan
-        # The limited-size queue protects from a slow leak in case of deadlock, so
-        # we can detect and output something (just a print for now)
-        self.bitqueue = queue.Queue(int(queue_size))
+        # Bits past this are dropped, so that a stuck line can't grow a frame
+        # forever.
+        self.max_bits = int(max_bits)
         self.timeout_in_seconds = float(timeout_in_ms) / 1000
-
-        if self._on_scan:
-            self.d0_input_device.when_activated = self.decode;
-            self.d1_input_device.when_activated = self.decode;
+        if output not in (OUTPUT_BITS, OUTPUT_CARD):
+            raise ValueError("Unknown Wiegand output", output)
+        self.output = output
+        self.frame_bits = int(frame_bits)
+        # The frame so far: bits in an int, first bit most significant.
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._value = 0
+        self._length = 0
+        self._last_bit_at = None
+        # Moving average of the time between bits within a frame.
+        self.bit_interval = None
+        # (value, length) of frames that have ended but not been taken.
+        self._frames = collections.deque()
+        # Called (from the GPIO thread) when a frame starts or ends early; used
+        # by the async adapter in place of _changed.
+        self.on_change = None
+        self.rejected = 0
+
+        if self._on_scan and self.d0_input_device:
+            self.d0_input_device.when_activated = self.decode
+            self.d1_input_device.when_activated = self.decode
+
+    def gap(self):
+        """Returns the time without bits that ends a frame, in seconds."""
+        if not self.adaptive_gap or self.bit_interval is None:
+            return self.timeout_in_seconds
+        return min(
+            self.timeout_in_seconds, max(MIN_GAP, GAP_FACTOR * self.bit_interval)
+        )
 
     def decode(self, channel):
-        bit = "0" if channel == self.d0_input_device else "1"
-        try:
-            self.bitqueue.put_nowait(bit)
-        except queue.Full:
-            # This shouldn't happen.
-            print("{name} BUG: QUEUE FULL".format(name=self.__class__.__name__))
+        # Timestamped before anything else, so waiting on the lock doesn't count.
+        now = monotonic()
+        bit = 0 if channel == self.d0_input_device else 1
+        self.add_bits([(now, bit)])
+
+    def add_bits(self, bits):
+        """Adds (timestamp, bit) pairs, oldest first, to the frames."""
+        changed = False
+        with self._lock:
+            for now, bit in bits:
+                if self._add_bit(now, bit):
+                    changed = True
+            if changed:
+                self._changed.notify()
+        if changed and self.on_change is not None:
+            self.on_change()
+
+    def _add_bit(self, now, bit):
+        # Called with self._lock held.  Returns whether a frame started or ended.
+        if self._length:
+            interval = now - self._last_bit_at
+            if interval > self.gap():
+                # The reader thread hasn't noticed yet; this is a new card.
+                self._end_frame()
+            elif self.bit_interval is None:
+                self.bit_interval = interval
+            else:
+                self.bit_interval += (interval - self.bit_interval) / 8
+        self._last_bit_at = now
+        if self._length >= self.max_bits:
+            return False
+        self._value = (self._value << 1) | bit
+        self._length += 1
+        if self._length == self.frame_bits:
+            self._end_frame()
+            return True
+        return self._length == 1
+
+    def _end_frame(self):
+        # Called with self._lock held.
+        self._frames.append((self._value, self._length))
+        self._value = 0
+        self._length = 0
+
+    def take_frame(self):
+        """Returns (frame, None) if a frame has ended, or (None, delay).
+
+        frame is (value, length).  delay is how long until the frame could have
+        ended, or None if no frame has started.
+        """
+        with self._lock:
+            return self._take_frame()
+
+    def _take_frame(self):
+        # Called with self._lock held.
+        if not self._frames:
+            if not self._length:
+                return None, None
+            remaining = self._last_bit_at + self.gap() - monotonic()
+            if remaining > 0:
+                return None, remaining
+            self._end_frame()
+        return self._frames.popleft(), None
 
     def read_input(self):
         """
@@ -93,30 +209,45 @@ class WiegandGPIOReader(BaseWiegandPinThread):
           None
 
         Returns:
-          badge value as string of 0's and 1's.
+          (value, length) of the frame, the first bit most significant.
         """
-        # Wait for a first bit to come in
-        bit = self.bitqueue.get(block=True)
-
-        ## this will currently have a race condition where two cards read back
-        ## to back as one giant card
-        bits = [bit]
-        while True:
-            try:
-                bit = self.bitqueue.get(timeout=self.timeout_in_seconds)
-            except queue.Empty:
-                break
-            bits.append(bit)
-
-        return "".join(bits)
+        with self._lock:
+            while True:
+                frame, delay = self._take_frame()
+                if frame is not None:
+                    return frame
+                # Wakes up when a frame starts, and then once per gap, not once
+                # per bit.
+                self._changed.wait(delay)
+
+    def badge_for(self, frame):
+        """Returns what the app is given for frame, or None to drop it."""
+        value, length = frame
+        fmt = wiegand.FORMATS.get(length)
+        try:
+            if self.output == OUTPUT_CARD:
+                credential = wiegand.decode(value, length)
+                if credential.facility is None:
+                    return str(credential.card)
+                return "%d-%d" % (credential.facility, credential.card)
+            if fmt is not None and not fmt.check(value):
+                raise wiegand.WiegandError("Bad parity", fmt.name, value)
+        except wiegand.WiegandError as e:
+            self.rejected += 1
+            print("Dropped Wiegand frame", wiegand.to_bits(value, length), e)
+            return None
+        return wiegand.to_bits(value, length)
+
+    def emit(self, frame):
+        badge = self.badge_for(frame)
+        if badge is not None:
+            self.event_queue.put((self._on_scan, badge))
 
     def run_inner(self):
-        line = self.read_input()
-        self.event_queue.put((self._on_scan, line))
+        self.emit(self.read_input())
 
     def close(self):
         if self.d0_input_device:
             self.d0_input_device.close()
         if self.d1_input_device:
             self.d1_input_device.close()
-
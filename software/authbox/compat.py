@@ -25,3 +25,64 @@ try:
     import ConfigParser as configparser
 except ImportError:
     import configparser  # noqa: F401
+
+import subprocess
+import time
+
+try:
+    from time import monotonic
+except ImportError:
+    # Python 2 has no monotonic clock in the standard library.
+    from time import time as monotonic  # noqa: F401
+
+try:
+    from subprocess import TimeoutExpired
+except ImportError:
+
+    class TimeoutExpired(Exception):
+        """Python 3's subprocess.TimeoutExpired, for Python 2."""
+
+        def __init__(self, cmd, timeout):
+            super(TimeoutExpired, self).__init__(cmd, timeout)
+            self.cmd = cmd
+            self.timeout = timeout
+
+try:
+    import httplib as http_client
+except ImportError:
+    import http.client as http_client  # noqa: F401
+
+try:
+    from urllib import urlencode
+
+    from urlparse import urlsplit
+except ImportError:
+    from urllib.parse import urlencode, urlsplit  # noqa: F401
+
+
+def _polling_call(args, timeout=None):
+    """subprocess.call with a timeout, for Python 2, which has none.
+
+    Polls the command, backing off up to 50ms between checks, and kills it
+    (raising TimeoutExpired) once timeout seconds have passed.
+    """
+    proc = subprocess.Popen(args)
+    if timeout is None:
+        return proc.wait()
+    deadline = monotonic() + timeout
+    delay = 0.0005
+    while proc.poll() is None:
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            proc.kill()
+            proc.wait()
+            raise TimeoutExpired(args, timeout)
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.05)
+    return proc.returncode
+
+
+if hasattr(subprocess, "TimeoutExpired"):
+    subprocess_call = subprocess.call
+else:
+    subprocess_call = _polling_call
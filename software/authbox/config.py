@@ -17,6 +17,8 @@
 """
 import os.path
 import re
+import shlex
+import string
 
 from authbox.compat import configparser
 
@@ -63,6 +65,53 @@ class CycleError(Exception):
     pass
 
 
+class TemplateError(ValueError):
+    """A command template that can't be split or formatted."""
+
+
+class CommandTemplate(object):
+    """A command line, split and checked once, to fill in per event.
+
+    The value has already had {key} references resolved (see Config.get); those
+    are considered safe and spaces in them separate args.  What's left are {}
+    and {0} style references to the positional args given to format(), which
+    are substituted within single args, so a badge "number" containing spaces
+    or quotes is still one arg.
+    """
+
+    def __init__(self, value, nargs=1):
+        try:
+            pieces = shlex.split(value)
+        except ValueError as e:
+            raise TemplateError(value, e)
+        if not pieces:
+            raise TemplateError(value, "empty command")
+        placeholders = ("x",) * nargs
+        # (is_literal, text) for each arg
+        self._pieces = []
+        for piece in pieces:
+            try:
+                fields = [f for _, f, _, _ in string.Formatter().parse(piece)]
+                formatted = piece.format(*placeholders)
+            except (ValueError, IndexError, KeyError) as e:
+                raise TemplateError(value, e)
+            if any(f is not None for f in fields):
+                self._pieces.append((False, piece))
+            else:
+                # Still formatted, so that {{ and }} become braces.
+                self._pieces.append((True, formatted))
+        self.value = value
+        self.nargs = nargs
+
+    def format(self, *args):
+        """Returns the argv list with args substituted."""
+        if len(args) != self.nargs:
+            raise TypeError("Expected %d args, got %d" % (self.nargs, len(args)))
+        return [
+            text if literal else text.format(*args) for literal, text in self._pieces
+        ]
+
+
 class Config(object):
     # TODO more than one filename?
     def __init__(self, filename):
@@ -82,6 +131,13 @@ class Config(object):
         else:
             return value
 
+    def get_command(self, section, option, nargs=1):
+        """Returns a CommandTemplate for option; raises TemplateError if bad."""
+        return CommandTemplate(self.get(section, option), nargs)
+
+    def has_option(self, section, option):
+        return self._config.has_option(section, option)
+
     @classmethod
     def parse_time(cls, time_string):
         """Parse a time string.
@@ -125,6 +181,22 @@ class Config(object):
                 total += unit_multiplier * number
             return total
 
+    def get_int(self, section, option, default):
+        if self._config.has_option(section, option):
+            return int(self.get(section, option))
+        else:
+            return default
+
+    def get_list(self, section, option):
+        """Returns a comma-separated option as a list, or [] if it's missing."""
+        if not self._config.has_option(section, option):
+            return []
+        return [
+            item.strip()
+            for item in self.get(section, option).split(",")
+            if item.strip()
+        ]
+
     def get_int_seconds(self, section, option, default):
         if self._config.has_option(section, option):
             return self.parse_time(self.get(section, option))
@@ -0,0 +1,212 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A long-lived helper process spoken to with newline-delimited JSON.
+
+Each request is one line on the helper's stdin, a JSON object with an "id";
+the helper writes one line per request to stdout, a JSON object with the same
+"id".  Responses may come back in any order.  Anything the helper writes to
+stderr goes to ours.
+
+The helper is started on first use, and again on the next call after it exits.
+A call that times out kills it, just like a command that takes too long.
+"""
+
+from __future__ import print_function
+
+import itertools
+import json
+import subprocess
+import threading
+import time
+
+from authbox.api import JobTimeout
+from authbox.compat import monotonic, queue
+
+# Requests waiting to be written to the helper, at most; more than this means
+# it has stopped reading, and further calls time out.
+MAX_QUEUED = 64
+# How long close() lets the helper exit on its own before killing it.
+CLOSE_TIMEOUT = 1
+
+
+class CoprocessError(Exception):
+    """The helper died, or couldn't be started, before answering."""
+
+
+class _Pending(object):
+    def __init__(self):
+        self.proc = None
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class Coprocess(object):
+    def __init__(self, command):
+        self.command = command
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._proc = None
+        # Lines for self._proc's writer thread; None stops it.
+        self._requests = None
+        # id -> _Pending, for requests sent to self._proc
+        self._pending = {}
+        self.starts = 0
+
+    def call(self, request, timeout=None):
+        """Sends request (a dict) and returns the response dict.
+
+        Raises JobTimeout or CoprocessError.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        pending = _Pending()
+        with self._lock:
+            request_id = next(self._ids)
+            line = json.dumps(dict(request, id=request_id)) + "\n"
+            proc = self._ensure_started()
+            requests = self._requests
+            pending.proc = proc
+            self._pending[request_id] = pending
+
+        # The writing is done by another thread, never under self._lock: a
+        # helper that's blocked writing responses stops reading requests, and
+        # only the reader thread (which needs the lock) can unblock it.
+        try:
+            requests.put(line, timeout=timeout)
+        except queue.Full:
+            pass
+        else:
+            remaining = None if deadline is None else max(0, deadline - monotonic())
+            if pending.done.wait(remaining):
+                if pending.error is not None:
+                    raise pending.error
+                return pending.response
+        with self._lock:
+            self._pending.pop(request_id, None)
+            if self._proc is proc:
+                print("Helper timed out; restarting it")
+                self._kill(proc)
+        raise JobTimeout(self.command, timeout)
+
+    def _ensure_started(self):
+        # Called with self._lock held.
+        if self._proc is None:
+            try:
+                proc = subprocess.Popen(
+                    self.command,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    universal_newlines=True,
+                    bufsize=1,
+                )
+            except OSError as e:
+                raise CoprocessError(self.command, e)
+            self.starts += 1
+            self._proc = proc
+            self._requests = queue.Queue(MAX_QUEUED)
+            for target, name in (
+                (self._write_requests, "coprocess writer"),
+                (self._read_responses, "coprocess reader"),
+            ):
+                th = threading.Thread(
+                    target=target, args=(proc, self._requests), name=name
+                )
+                th.daemon = True
+                th.start()
+        return self._proc
+
+    def _kill(self, proc):
+        # Called with self._lock held.  The reader sees EOF and fails anything
+        # still pending.
+        if self._proc is proc:
+            self._proc = None
+            self._requests = None
+        try:
+            proc.kill()
+        except OSError:
+            pass
+
+    def _write_requests(self, proc, requests):
+        try:
+            for line in iter(requests.get, None):
+                proc.stdin.write(line)
+                proc.stdin.flush()
+        except (IOError, OSError, ValueError):
+            # It died (or was killed); the reader fails what's pending.
+            # ValueError is writing to a closed pipe.
+            with self._lock:
+                self._kill(proc)
+        try:
+            proc.stdin.close()
+        except (IOError, OSError):
+            pass
+
+    def _read_responses(self, proc, requests):
+        for line in proc.stdout:
+            try:
+                response = json.loads(line)
+                request_id = response["id"]
+            except (ValueError, KeyError, TypeError):
+                print("Bad line from helper:", repr(line))
+                continue
+            with self._lock:
+                # None if it already timed out.
+                pending = self._pending.pop(request_id, None)
+            if pending is not None:
+                pending.response = response
+                pending.done.set()
+        returncode = proc.wait()
+        try:
+            proc.stdout.close()
+        except (IOError, OSError):
+            pass
+        try:
+            # Stops the writer, unless it's busy (and about to fail) writing.
+            requests.put_nowait(None)
+        except queue.Full:
+            pass
+        with self._lock:
+            if self._proc is proc:
+                self._proc = None
+                self._requests = None
+            print("Helper exited with", returncode)
+            # Only fail requests that were sent to this process.
+            for request_id, pending in list(self._pending.items()):
+                if pending.proc is proc:
+                    del self._pending[request_id]
+                    pending.error = CoprocessError(self.command, returncode)
+                    pending.done.set()
+
+    def close(self):
+        with self._lock:
+            proc, requests = self._proc, self._requests
+            self._proc = None
+            self._requests = None
+        if proc is None:
+            return
+        try:
+            # The writer closes stdin after what's queued, so the helper sees
+            # EOF and can exit by itself.
+            requests.put_nowait(None)
+        except queue.Full:
+            pass
+        deadline = monotonic() + CLOSE_TIMEOUT
+        while proc.poll() is None and monotonic() < deadline:
+            time.sleep(0.01)
+        if proc.poll() is None:
+            try:
+                proc.kill()
+            except OSError:
+                pass
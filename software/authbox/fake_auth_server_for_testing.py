@@ -0,0 +1,159 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Stand-in for an auth server speaking docs/server/Protocol.md.
+
+Run it directly for trying out a box against it:
+
+    python -m authbox.fake_auth_server_for_testing 8080 1234 5678
+
+allows badges 1234 and 5678 on http://localhost:8080/api/v1/check.
+"""
+
+from __future__ import print_function
+
+import json
+import sys
+import threading
+
+from authbox.compat import urlsplit
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qsl
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qsl
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        params = dict(parse_qsl(parts.query, keep_blank_values=True))
+        with self.server.lock:
+            self.server.requests.append(params)
+        if parts.path == "/api/v1/acl":
+            return self.acl_changes(params)
+        if parts.path != "/api/v1/check":
+            status = 404
+        elif self.server.check_status is not None:
+            status = self.server.check_status
+        elif self.server.api_key is not None and (
+            params.get("api_key") != self.server.api_key
+        ):
+            status = 403
+        elif params.get("state") == "cancel":
+            status = 200
+        elif params.get("badge_id") in self.server.authorized:
+            status = 200
+        else:
+            status = 403
+        body = b"OK\n" if status == 200 else b"Denied\n"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def acl_changes(self, params):
+        with self.server.lock:
+            log = list(self.server.acl_log)
+        since = params.get("since", "")
+        if since.isdigit() and int(since) <= len(log):
+            response = {"version": len(log), "changes": log[int(since) :]}
+        else:
+            # Unknown version; send everyone.
+            members = {}
+            for change in log:
+                members[change["badge_id"]] = change
+            changes = [c for c in members.values() if c.get("tools") is not None]
+            response = {"version": len(log), "full": True, "changes": changes}
+        body = json.dumps(response).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if urlsplit(self.path).path != "/api/v1/report":
+            status = 404
+        elif self.server.fail_reports:
+            status = 503
+        else:
+            status = 200
+            with self.server.lock:
+                for event in json.loads(body.decode("utf-8"))["events"]:
+                    # Resent events are only counted once.
+                    self.server.events.setdefault(event["id"], event)
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeAuthServer(ThreadingMixIn, HTTPServer):
+    """Allows the badge ids in authorized; records requests' params."""
+
+    daemon_threads = True
+
+    def __init__(self, authorized=(), api_key=None, port=0, ssl_context=None):
+        HTTPServer.__init__(self, ("127.0.0.1", port), _Handler)
+        if ssl_context is not None:
+            self.socket = ssl_context.wrap_socket(self.socket, server_side=True)
+        self.authorized = set(authorized)
+        self.api_key = api_key
+        self.lock = threading.Lock()
+        self.requests = []
+        # ACL changes, as {"badge_id": ..., "tools": [...] or None}; the
+        # version is the number of them.
+        self.acl_log = []
+        # Reported events, by id
+        self.events = {}
+        self.fail_reports = False
+        # If set, the status for every check, whatever the badge.
+        self.check_status = None
+        self.connections = 0
+        self.scheme = "https" if ssl_context is not None else "http"
+
+    @property
+    def base_url(self):
+        return "%s://localhost:%d" % (self.scheme, self.server_address[1])
+
+    def start(self):
+        th = threading.Thread(target=self.serve_forever, name="FakeAuthServer")
+        th.daemon = True
+        th.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    server = FakeAuthServer(sys.argv[2:], port=int(sys.argv[1]))
+    print("Serving on", server.base_url)
+    server.serve_forever()
@@ -0,0 +1,31 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""fake_evdev_device_for_testing, for asyncio (Python 3 only)."""
+
+import asyncio
+
+# list_devices is for tests to patch into evdev alongside AsyncInputDevice.
+from authbox.fake_evdev_device_for_testing import (  # noqa: F401
+    InputDevice,
+    list_devices,
+)
+
+
+class AsyncInputDevice(InputDevice):
+    async def async_read_loop(self):
+        """Like read_loop, but then waits forever like a real device would."""
+        for ev in self.read_loop():
+            yield ev
+        await asyncio.Future()
@@ -0,0 +1,102 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test helper that replays recorded GPIO edges like gpio_cdev.LineEventReader.
+
+Recordings are text, one edge per line: the kernel timestamp in ns, the line
+offset, and optionally the edge (1 rising, 2 falling; the default).  Blank
+lines and lines starting with # are ignored.
+"""
+
+import threading
+import time
+
+from authbox.compat import monotonic
+from authbox.gpio_cdev import EDGE_FALLING
+
+
+class FakeChip(object):
+    """Returns the recorded edges in real time, starting at the first read.
+
+    Like the kernel, each read returns every edge that's due, so a read after
+    a delay gets a batch.
+    """
+
+    def __init__(self, events):
+        # (timestamp_ns, offset, edge)
+        self.events = [tuple(e) + (EDGE_FALLING,) * (3 - len(e)) for e in events]
+        self._next = 0
+        # Added to recorded times (in seconds) to get monotonic() times.
+        self._offset = None
+        self._closed = threading.Event()
+        self.reads = 0
+
+    @classmethod
+    def load(cls, path):
+        events = []
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    events.append([int(x) for x in line.split()])
+        return cls(events)
+
+    @classmethod
+    def from_frames(cls, frames, d0_line, d1_line, bit_ns=2000000, gap_ns=50000000):
+        """Records frames (value, length) sent with bit_ns between bits."""
+        events = []
+        t = 1000000000
+        for value, length in frames:
+            for i in range(length - 1, -1, -1):
+                events.append((t, d1_line if value >> i & 1 else d0_line))
+                t += bit_ns
+            t += gap_ns
+        return cls(events)
+
+    def save(self, path):
+        with open(path, "w") as f:
+            for event in self.events:
+                f.write("%d %d %d\n" % event)
+
+    def read_events(self, timeout=None):
+        self.reads += 1
+        if self._closed.is_set():
+            # Don't let a reader thread that outlives its test spin.
+            time.sleep(timeout if timeout is not None else 1)
+            return []
+        now = monotonic()
+        if self._offset is None and self.events:
+            self._offset = now - self.events[0][0] / 1e9
+        if self._next < len(self.events):
+            due = self.events[self._next][0] / 1e9 + self._offset
+            wait = due - now
+            if timeout is not None:
+                wait = min(wait, timeout)
+            if wait > 0:
+                self._closed.wait(wait)
+        elif not self._closed.wait(timeout if timeout is not None else 1):
+            return []
+        now = monotonic()
+        batch = []
+        while self._next < len(self.events):
+            timestamp_ns, offset, edge = self.events[self._next]
+            t = timestamp_ns / 1e9 + self._offset
+            if t > now:
+                break
+            batch.append((t, offset, edge))
+            self._next += 1
+        return batch
+
+    def close(self):
+        self._closed.set()
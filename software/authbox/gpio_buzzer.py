@@ -53,6 +53,15 @@ class Buzzer(BasePinThread):
 
     def run_inner(self, block=True):
         item = self.set_queue.get(block=block)
+        for delay in self.play(item):
+            time.sleep(delay)
+
+    def play(self, item):
+        """Applies one item from set_queue.
+
+        This is a generator that yields the number of seconds to sleep between
+        steps, so that the same pattern can be driven by a thread or a coroutine.
+        """
         next_mode = item[0]
         if next_mode == OFF:
             self.gpio_buzzer.off()
@@ -66,9 +75,9 @@ class Buzzer(BasePinThread):
                     print("Done beeping")
                     break
                 self.gpio_buzzer.on()
-                time.sleep(item[1])
+                yield item[1]
                 self.gpio_buzzer.off()
-                time.sleep(item[2])
+                yield item[2]
                 if next_mode == BEEP:
                     break
                 print("...more beep")
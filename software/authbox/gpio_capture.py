@@ -0,0 +1,278 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""GPIO edge capture in a small process of its own.
+
+The capture process only reads edges (see gpio_cdev) and copies them into a
+ring in shared memory, so nothing in the main process -- garbage collection,
+a slow handler, a subprocess being started -- holds it up.  It can also run at
+real-time priority.  The main process is woken through a pipe, and decodes the
+edges as if it had read them itself: CaptureProcess has the same read_events
+as gpio_cdev.LineEventReader.
+"""
+
+from __future__ import print_function
+
+import errno
+import fcntl
+import gc
+import mmap
+import multiprocessing
+import os
+import select
+import signal
+import struct
+import threading
+import time
+import traceback
+
+# Enough for several frames, even if the main process is slow to get to them.
+DEFAULT_SLOTS = 1024
+# How often, at most, each process checks that the other is still there.
+CHECK_INTERVAL = 1.0
+
+# Each slot is a sequence number, then the edge: timestamp in seconds, line
+# offset, edge.  Edge n (from 1) is being written while its slot's number is
+# 2n - 1, and is complete once it's 2n.
+SEQ = struct.Struct("=Q")
+EDGE = struct.Struct("=dII")
+SLOT_SIZE = SEQ.size + EDGE.size
+
+
+class EdgeRing(object):
+    """Edges in shared memory, from one writing process to one reading process.
+
+    Each slot is a seqlock: the writer makes its number odd, writes the edge,
+    then makes the number even, and the reader only keeps an edge if the number
+    was even and the same before and after reading it.  So the reader never
+    has to trust a separate count: it takes slots until it finds one that
+    hasn't been written yet.  If the writer laps the reader, the oldest edges
+    are lost and counted in overruns.
+
+    Python has no memory barriers, so on a multi-core ARM the writer's stores
+    are only certain to be seen in order once something else orders them; the
+    doorbell write after each batch is a system call, which does.  Before
+    that, the recheck turns a torn read into a retry.
+    """
+
+    def __init__(self, slots=DEFAULT_SLOTS):
+        self.slots = slots
+        # Anonymous and shared, so it's the same memory after a fork.
+        self.buf = mmap.mmap(-1, slots * SLOT_SIZE)
+        # Only meaningful in the writing process.
+        self.written = 0
+        # Only meaningful in the reading process.
+        self.read = 0
+        self.overruns = 0
+
+    def put(self, events):
+        """Adds (timestamp, offset, edge) tuples, oldest first."""
+        for t, offset, edge in events:
+            pos = self.written % self.slots * SLOT_SIZE
+            self.written += 1
+            SEQ.pack_into(self.buf, pos, 2 * self.written - 1)
+            EDGE.pack_into(self.buf, pos + SEQ.size, t, offset, edge)
+            SEQ.pack_into(self.buf, pos, 2 * self.written)
+
+    def resume(self):
+        """Numbers further puts on from the slots, for a new writing process.
+
+        A forked writer starts with the count as it was in the parent, not
+        where the last writer got to.  An edge the last writer didn't finish is
+        written again.
+        """
+        seq = max(
+            SEQ.unpack_from(self.buf, i * SLOT_SIZE)[0] for i in range(self.slots)
+        )
+        self.written = seq // 2
+
+    def take(self):
+        """Returns the edges put since the last take, oldest first."""
+        events = []
+        while True:
+            pos = self.read % self.slots * SLOT_SIZE
+            (seq,) = SEQ.unpack_from(self.buf, pos)
+            number = (seq + 1) // 2
+            if number > self.read + 1:
+                # Lapped; the oldest edge still here is the one after number.
+                self.overruns += number - self.slots - self.read
+                self.read = number - self.slots
+                continue
+            if number <= self.read or seq % 2:
+                # Not written yet, or still being written.
+                return events
+            t, offset, edge = EDGE.unpack_from(self.buf, pos + SEQ.size)
+            if SEQ.unpack_from(self.buf, pos)[0] != seq:
+                # Lapped while reading it.
+                continue
+            events.append((t, offset, edge))
+            self.read = number
+
+    def close(self):
+        self.buf.close()
+
+
+def _set_nonblocking(fd):
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+
+def _warn(message):
+    # Not print: the stdout lock could have been held by another of the
+    # parent's threads when it forked.
+    os.write(2, message.encode("utf-8", "replace"))
+
+
+def _capture(chip, ring, doorbell, parent, priority):
+    try:
+        _capture_loop(chip, ring, doorbell, parent, priority)
+    except Exception:
+        _warn(traceback.format_exc())
+        os._exit(1)
+    # Rather than multiprocessing's exit, which flushes stdout.
+    os._exit(0)
+
+
+def _capture_loop(chip, ring, doorbell, parent, priority):
+    # The main process stops us; don't die of its Ctrl-C first.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if priority:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        except (AttributeError, OSError) as e:
+            _warn("Capturing at normal priority; %s\n" % e)
+    # Nothing here makes reference cycles, so a collection would only add delay.
+    gc.disable()
+    while os.getppid() == parent:
+        events = chip.read_events(CHECK_INTERVAL)
+        if not events:
+            continue
+        ring.put(events)
+        _ring(doorbell)
+
+
+def _ring(doorbell):
+    try:
+        os.write(doorbell, b"\0")
+    except OSError as e:
+        # A full pipe means a wakeup is already waiting.
+        if e.errno != errno.EAGAIN:
+            raise
+
+
+class CaptureProcess(object):
+    """Reads edges from chip in a child process.
+
+    chip is anything with read_events, usually a gpio_cdev.LineEventReader;
+    it's opened here first so that errors, like a missing device, happen in
+    the caller.  priority, if not 0, is the SCHED_FIFO priority (1-99) for the
+    child, which needs root or CAP_SYS_NICE; without it, the child carries on
+    at normal priority.
+
+    fd becomes readable when there are edges to read, for select or an event
+    loop.  If the child dies, it's started again by the next read_events (or
+    check) that finds no edges, and carries on numbering edges where the
+    last one stopped.  close() waits for a read_events in progress on another
+    thread; stop() first makes that return right away.
+    """
+
+    check_interval = CHECK_INTERVAL
+
+    def __init__(self, chip, priority=0, slots=DEFAULT_SLOTS):
+        self.chip = chip
+        self.priority = int(priority)
+        self.ring = EdgeRing(slots)
+        self.fd, self._doorbell = os.pipe()
+        _set_nonblocking(self.fd)
+        _set_nonblocking(self._doorbell)
+        # Forked, although by the time the child is restarted this process has
+        # other threads: chip (perhaps a test fake) and the anonymous ring are
+        # inherited rather than pickled, which spawn and forkserver would need.
+        # The child only runs _capture, which starts no threads and takes no
+        # lock another thread could have held (see _warn).
+        self._context = multiprocessing.get_context("fork")
+        self._process = None
+        self.starts = 0
+        # Held by read_events, so that close() can wait for it.
+        self._reading = threading.Lock()
+        self.stopped = False
+        self._start()
+
+    def _start(self):
+        self.ring.resume()
+        self._process = self._context.Process(
+            target=_capture,
+            args=(self.chip, self.ring, self._doorbell, os.getpid(), self.priority),
+            name="capture",
+        )
+        self._process.daemon = True
+        self._process.start()
+        self.starts += 1
+
+    def check(self):
+        """Starts the child again if it has exited."""
+        if self._process is not None and not self._process.is_alive():
+            print("Capture process exited with", self._process.exitcode)
+            self._start()
+
+    def read_events(self, timeout=None):
+        """Returns the edges captured so far, waiting up to timeout for one."""
+        with self._reading:
+            if not self.stopped:
+                return self._read_events(timeout)
+        # Don't let a reader thread that's still running spin.
+        time.sleep(self.check_interval)
+        return []
+
+    def _read_events(self, timeout):
+        events = self.ring.take()
+        if events:
+            return events
+        if timeout is None or timeout > self.check_interval:
+            timeout = self.check_interval
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if self.stopped:
+            return []
+        if readable:
+            try:
+                os.read(self.fd, 4096)
+            except OSError as e:
+                if e.errno != errno.EAGAIN:
+                    raise
+        events = self.ring.take()
+        if not events:
+            self.check()
+        return events
+
+    def stop(self):
+        """Makes read_events return nothing, right away, from now on."""
+        if not self.stopped:
+            self.stopped = True
+            _ring(self._doorbell)
+
+    def close(self):
+        if self._process is None:
+            return
+        self.stop()
+        # Otherwise a reader could still be in select when the fds are closed,
+        # or find their numbers reused by something else.
+        with self._reading:
+            pass
+        self._process.terminate()
+        self._process.join(self.check_interval)
+        self._process = None
+        os.close(self.fd)
+        os.close(self._doorbell)
+        self.chip.close()
+        self.ring.close()
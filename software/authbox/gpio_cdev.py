@@ -0,0 +1,124 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Edge events from the Linux GPIO character device (uAPI v2).
+
+The kernel timestamps each edge in its interrupt handler and queues it, so
+short pulses aren't lost while Python is busy, and reading returns every edge
+queued so far at once.  Timestamps are CLOCK_MONOTONIC, the same clock as
+authbox.compat.monotonic on Linux.
+
+Only the ioctl and structs needed for edge events are here; see
+include/uapi/linux/gpio.h.
+"""
+
+import errno
+import fcntl
+import os
+import select
+import struct
+
+DEFAULT_CHIP = "/dev/gpiochip0"
+
+# gpio_v2_line_flag
+LINE_FLAG_INPUT = 1 << 2
+LINE_FLAG_EDGE_RISING = 1 << 3
+LINE_FLAG_EDGE_FALLING = 1 << 4
+LINE_FLAG_BIAS_PULL_UP = 1 << 8
+
+# gpio_v2_line_event_id
+EDGE_RISING = 1
+EDGE_FALLING = 2
+
+MAX_LINES = 64
+# struct gpio_v2_line_request: offsets, consumer, config (flags, num_attrs,
+# padding, 10 empty attributes), num_lines, event_buffer_size, padding, fd
+LINE_REQUEST = struct.Struct("=64I32sQI20x240xII20xi")
+# struct gpio_v2_line_event: timestamp_ns, id, offset, seqno, line_seqno
+LINE_EVENT = struct.Struct("=QIIII24x")
+# _IOWR(0xB4, 0x07, struct gpio_v2_line_request)
+GPIO_V2_GET_LINE_IOCTL = (3 << 30) | (LINE_REQUEST.size << 16) | (0xB4 << 8) | 0x07
+
+# Physical (BOARD) pin numbers on the 40-pin header, to line offsets on the
+# Raspberry Pi's main GPIO chip.
+# fmt: off
+BOARD_TO_LINE = {
+    3: 2, 5: 3, 7: 4, 8: 14, 10: 15, 11: 17, 12: 18, 13: 27, 15: 22, 16: 23,
+    18: 24, 19: 10, 21: 9, 22: 25, 23: 11, 24: 8, 26: 7, 27: 0, 28: 1, 29: 5,
+    31: 6, 32: 12, 33: 13, 35: 19, 36: 16, 37: 26, 38: 20, 40: 21,
+}
+# fmt: on
+
+
+def board_to_line(pin):
+    try:
+        return BOARD_TO_LINE[int(pin)]
+    except KeyError:
+        raise ValueError("Not a GPIO pin on the header", pin)
+
+
+class LineEventReader(object):
+    """Edges on some lines of one GPIO chip.
+
+    read_events returns lists of (timestamp in seconds, line offset, edge).
+    """
+
+    def __init__(
+        self,
+        chip_path,
+        offsets,
+        consumer="authbox",
+        flags=LINE_FLAG_INPUT | LINE_FLAG_EDGE_FALLING,
+        buffer_size=0,
+    ):
+        self.offsets = list(offsets)
+        if not 0 < len(self.offsets) <= MAX_LINES:
+            raise ValueError("Bad number of lines", self.offsets)
+        request = bytearray(
+            LINE_REQUEST.pack(
+                *(
+                    self.offsets
+                    + [0] * (MAX_LINES - len(self.offsets))
+                    + [consumer.encode("utf-8")[:31], flags, 0]
+                    + [len(self.offsets), buffer_size, 0]
+                )
+            )
+        )
+        chip_fd = os.open(chip_path, os.O_RDONLY | os.O_CLOEXEC)
+        try:
+            fcntl.ioctl(chip_fd, GPIO_V2_GET_LINE_IOCTL, request)
+        finally:
+            os.close(chip_fd)
+        self.fd = LINE_REQUEST.unpack(bytes(request))[-1]
+
+    def read_events(self, timeout=None):
+        """Returns the edges queued so far, waiting up to timeout for one."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, LINE_EVENT.size * 64)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return []
+            raise
+        return [
+            (timestamp_ns / 1e9, offset, edge)
+            for timestamp_ns, edge, offset, _, _ in LINE_EVENT.iter_unpack(data)
+        ]
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
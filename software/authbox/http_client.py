@@ -0,0 +1,155 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Minimal keep-alive HTTP(S) client for talking to one auth server.
+
+Connections are kept open between requests, so a warm request is a single
+round trip.  When one does have to be reopened, TLS resumes the previous
+session instead of doing a full handshake.
+"""
+
+from __future__ import print_function
+
+import socket
+import threading
+
+from authbox.api import JobTimeout
+from authbox.compat import http_client, monotonic, urlsplit
+
+
+# Requests that can be sent again if the response was lost (RFC 7231 4.2.2).
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+
+
+class _HTTPSConnection(http_client.HTTPSConnection):
+    """Offers the pool's last TLS session when connecting."""
+
+    def __init__(self, pool, host, port, timeout):
+        http_client.HTTPSConnection.__init__(
+            self, host, port, timeout=timeout, context=pool.context
+        )
+        self.pool = pool
+
+    def connect(self):
+        http_client.HTTPConnection.connect(self)
+        self.sock = self.pool.context.wrap_socket(
+            self.sock, server_hostname=self.host, session=self.pool.tls_session
+        )
+        if self.sock.session_reused:
+            self.pool.tls_resumed += 1
+
+
+class ConnectionPool(object):
+    """Up to size idle connections to the server in base_url.
+
+    Safe to use from several threads; each request has a connection to itself.
+    """
+
+    def __init__(self, base_url, size=2, context=None, timeout=30):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip("/")
+        self.size = size
+        self.context = context
+        self.timeout = timeout
+        self.tls_session = None
+        self._lock = threading.Lock()
+        self._idle = []
+        # For tests and stats
+        self.connects = 0
+        self.tls_resumed = 0
+
+    def _new_connection(self, timeout):
+        with self._lock:
+            self.connects += 1
+        if self.scheme == "https":
+            return _HTTPSConnection(self, self.host, self.port, timeout)
+        return http_client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def request(self, method, path, timeout=None, body=None, headers=None):
+        """Returns (status, body) for base_url + path.
+
+        Raises JobTimeout, or IOError/HTTPException if the server can't be
+        reached.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        deadline = monotonic() + timeout
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is not None:
+            sent = False
+            try:
+                self._send(conn, method, path, timeout, body, headers)
+                sent = True
+                return self._receive(conn, timeout)
+            except JobTimeout:
+                raise
+            except (http_client.HTTPException, IOError, OSError):
+                # The server may have closed it while idle; one fresh try, in
+                # whatever time is left.  Not if the server might already have
+                # acted on a request that isn't safe to repeat.
+                if sent and method not in IDEMPOTENT_METHODS:
+                    raise
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    raise JobTimeout(self.host, timeout)
+                timeout = remaining
+        conn = self._new_connection(timeout)
+        self._send(conn, method, path, timeout, body, headers)
+        return self._receive(conn, timeout)
+
+    def _send(self, conn, method, path, timeout, body, headers):
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        try:
+            conn.request(method, self.base_path + path, body, headers or {})
+        except socket.timeout:
+            conn.close()
+            raise JobTimeout(self.host, timeout)
+        except Exception:
+            conn.close()
+            raise
+
+    def _receive(self, conn, timeout):
+        try:
+            response = conn.getresponse()
+            data = response.read()
+        except socket.timeout:
+            conn.close()
+            raise JobTimeout(self.host, timeout)
+        except Exception:
+            conn.close()
+            raise
+        if getattr(conn.sock, "session", None) is not None:
+            # Tickets can arrive after the handshake, so check each time.
+            self.tls_session = conn.sock.session
+        if response.will_close:
+            conn.close()
+        else:
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+        return response.status, data
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
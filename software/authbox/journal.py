@@ -0,0 +1,264 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Append-only local audit journal of what the box did, and when.
+
+Each record is one line of JSON with the wall-clock "time", the "monotonic"
+time (for ordering and intervals that don't jump with NTP), an "event" name,
+and whatever else the caller gave, e.g. "badge_id".  The dispatcher records
+every event it handles; apps add records for decisions like auth answers.
+
+record() only appends to a list; a thread writes what has built up over the
+flush_interval after the first record, and fsyncs once per batch, so a burst
+of events costs one write to the SD card, not one each.  While nothing is
+recorded the thread just sleeps.  close() writes whatever is left.  When the
+file passes max_size it's renamed to <path>.1 (and so on, up to keep files) and
+a new one started.
+
+To search it:
+
+    python -m authbox.journal ~/.authbox_journal --badge 1234 --since 2018-05-01
+"""
+
+from __future__ import print_function
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+
+from authbox.compat import monotonic
+
+DEFAULT_MAX_SIZE = 1024 * 1024
+DEFAULT_KEEP = 4
+DEFAULT_FLUSH_INTERVAL = "1s"
+
+
+class Journal(object):
+    def __init__(
+        self,
+        path,
+        max_size=DEFAULT_MAX_SIZE,
+        keep=DEFAULT_KEEP,
+        flush_interval=1,
+    ):
+        self.path = path
+        self.max_size = max_size
+        self.keep = keep
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        # Notified by the first record of a batch, and by close().
+        self._changed = threading.Condition(self._lock)
+        # Serializes writing and rotation between the writer thread and flush().
+        self._write_lock = threading.Lock()
+        self._buffer = []
+        self._closed = False
+        self._file = open(path, "a")
+        self.batches = 0
+        self._writer = _JournalWriter(self, "journal")
+        self._start_requested = False
+
+    @classmethod
+    def from_config(cls, config):
+        """Returns a Journal if [journal] path is set, otherwise None."""
+        if config is None or not config.has_option("journal", "path"):
+            return None
+        return cls(
+            os.path.expanduser(config.get("journal", "path")),
+            config.get_int("journal", "max_size", DEFAULT_MAX_SIZE),
+            config.get_int("journal", "keep", DEFAULT_KEEP),
+            config.get_int_seconds("journal", "flush_interval", DEFAULT_FLUSH_INTERVAL),
+        )
+
+    def start(self):
+        with self._lock:
+            if self._start_requested:
+                return
+            self._start_requested = True
+        self._writer.start()
+
+    def record(self, event, **fields):
+        """Queues a record; doesn't touch the disk."""
+        fields["event"] = event
+        fields["time"] = time.time()
+        fields["monotonic"] = monotonic()
+        with self._lock:
+            self._buffer.append(fields)
+            if len(self._buffer) == 1:
+                self._changed.notify()
+
+    def _wait_for_batch(self):
+        """Waits for a record, then flush_interval for more; False once closed."""
+        with self._lock:
+            while not self._buffer and not self._closed:
+                self._changed.wait()
+            deadline = monotonic() + self.flush_interval
+            while not self._closed:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return True
+                self._changed.wait(remaining)
+            return False
+
+    def flush(self):
+        """Writes and fsyncs everything recorded so far."""
+        with self._write_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch or self._file.closed:
+                return
+            # default=str, so an odd argument can't lose the whole batch.
+            lines = [json.dumps(r, sort_keys=True, default=str) for r in batch]
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.batches += 1
+            if self._file.tell() >= self.max_size:
+                self._rotate()
+
+    def _rotate(self):
+        # Called with self._write_lock held.
+        self._file.close()
+        for i in range(self.keep - 1, 0, -1):
+            older = "%s.%d" % (self.path, i)
+            if os.path.exists(older):
+                os.rename(older, "%s.%d" % (self.path, i + 1))
+        if self.keep > 0:
+            os.rename(self.path, self.path + ".1")
+        else:
+            os.unlink(self.path)
+        self._file = open(self.path, "a")
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._changed.notify_all()
+        if self._writer.is_alive():
+            # So it can't be mid-write when the file is closed.
+            self._writer.join(self.flush_interval + 1)
+        self.flush()
+        with self._write_lock:
+            self._file.close()
+
+
+class _JournalWriter(threading.Thread):
+    # Not a BaseDerivedThread, since authbox.api imports this module.
+    def __init__(self, journal, config_name):
+        super(_JournalWriter, self).__init__(name="Journal " + config_name)
+        self.daemon = True
+        self.journal = journal
+
+    def run(self):
+        # close() does the last flush.
+        while self.journal._wait_for_batch():
+            try:
+                self.journal.flush()
+            except Exception:
+                # e.g. a full disk; keep the box running, and try again.
+                traceback.print_exc()
+
+
+def journal_files(path):
+    """Returns path and its rotated files that exist, oldest first."""
+    files = []
+    i = 1
+    while os.path.exists("%s.%d" % (path, i)):
+        files.insert(0, "%s.%d" % (path, i))
+        i += 1
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def _mentions(record, badge_id):
+    if record.get("badge_id") == badge_id:
+        return True
+    return badge_id in (record.get("args") or ())
+
+
+def query(path, badge_id=None, since=None, until=None):
+    """Yields records (as dicts) from the journal and its rotated files.
+
+    since and until are wall-clock times; records are in the order they were
+    written.
+    """
+    # As it appears in a line of JSON.
+    needle = None if badge_id is None else json.dumps(badge_id)[1:-1]
+    for name in journal_files(path):
+        if since is not None and os.path.getmtime(name) < since:
+            # Nothing was written to it after since.
+            continue
+        with open(name) as f:
+            for line in f:
+                # Cheap test before parsing; most lines won't mention the badge.
+                if needle is not None and needle not in line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # e.g. a partial line from losing power mid-write
+                    continue
+                t = record.get("time", 0)
+                if since is not None and t < since:
+                    continue
+                if until is not None and t >= until:
+                    # Not return; the clock may have been set back since.
+                    continue
+                if badge_id is not None and not _mentions(record, badge_id):
+                    continue
+                yield record
+
+
+def parse_when(value):
+    """Parses seconds since the epoch, or a local date like 2018-05-01[T12:30]."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+        try:
+            parsed = datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return time.mktime(parsed.timetuple())
+    raise argparse.ArgumentTypeError("Unknown time %r" % value)
+
+
+def main(args):
+    parser = argparse.ArgumentParser(prog="python -m authbox.journal")
+    parser.add_argument("path", help="the [journal] path")
+    parser.add_argument("--badge", help="only records for this badge id")
+    parser.add_argument("--since", type=parse_when)
+    parser.add_argument("--until", type=parse_when)
+    parser.add_argument("--json", action="store_true", help="print raw records")
+    options = parser.parse_args(args)
+    path = os.path.expanduser(options.path)
+    for record in query(path, options.badge, options.since, options.until):
+        if options.json:
+            print(json.dumps(record, sort_keys=True))
+            continue
+        when = datetime.datetime.fromtimestamp(record.pop("time", 0))
+        record.pop("monotonic", None)
+        event = record.pop("event", "?")
+        rest = " ".join("%s=%s" % (k, record[k]) for k in sorted(record))
+        print(when.strftime("%Y-%m-%d %H:%M:%S"), event, rest)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
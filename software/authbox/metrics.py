@@ -0,0 +1,123 @@
+# Copyright 2017-2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cheap latency histograms for the dispatcher.
+
+These are cheap enough to leave on all the time: recording a value is a frexp
+and a list increment, with no allocation.
+"""
+
+from __future__ import division, print_function
+
+import math
+
+# Each power of two (in microseconds) is split into this many linear buckets,
+# so percentiles are accurate to within 1/SUBBUCKETS of an octave.
+SUBBUCKETS = 4
+# 2**40 us is about 12 days; anything longer goes in the last bucket.
+OCTAVES = 40
+
+
+class Histogram(object):
+    """Log-bucketed histogram of durations in seconds."""
+
+    def __init__(self):
+        self.buckets = [0] * (OCTAVES * SUBBUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[_bucket(seconds)] += 1
+
+    def percentile(self, p):
+        """Returns an upper bound for the p-th percentile (0-100), in seconds."""
+        if not self.count:
+            return 0.0
+        threshold = self.count * p / 100.0
+        seen = 0
+        for i, n in enumerate(self.buckets[:-1]):
+            seen += n
+            if n and seen >= threshold:
+                return min(_upper_bound(i), self.max)
+        # The last bucket has no upper bound.
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+def _bucket(seconds):
+    us = seconds * 1e6
+    if us < 1:
+        return 0
+    mantissa, exponent = math.frexp(us)
+    # mantissa is in [0.5, 1)
+    i = exponent * SUBBUCKETS + int((mantissa - 0.5) * 2 * SUBBUCKETS)
+    return min(i, OCTAVES * SUBBUCKETS - 1)
+
+
+def _upper_bound(i):
+    if i < SUBBUCKETS:
+        # Everything under a microsecond.
+        return 1e-6
+    exponent, sub = divmod(i, SUBBUCKETS)
+    return math.ldexp(0.5 + (sub + 1) / (2.0 * SUBBUCKETS), exponent) / 1e6
+
+
+class HandlerStats(object):
+    """How long one callback's events waited in the queue, and ran."""
+
+    def __init__(self, name):
+        self.name = name
+        self.wait = Histogram()
+        self.run = Histogram()
+
+    def record(self, wait_seconds, run_seconds):
+        self.wait.record(wait_seconds)
+        self.run.record(run_seconds)
+
+
+def format_stats(stats):
+    """Formats an iterable of HandlerStats as a table, slowest handler first."""
+    lines = [
+        "%-40s %8s %9s %9s %9s %9s %9s %9s"
+        % ("handler", "count", "wait p50", "p99", "max", "run p50", "p99", "max")
+    ]
+    for s in sorted(stats, key=lambda s: s.run.max, reverse=True):
+        w = s.wait.summary()
+        r = s.run.summary()
+        lines.append(
+            "%-40s %8d %8.1fms %8.1fms %8.1fms %8.1fms %8.1fms %8.1fms"
+            % (
+                s.name[:40],
+                s.run.count,
+                w["p50"] * 1e3,
+                w["p99"] * 1e3,
+                w["max"] * 1e3,
+                r["p50"] * 1e3,
+                r["p99"] * 1e3,
+                r["max"] * 1e3,
+            )
+        )
+    return "\n".join(lines)
@@ -0,0 +1,312 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Reports session events (extend, cancel) without waiting on the network.
+
+SessionReporter.record appends the event to a local log and returns; a thread
+sends pending events in batches, retrying with backoff until they're
+delivered, and remembers how far it got in a separate file.  Events not yet
+delivered when the box restarts are sent after it comes back.
+
+Each event has a unique "id" so that a server can drop duplicates; an event
+may be sent more than once if the box restarts mid-batch.
+
+Only failures that might go away (the server can't be reached, times out, or
+has an error of its own) are retried.  Events the server refuses outright are
+set aside in a ".rejected" file next to the log, so that they don't hold up
+the ones after them.
+
+The log is JSON, one event per line.  Appends are flushed straight away, and
+fsync'd before each batch is sent.
+"""
+
+from __future__ import print_function
+
+import json
+import os
+import threading
+import time
+import uuid
+
+from authbox.api import BaseDerivedThread, JobTimeout
+from authbox.auth import STATE_CANCEL, STATE_EXTEND, NoAnswer
+from authbox.compat import http_client, monotonic, urlsplit
+from authbox.http_client import ConnectionPool
+
+DEFAULT_BATCH_SIZE = 50
+MIN_RETRY_DELAY = 1
+MAX_RETRY_DELAY = 300
+# Once everything is delivered, a log bigger than this is emptied.
+COMPACT_SIZE = 64 * 1024
+# Failures worth retrying; anything else from a sender rejects the event.
+TRANSIENT_ERRORS = (EnvironmentError, http_client.HTTPException, JobTimeout, NoAnswer)
+
+
+class RejectedEvents(Exception):
+    """Raised by a sender when the first count events will never be accepted."""
+
+    def __init__(self, count, reason):
+        super(RejectedEvents, self).__init__(count, reason)
+        self.count = count
+        self.reason = reason
+
+
+class SessionReporter(object):
+    """Durable, batched delivery of session events to send(events).
+
+    send is called on the reporter's own thread with a list of event dicts,
+    and returns how many (from the start of the list) were delivered, or raises
+    (RejectedEvents for ones not to retry).  If path is None, pending events
+    are only kept in memory, and rejected ones are dropped.
+    """
+
+    def __init__(self, path, send, batch_size=DEFAULT_BATCH_SIZE, fields=None):
+        self.path = path
+        self.send = send
+        self.batch_size = batch_size
+        # Added to every event, e.g. tool and location
+        self.fields = fields or {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._pending = []
+        self._sequence = 0
+        self._acked = 0
+        self._log = None
+        self.delivered = 0
+        self.rejected = 0
+        self.failures = 0
+        if path is not None:
+            self._load()
+            self._log = open(path, "a")
+        self._uploader = _Uploader(self, "reporter")
+        self._start_requested = False
+
+    @classmethod
+    def from_config(cls, config, backend):
+        """Reports via [reporting] url if set, otherwise through backend."""
+        path = None
+        if config.has_option("reporting", "log"):
+            path = os.path.expanduser(config.get("reporting", "log"))
+        timeout = config.get_int_seconds("auth", "timeout", "30s")
+        if config.has_option("reporting", "url"):
+            send = HttpBatchSender(config.get("reporting", "url"), timeout)
+        else:
+            # Configs from before reporting needn't have an extend_command.
+            for state in (STATE_EXTEND, STATE_CANCEL):
+                if not backend.supports(state):
+                    print("Not reporting", state, "events; no command for them")
+            send = BackendSender(backend, timeout)
+        fields = {}
+        for name in ("tool", "location"):
+            if config.has_option("auth", name):
+                fields[name] = config.get("auth", name)
+        return cls(
+            path,
+            send,
+            config.get_int("reporting", "batch_size", DEFAULT_BATCH_SIZE),
+            fields,
+        )
+
+    def _load(self):
+        try:
+            with open(self.path + ".acked") as f:
+                self._acked = int(f.read().strip() or 0)
+        except (IOError, ValueError):
+            self._acked = 0
+        self._sequence = self._acked
+        try:
+            f = open(self.path)
+        except IOError:
+            return
+        with f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                    seq = event["seq"]
+                except (ValueError, KeyError, TypeError):
+                    # e.g. a partial line from losing power mid-write
+                    continue
+                self._sequence = max(self._sequence, seq)
+                if seq > self._acked:
+                    self._pending.append(event)
+
+    def start(self):
+        with self._lock:
+            if self._start_requested:
+                return
+            self._start_requested = True
+        self._uploader.start()
+
+    def record(self, state, badge_id, **extra):
+        """Queues an event for delivery; doesn't block on the network."""
+        event = dict(self.fields, state=state, badge_id=badge_id, time=time.time())
+        event.update(extra)
+        event["id"] = uuid.uuid4().hex
+        with self._lock:
+            self._sequence += 1
+            event["seq"] = self._sequence
+            if self._log is not None:
+                self._log.write(json.dumps(event, sort_keys=True) + "\n")
+                self._log.flush()
+            self._pending.append(event)
+            self._changed.notify()
+        return event
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def wait_until_delivered(self, timeout=None):
+        """Returns whether everything recorded so far was delivered in time."""
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._lock:
+            while self._pending:
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+            return True
+
+    def _next_batch(self):
+        with self._lock:
+            while not self._pending:
+                self._changed.wait()
+            batch = self._pending[: self.batch_size]
+        # Outside the lock, so record() never waits on the disk.
+        if self._log is not None:
+            os.fsync(self._log.fileno())
+        return batch
+
+    def _reject(self, events):
+        if self.path is not None:
+            with open(self.path + ".rejected", "a") as f:
+                for event in events:
+                    f.write(json.dumps(event, sort_keys=True) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        self._ack(events, rejected=True)
+
+    def _ack(self, events, rejected=False):
+        # Only the uploader thread writes this file.
+        if self.path is not None:
+            tmp = self.path + ".acked.tmp"
+            with open(tmp, "w") as f:
+                f.write("%d\n" % events[-1]["seq"])
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(tmp, self.path + ".acked")
+        with self._lock:
+            del self._pending[: len(events)]
+            self._acked = events[-1]["seq"]
+            if rejected:
+                self.rejected += len(events)
+            else:
+                self.delivered += len(events)
+            if (
+                self._log is not None
+                and not self._pending
+                and os.fstat(self._log.fileno()).st_size > COMPACT_SIZE
+            ):
+                self._log.truncate(0)
+                self._log.seek(0)
+            self._changed.notify_all()
+
+
+class _Uploader(BaseDerivedThread):
+    def __init__(self, reporter, config_name):
+        super(_Uploader, self).__init__(None, config_name)
+        self.reporter = reporter
+        self.retry_delay = MIN_RETRY_DELAY
+
+    def run_inner(self):
+        batch = self.reporter._next_batch()
+        try:
+            delivered = self.reporter.send(batch)
+        except RejectedEvents as e:
+            print("Reporting rejected %d events, setting aside:" % e.count, e.reason)
+            self.reporter._reject(batch[: e.count])
+            return
+        except Exception as e:
+            delivered = 0
+            print("Reporting failed, will retry:", e)
+        if delivered:
+            # The rest, if any, are tried again straight away; the sender
+            # raises if they still can't go.
+            self.reporter._ack(batch[:delivered])
+            self.retry_delay = MIN_RETRY_DELAY
+        else:
+            self.reporter.failures += 1
+            time.sleep(self.retry_delay)
+            self.retry_delay = min(self.retry_delay * 2, MAX_RETRY_DELAY)
+
+
+class BackendSender(object):
+    """Replays events as requests to an auth backend (see authbox.auth).
+
+    An answer of any kind counts as delivered; no answer, or a transient error,
+    is retried.  Other errors reject the event.  Events in states the backend
+    doesn't support (like extend, without an extend_command) are skipped.
+    """
+
+    def __init__(self, backend, timeout):
+        self.backend = backend
+        self.timeout = timeout
+
+    def __call__(self, events):
+        for i, event in enumerate(events):
+            if not self.backend.supports(event["state"]):
+                continue
+            try:
+                answer = self.backend.authorize(
+                    event["badge_id"], event["state"], self.timeout
+                )
+                if answer is None:
+                    raise NoAnswer(event["badge_id"])
+            except TRANSIENT_ERRORS:
+                if i == 0:
+                    raise
+                return i
+            except Exception as e:
+                if i == 0:
+                    raise RejectedEvents(1, repr(e))
+                return i
+        return len(events)
+
+
+class HttpBatchSender(object):
+    """POSTs {"events": [...]} as JSON to url; any 2xx means all delivered.
+
+    5xx (and 408 or 429) are retried; any other status rejects the batch.
+    """
+
+    def __init__(self, url, timeout, context=None):
+        parts = urlsplit(url)
+        # Set on purpose, so a typo stops the box rather than every report.
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError("Bad [reporting] url", url)
+        self.path = parts.path + ("?" + parts.query if parts.query else "")
+        self.pool = ConnectionPool(
+            "%s://%s" % (parts.scheme, parts.netloc), 1, context, timeout
+        )
+
+    def __call__(self, events):
+        body = json.dumps({"events": events}).encode("utf-8")
+        status, _ = self.pool.request(
+            "POST", self.path, body=body, headers={"Content-Type": "application/json"}
+        )
+        if 200 <= status < 300:
+            return len(events)
+        if status >= 500 or status in (408, 429):
+            raise IOError("Report upload got HTTP status %d" % status)
+        raise RejectedEvents(len(events), "HTTP status %d" % status)
@@ -0,0 +1,242 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Sounds played over e.g. the headphone jack, with little delay.
+
+Clips are decoded to raw PCM once at startup, and played by writing them to one
+long-running player process (e.g. aplay) on its own thread.  Starting a
+sound is just switching which clip that thread is writing, so it doesn't wait
+for a process or decoder to start, and a new sound (or stop) cuts off the old
+one within about LEAD seconds plus the player's own buffer.
+
+Clips are 16-bit signed little-endian PCM, at [sounds] rate and channels.  WAV
+files in that format are read directly; anything else needs [sounds] decoder, a
+command that writes the PCM for {} to stdout.
+"""
+
+from __future__ import print_function
+
+import subprocess
+import threading
+import time
+import wave
+
+from authbox.api import BaseDerivedThread
+from authbox.compat import monotonic
+
+SAMPLE_WIDTH = 2
+DEFAULT_RATE = 22050
+DEFAULT_CHANNELS = 1
+# Seconds of audio written ahead of what's playing; also the chunk size.
+LEAD = 0.05
+
+
+def load_clip(path, rate, channels, decoder=None):
+    """Returns the PCM for path as bytes.
+
+    decoder is a CommandTemplate taking the filename; without one, path must be
+    a WAV file in the configured format.
+    """
+    if decoder is not None:
+        return subprocess.check_output(decoder.format(path))
+    w = wave.open(path, "rb")
+    try:
+        params = (w.getsampwidth(), w.getframerate(), w.getnchannels())
+        if params != (SAMPLE_WIDTH, rate, channels):
+            raise ValueError(
+                "%s is (width, rate, channels) %r, not %r; set [sounds] decoder"
+                % (path, params, (SAMPLE_WIDTH, rate, channels))
+            )
+        return w.readframes(w.getnframes())
+    finally:
+        w.close()
+
+
+class NullSink(object):
+    """Plays nothing; remembers what it was asked to play (for tests)."""
+
+    def __init__(self, names=()):
+        self.names = set(names)
+        self.playing = None
+        self.played = []
+
+    def start(self):
+        pass
+
+    def play(self, name, loop=False):
+        if name not in self.names:
+            raise KeyError(name)
+        self.playing = name
+        self.played.append(name)
+
+    def stop(self):
+        self.playing = None
+
+    def close(self):
+        self.stop()
+
+
+class PipeSink(BaseDerivedThread):
+    """Writes preloaded clips to the stdin of a persistent player command.
+
+    If the player exits, it's started again for the next sound.
+    """
+
+    def __init__(self, clips, command, rate, channels, config_name="sounds"):
+        super(PipeSink, self).__init__(None, config_name)
+        self.clips = clips
+        self.names = set(clips)
+        self.command = command
+        self.bytes_per_second = rate * channels * SAMPLE_WIDTH
+        frame = channels * SAMPLE_WIDTH
+        self.chunk_size = max(frame, int(self.bytes_per_second * LEAD) // frame * frame)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        # (name, loop), or None when quiet; replaced to interrupt.
+        self._request = None
+        self._generation = 0
+        self._proc = None
+        self.starts = 0
+
+    @property
+    def playing(self):
+        with self._lock:
+            return self._request and self._request[0]
+
+    def play(self, name, loop=False):
+        if name not in self.clips:
+            raise KeyError(name)
+        with self._lock:
+            self._request = (name, loop)
+            self._generation += 1
+            self._changed.notify()
+
+    def stop(self):
+        with self._lock:
+            self._request = None
+            self._generation += 1
+            self._changed.notify()
+
+    def close(self):
+        self.stop()
+        if self._proc is not None:
+            try:
+                self._proc.kill()
+            except OSError:
+                pass
+
+    def _ensure_player(self):
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(self.command, stdin=subprocess.PIPE)
+            self.starts += 1
+        return self._proc
+
+    def run_inner(self):
+        with self._lock:
+            while self._request is None:
+                self._changed.wait()
+            (name, loop), generation = self._request, self._generation
+        pcm = self.clips[name]
+        proc = self._ensure_player()
+        start = monotonic()
+        written = 0
+        while True:
+            with self._lock:
+                if self._generation != generation:
+                    return
+            if not pcm:
+                break
+            offset = written % len(pcm) if loop else written
+            if offset >= len(pcm):
+                break
+            chunk = pcm[offset : offset + self.chunk_size]
+            try:
+                proc.stdin.write(chunk)
+                proc.stdin.flush()
+            except (IOError, OSError, ValueError):
+                print("Sound player exited; restarting it")
+                self._proc = None
+                return
+            written += len(chunk)
+            # Stay only about LEAD ahead, so that a new sound isn't queued
+            # behind this one.
+            delay = written / float(self.bytes_per_second) - LEAD
+            delay -= monotonic() - start
+            if delay > 0:
+                time.sleep(delay)
+        with self._lock:
+            if self._generation == generation:
+                self._request = None
+
+
+class CommandSink(object):
+    """Runs [sounds] command per sound, e.g. mplayer; simple but slow to start."""
+
+    def __init__(self, commands):
+        # name -> argv
+        self.commands = commands
+        self.names = set(commands)
+        self.noise = None
+        self.devnull = open("/dev/null", "r+")
+
+    def start(self):
+        pass
+
+    def play(self, name, loop=False):
+        self.stop()
+        self.noise = subprocess.Popen(
+            self.commands[name],
+            stdin=self.devnull,
+            stdout=self.devnull,
+            stderr=self.devnull,
+        )
+
+    def stop(self):
+        if self.noise:
+            self.noise.kill()
+            self.noise = None
+
+    def close(self):
+        self.stop()
+
+
+def sink_from_config(config, names, section="sounds"):
+    """Returns a sink that can play each of names (e.g. "sad" for sad_filename).
+
+    With [sounds] player set, clips are preloaded and played by a PipeSink;
+    with only [sounds] command, they're played the old way (a process per
+    sound).  A NullSink if sounds aren't enabled.
+    """
+    if not config.get_int(section, "enable", 0):
+        return NullSink(names)
+    if not config.has_option(section, "player"):
+        template = config.get_command(section, "command")
+        return CommandSink(
+            dict(
+                (name, template.format(config.get(section, name + "_filename")))
+                for name in names
+            )
+        )
+    rate = config.get_int(section, "rate", DEFAULT_RATE)
+    channels = config.get_int(section, "channels", DEFAULT_CHANNELS)
+    decoder = None
+    if config.has_option(section, "decoder"):
+        decoder = config.get_command(section, "decoder")
+    clips = {}
+    for name in names:
+        clips[name] = load_clip(
+            config.get(section, name + "_filename"), rate, channels, decoder
+        )
+    command = config.get_command(section, "player", 0).format()
+    return PipeSink(clips, command, rate, channels)
@@ -1,18 +1,54 @@
 # flake8: noqa
+import sys
 from unittest import main
 
+from authbox.tests.test_acl import AclTest
+from authbox.tests.test_acl_sync import AclSyncTest
 from authbox.tests.test_api import (
     ClassRegistryTest,
     DispatcherTest,
+    EventQueueTest,
     MultiProxyTest,
     SplitEscapedTest,
+    WorkerPoolTest,
+)
+from authbox.tests.test_auth import (
+    AuthCacheTest,
+    BackendTest,
+    HedgedBackendTest,
+    LocalAclTest,
 )
 from authbox.tests.test_badgereader_hid_keystroking import BadgereaderTest
+from authbox.tests.test_badgereader_wiegand_cdev import (
+    LineEventReaderTest,
+    WiegandCdevReaderTest,
+)
 from authbox.tests.test_badgereader_wiegand_gpio import BadgereaderWiegandGPIOTest
-from authbox.tests.test_config import ConfigTest, RecursiveConfigParamLookupTest
+from authbox.tests.test_compat import PollingCallTest
+from authbox.tests.test_config import (
+    CommandTemplateTest,
+    ConfigTest,
+    RecursiveConfigParamLookupTest,
+)
+from authbox.tests.test_coprocess import CoprocessTest
 from authbox.tests.test_gpio_button import BlinkTest
 from authbox.tests.test_gpio_buzzer import BuzzerTest
+from authbox.tests.test_gpio_capture import (
+    CaptureProcessTest,
+    EdgeRingTest,
+    WiegandProcessReaderTest,
+)
 from authbox.tests.test_gpio_relay import RelayTest
-from authbox.tests.test_timer import TimerTest
+from authbox.tests.test_http_client import ConnectionPoolTest
+from authbox.tests.test_journal import JournalTest
+from authbox.tests.test_metrics import FormatStatsTest, HistogramTest
+from authbox.tests.test_reporting import SessionReporterTest
+from authbox.tests.test_sound import SoundTest
+from authbox.tests.test_timer import TimerServiceTest, TimerTest
+from authbox.tests.test_wiegand import WiegandTest
+
+if sys.version_info[0] >= 3:
+    # asyncio code, which Python 2 can't even compile.
+    from authbox.tests.test_async_dispatcher import AsyncDispatcherTest, LoopQueueTest
 
 main(buffer=True)
@@ -0,0 +1,99 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Micro-benchmark for HIDKeystrokingReader.feed.
+
+Decodes the events fake_evdev_device_for_testing types for a badge, with feed
+and with the evdev.categorize decoder it replaced, and prints the time per
+badge for each:
+
+    python -m authbox.tests.bench_badgereader_hid_keystroking [badges]
+
+Not part of the test suite, since timings depend on the machine.
+"""
+
+from __future__ import print_function
+
+import sys
+import timeit
+
+import evdev
+
+import authbox.badgereader_hid_keystroking
+from authbox import fake_evdev_device_for_testing
+from authbox.compat import queue
+
+DEFAULT_BADGES = 20000
+
+
+class CategorizingReader(authbox.badgereader_hid_keystroking.HIDKeystrokingReader):
+    """The reader as it was, for comparison."""
+
+    def _reset(self):
+        super(CategorizingReader, self)._reset()
+        self._rfid = ""
+
+    def feed(self, event):
+        data = evdev.categorize(event)
+        if event.type == evdev.ecodes.EV_KEY and data.keystate == 1:
+            if data.scancode == self.LSHIFT_SCANCODE:
+                self._capitalized = 1
+            if data.keycode == "KEY_ENTER":
+                rfid = self._rfid
+                self._reset()
+                return rfid
+            if data.scancode != self.LSHIFT_SCANCODE:
+                if self._capitalized:
+                    self._rfid += self.capscancodes[data.scancode]
+                    self._capitalized ^= 1
+                else:
+                    self._rfid += self.scancodes[data.scancode]
+        return None
+
+
+def make_reader(cls):
+    evdev_module = authbox.badgereader_hid_keystroking.evdev
+    evdev_module.list_devices = fake_evdev_device_for_testing.list_devices
+    evdev_module.InputDevice = fake_evdev_device_for_testing.InputDevice
+    return cls(queue.Queue(), "bench", "badge_scanner")
+
+
+def decode_all(reader, events, badges):
+    feed = reader.feed
+    for _ in range(badges):
+        for event in events:
+            feed(event)
+
+
+def measure(reader, events, badges):
+    """Returns the seconds per badge, best of three."""
+    runs = timeit.repeat(lambda: decode_all(reader, events, badges), number=1, repeat=3)
+    return min(runs) / badges
+
+
+def main(args):
+    badges = int(args[0]) if args else DEFAULT_BADGES
+    reader = make_reader(authbox.badgereader_hid_keystroking.HIDKeystrokingReader)
+    events = list(reader.f.read_loop())
+    for name, cls in [
+        ("categorize", CategorizingReader),
+        ("feed", authbox.badgereader_hid_keystroking.HIDKeystrokingReader),
+    ]:
+        seconds = measure(make_reader(cls), events, badges)
+        print("%-10s %7.2f us/badge (%d events)" % (name, seconds * 1e6, len(events)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,100 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark for dispatcher startup.
+
+Times a new process from launch until the peripherals in a small config have
+their threads running, and prints the best and median of several runs:
+
+    python -m authbox.tests.bench_startup [runs]
+
+Not part of the test suite, since timings depend on the machine; test_api
+checks the part that used to be slow (importing every peripheral module) with
+start_child.
+"""
+
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+import time
+
+DEFAULT_RUNS = 10
+
+# Writes "running", then the authbox modules it imported, one line each.
+STARTUP_SCRIPT = """
+import sys
+import tempfile
+
+import authbox.api
+import authbox.config
+
+with tempfile.NamedTemporaryFile() as f:
+    f.write(b"[pins]\\non_button = Button:11:38\\nbuzzer = Buzzer:35\\n"
+            b"enable_output = Relay:ActiveHigh:29, Relay:ActiveHigh:31\\n")
+    f.flush()
+    config = authbox.config.Config(f.name)
+dispatcher = authbox.api.BaseDispatcher(config)
+for name in ("on_button", "buzzer", "enable_output"):
+    dispatcher.load_config_object(name)
+for t in dispatcher.threads:
+    t.start()
+sys.stderr.write("running\\n")
+sys.stderr.write(" ".join(sorted(m for m in sys.modules if m.startswith("authbox"))))
+sys.stderr.write("\\n")
+sys.stderr.flush()
+"""
+
+
+def start_child():
+    """Starts the script with mock pins; returns the Popen."""
+    env = dict(os.environ)
+    env["GPIOZERO_PIN_FACTORY"] = "mock"
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.getcwd()] + env.get("PYTHONPATH", "").split(os.pathsep)
+    )
+    return subprocess.Popen(
+        [sys.executable, "-c", STARTUP_SCRIPT],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=env,
+    )
+
+
+def time_startup():
+    """Returns seconds from launch until the threads are running."""
+    start = time.time()
+    proc = start_child()
+    line = proc.stderr.readline()
+    elapsed = time.time() - start
+    proc.kill()
+    proc.communicate()
+    if line != b"running\n":
+        raise Exception("Startup failed", line)
+    return elapsed
+
+
+def main(args):
+    runs = int(args[0]) if args else DEFAULT_RUNS
+    times = sorted(time_startup() for _ in range(runs))
+    print(
+        "startup best %.3fs median %.3fs (%d runs)"
+        % (times[0], times[len(times) // 2], runs)
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
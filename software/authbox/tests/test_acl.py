@@ -0,0 +1,111 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for authbox.acl"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import authbox.acl
+
+MEMBERS = """\
+# Comments and blank lines are skipped
+
+1234
+5678 Laser, Lathe
+5678 Mill
+9999 Lathe
+"""
+
+
+class AclTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "members.acl")
+        authbox.acl.build(self.path, authbox.acl.parse_lines(MEMBERS.splitlines()))
+        self.acl = authbox.acl.AclIndex(self.path)
+
+    def tearDown(self):
+        self.acl.close()
+        shutil.rmtree(self.dir)
+
+    def test_lookup(self):
+        self.assertEqual(3, len(self.acl))
+        self.assertEqual(["Laser", "Lathe", "Mill"], self.acl.tools)
+        self.assertTrue(self.acl.lookup("5678", "Laser"))
+        self.assertTrue(self.acl.lookup("5678", "Mill"))
+        self.assertFalse(self.acl.lookup("9999", "Laser"))
+        self.assertFalse(self.acl.lookup("0000", "Laser"))
+        self.assertEqual(["Lathe"], self.acl.tools_for("9999"))
+        self.assertEqual([], self.acl.tools_for("0000"))
+
+    def test_no_tools_means_all(self):
+        self.assertTrue(self.acl.lookup("1234", "Laser"))
+        self.assertTrue(self.acl.lookup("1234", "SomethingNew"))
+        self.assertIsNone(self.acl.tools_for("1234"))
+
+    def test_badge_ids_not_stored(self):
+        with open(self.path, "rb") as f:
+            self.assertNotIn(b"5678", f.read())
+
+    def test_not_an_acl(self):
+        with open(self.path, "wb") as f:
+            f.write(b"1234\n5678\n")
+        self.assertRaises(ValueError, authbox.acl.AclIndex, self.path)
+
+    def test_too_many_tools(self):
+        entries = [("1", ["tool%d" % i for i in range(65)])]
+        self.assertRaises(ValueError, authbox.acl.build, self.path, entries)
+
+    def test_large(self):
+        n = 50000
+        authbox.acl.build(self.path, (("%08d" % i, ["Laser"]) for i in range(n)))
+        acl = authbox.acl.AclIndex(self.path)
+        try:
+            self.assertEqual(n, len(acl))
+            t0 = time.time()
+            for i in range(0, 2 * n, 100):
+                self.assertEqual(i < n, acl.lookup("%08d" % i, "Laser"))
+            self.assertLess(time.time() - t0, 1)
+        finally:
+            acl.close()
+
+    def test_update(self):
+        count = authbox.acl.update(
+            self.path,
+            [("1234", ["Drill"]), ("9999", None), ("42", []), ("missing", None)],
+        )
+        self.assertEqual(3, count)
+        acl = authbox.acl.AclIndex(self.path)
+        try:
+            self.assertEqual(["Drill"], acl.tools_for("1234"))
+            self.assertEqual(["Laser", "Lathe", "Mill"], acl.tools_for("5678"))
+            self.assertFalse(acl.lookup("9999", "Lathe"))
+            self.assertIsNone(acl.tools_for("42"))
+        finally:
+            acl.close()
+        self.assertEqual(1, authbox.acl.update(self.path, [("7", [])], replace=True))
+
+    def test_main(self):
+        src = os.path.join(self.dir, "members.txt")
+        with open(src, "w") as f:
+            f.write("42 Laser\n")
+        self.assertEqual(0, authbox.acl.main([src, self.path]))
+        acl = authbox.acl.AclIndex(self.path)
+        self.assertTrue(acl.lookup("42", "Laser"))
+        acl.close()
+        self.assertEqual(1, authbox.acl.main([]))
@@ -0,0 +1,97 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for authbox.acl_sync"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import authbox.acl_sync
+import authbox.auth
+import authbox.config
+from authbox.fake_auth_server_for_testing import FakeAuthServer
+
+
+class AclSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.server = FakeAuthServer()
+        self.server.start()
+        self.server.acl_log.extend(
+            [
+                {"badge_id": "1", "tools": ["Laser"]},
+                {"badge_id": "2", "tools": ["Lathe"]},
+            ]
+        )
+        self.config = authbox.config.Config(None)
+        self.config._config.add_section("auth")
+        self.config._config.set("auth", "tool", "Laser")
+        self.config._config.set("auth", "acl", os.path.join(self.dir, "m.acl"))
+        self.config._config.set("auth", "cache_ttl", "1h")
+        self.config._config.add_section("acl_sync")
+        self.config._config.set("acl_sync", "url", self.server.base_url + "/api/v1/acl")
+        self.cache = authbox.auth.AuthCache.from_config(self.config)
+        self.local_acl = authbox.auth.LocalAcl.from_config(self.config)
+        self.sync = authbox.acl_sync.AclSync.from_config(
+            self.config, self.local_acl, self.cache
+        )
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.dir)
+
+    def test_not_configured(self):
+        self.config._config.remove_section("acl_sync")
+        self.assertIsNone(
+            authbox.acl_sync.AclSync.from_config(self.config, self.local_acl)
+        )
+
+    def test_full_then_incremental(self):
+        # Starts out empty.
+        self.assertIsNone(self.local_acl.check("1"))
+        self.assertEqual(2, self.sync.sync())
+        self.assertEqual("", self.server.requests[-1]["since"])
+        self.assertTrue(self.local_acl.check("1"))
+        self.assertIsNone(self.local_acl.check("2"))
+
+        self.cache.put("1", True)
+        self.server.acl_log.extend(
+            [{"badge_id": "1", "tools": None}, {"badge_id": "2", "tools": []}]
+        )
+        self.assertEqual(2, self.sync.sync())
+        self.assertEqual("2", self.server.requests[-1]["since"])
+        # Revoked, including from the cache
+        self.assertIsNone(self.local_acl.check("1"))
+        self.assertIsNone(self.cache.get("1"))
+        self.assertTrue(self.local_acl.check("2"))
+        self.assertEqual(0, self.sync.sync())
+
+    def test_version_survives_restart(self):
+        self.sync.sync()
+        self.server.acl_log.append({"badge_id": "3", "tools": ["Laser"]})
+        local_acl = authbox.auth.LocalAcl.from_config(self.config)
+        sync = authbox.acl_sync.AclSync.from_config(self.config, local_acl)
+        self.assertEqual("2", sync.version)
+        self.assertEqual(1, sync.sync())
+        self.assertTrue(local_acl.check("1"))
+        self.assertTrue(local_acl.check("3"))
+
+    def test_error_keeps_acl(self):
+        self.sync.sync()
+        self.sync.url_path = "/missing"
+        self.assertRaises(IOError, self.sync.sync)
+        self.assertTrue(self.local_acl.check("1"))
+        self.assertEqual("2", self.sync.version)
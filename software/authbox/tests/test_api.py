@@ -16,7 +16,12 @@
 
 import gpiozero
 import gpiozero.pins.mock
+import os
+import shutil
+import signal
 import tempfile
+import threading
+import time
 import unittest
 
 import setup_mock_pin_factory
@@ -24,6 +29,9 @@ import setup_mock_pin_factory
 import authbox.api
 import authbox.config
 import authbox.gpio_button
+import authbox.journal
+from authbox.tests import bench_startup
+from authbox.compat import queue
 
 SAMPLE_CONFIG = b"""
 [pins]
@@ -36,22 +44,63 @@ bad = MissingClass:1:2
 
 
 class ClassRegistryTest(unittest.TestCase):
-    def test_no_duplicate_names(self):
-        short_names = {name.split(".")[-1] for name in authbox.api.CLASS_REGISTRY}
-        self.assertEqual(len(short_names), len(authbox.api.CLASS_REGISTRY))
+    def tearDown(self):
+        authbox.api.CLASS_REGISTRY.pop("TestButton", None)
+        authbox.api._class_cache.pop("TestButton", None)
+
+    def test_short_names_match(self):
+        for short_name, full_name in authbox.api.CLASS_REGISTRY.items():
+            self.assertEqual(short_name, full_name.split(".")[-1])
 
     def test_all_names_importable(self):
-      try:
-        import evdev
-        del evdev
-      except ModuleNotFoundError:
-        self.fail("Test requires evdev, but evdev is not available")
-      
-        for c in authbox.api.CLASS_REGISTRY:
-            cls = authbox.api._import(c)
-            assert issubclass(
-                cls, (authbox.api.BasePinThread, authbox.api.BaseDerivedThread)
-            ), (c, cls, cls.__bases__)
+        try:
+            import evdev
+
+            del evdev
+        except ModuleNotFoundError:
+            self.fail("Test requires evdev, but evdev is not available")
+
+        for short_name in list(authbox.api.CLASS_REGISTRY):
+            cls = authbox.api.lookup_class(short_name)
+            self.assertEqual(short_name, cls.__name__)
+            self.assertTrue(hasattr(cls, "start"), cls)
+
+    def test_lookup_is_cached(self):
+        authbox.api.register_class("TestButton", "authbox.gpio_button.Button")
+        real_import = authbox.api._import
+        imported = []
+
+        def counting_import(name):
+            imported.append(name)
+            return real_import(name)
+
+        authbox.api._import = counting_import
+        try:
+            first = authbox.api.lookup_class("TestButton")
+            second = authbox.api.lookup_class("TestButton")
+        finally:
+            authbox.api._import = real_import
+        self.assertIs(first, authbox.gpio_button.Button)
+        self.assertIs(first, second)
+        self.assertEqual(["authbox.gpio_button.Button"], imported)
+
+    def test_unknown(self):
+        self.assertIsNone(authbox.api.lookup_class("MissingClass"))
+
+    def test_startup_imports_only_used_peripherals(self):
+        # Importing every peripheral module used to be most of startup; see
+        # bench_startup for the timing itself.
+        proc = bench_startup.start_child()
+        try:
+            self.assertEqual(b"running\n", proc.stderr.readline())
+            modules = set(proc.stderr.readline().decode().split())
+        finally:
+            proc.kill()
+            proc.communicate()
+        used = set(["authbox.gpio_button", "authbox.gpio_buzzer", "authbox.gpio_relay"])
+        for full_name in authbox.api.CLASS_REGISTRY.values():
+            module = full_name.rsplit(".", 1)[0]
+            self.assertEqual(module in used, module in modules, module)
 
 
 class DispatcherTest(unittest.TestCase):
@@ -76,6 +125,317 @@ class DispatcherTest(unittest.TestCase):
         # TODO: Needs a better exception
         self.assertRaises(Exception, lambda: self.dispatcher.load_config_object("bad"))
 
+    def test_idle_wakeups_per_minute(self):
+        # The old loop polled once a second; an idle window longer than that
+        # is enough to tell the difference without making the suite slow.
+        idle_seconds = 1.5
+        th = threading.Thread(target=self.dispatcher.run_loop)
+        th.daemon = True
+        th.start()
+        time.sleep(idle_seconds)
+        wakeups_per_minute = self.dispatcher.event_queue.wakeups * 60 / idle_seconds
+        t0 = time.time()
+        self.dispatcher.event_queue.put(authbox.api.SHUTDOWN_SENTINEL)
+        th.join(5)
+        self.assertFalse(th.is_alive())
+        self.assertEqual(0, wakeups_per_minute)
+        # Shutdown is prompt, not "up to a second".
+        self.assertLess(time.time() - t0, 0.5)
+
+    def test_run_loop_dispatches_in_order(self):
+        calls = []
+        self.dispatcher.event_queue.put((calls.append, 1))
+        self.dispatcher.event_queue.put((calls.append, 2))
+        self.dispatcher.event_queue.put(authbox.api.SHUTDOWN_SENTINEL)
+        self.dispatcher.run_loop()
+        self.assertEqual([1, 2], calls)
+
+    def test_journal(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        path = os.path.join(tempdir, "journal")
+        config = authbox.config.Config(None)
+        config._config.add_section("journal")
+        config._config.set("journal", "path", path)
+        dispatcher = authbox.api.BaseDispatcher(config)
+        self.assertIn(dispatcher.journal, dispatcher.threads)
+        button = authbox.api.BaseDerivedThread(None, "on_button")
+        dispatcher.event_queue.put((len, "1234"))
+        dispatcher.event_queue.put((id, button))
+        dispatcher.audit("relay_on", badge_id="1234")
+        dispatcher.event_queue.put(authbox.api.SHUTDOWN_SENTINEL)
+        dispatcher.run_loop()
+        records = list(authbox.journal.query(path))
+        self.assertEqual(
+            [("relay_on", None), ("len", ["1234"]), ("id", ["on_button"])],
+            [(r["event"], r.get("args")) for r in records],
+        )
+        dispatcher.journal.close()
+
+    def test_handler_stats(self):
+        def slow(arg):
+            time.sleep(0.01)
+
+        self.dispatcher.event_queue.put((slow, 1))
+        self.dispatcher.event_queue.put((slow, 2))
+        self.dispatcher.event_queue.put(authbox.api.SHUTDOWN_SENTINEL)
+        self.dispatcher.run_loop()
+        name = "DispatcherTest.test_handler_stats.<locals>.slow"
+        stats = self.dispatcher.handler_stats()
+        self.assertEqual([name], list(stats))
+        run = stats[name]["run"]
+        wait = stats[name]["wait"]
+        self.assertEqual(2, run["count"])
+        self.assertGreaterEqual(run["p50"], 0.01)
+        self.assertLessEqual(run["p99"], run["max"])
+        # The second event waited at least as long as the first one ran.
+        self.assertGreaterEqual(wait["max"], 0.01)
+
+    def test_sigusr1_dumps_stats(self):
+        def send_signal():
+            os.kill(os.getpid(), signal.SIGUSR1)
+
+        out = []
+        self.dispatcher.dump_stats = lambda: out.append(self.dispatcher.handler_stats())
+        old = signal.getsignal(signal.SIGUSR1)
+        self.dispatcher.event_queue.put((len, "x"))
+        self.dispatcher.event_queue.put((send_signal,))
+        self.dispatcher.event_queue.put(authbox.api.SHUTDOWN_SENTINEL)
+        self.dispatcher.run_loop()
+        self.assertEqual(1, len(out))
+        self.assertEqual(["len"], list(out[0]))
+        # The previous handler is restored afterwards.
+        self.assertEqual(old, signal.getsignal(signal.SIGUSR1))
+
+
+class EventQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.q = authbox.api.EventQueue()
+
+    def tearDown(self):
+        self.q.close()
+
+    def test_wait_returns_queued_item(self):
+        self.q.put((len, "a"))
+        self.assertEqual((len, "a"), self.q.wait())
+        self.assertEqual(0, self.q.wakeups)
+
+    def test_wait_wakes_on_put_from_other_thread(self):
+        def put_later():
+            time.sleep(0.1)
+            self.q.put((len, "b"))
+
+        th = threading.Thread(target=put_later)
+        th.start()
+        self.assertEqual((len, "b"), self.q.wait())
+        th.join()
+        self.assertEqual(1, self.q.wakeups)
+
+    def test_many_puts_do_not_block(self):
+        # More than a pipe buffer's worth of wakeup bytes.
+        self.q.set_policy(len, authbox.api.DROP_NEWEST, limit=100000)
+        for i in range(100000):
+            self.q.put((len, i))
+        self.assertEqual((len, 0), self.q.wait())
+
+    def test_priority_lanes(self):
+        self.q.set_priority(max, authbox.api.PRIORITY_SAFETY)
+        self.q.set_priority(min, authbox.api.PRIORITY_LOW)
+        self.q.put((min, 1))
+        self.q.put((len, 2))
+        self.q.put((max, 3))
+        self.q.put((len, 4))
+        self.q.put((max, 5))
+        self.assertEqual(5, self.q.qsize())
+        order = [self.q.get_nowait()[1] for i in range(5)]
+        self.assertEqual([3, 5, 2, 4, 1], order)
+
+    def test_unknown_priority(self):
+        self.assertRaises(ValueError, self.q.set_priority, max, 99)
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, self.q.set_policy, max, "drop-all")
+        self.assertRaises(ValueError, self.q.set_policy, max, "coalesce", 0)
+
+    def drain(self):
+        items = []
+        while not self.q.empty():
+            items.append(self.q.get_nowait())
+        return items
+
+    def test_drop_newest(self):
+        self.q.set_policy(len, authbox.api.DROP_NEWEST, limit=2)
+        for i in range(5):
+            self.q.put((len, i))
+        self.q.put((max, 9))
+        self.assertEqual([(len, 0), (len, 1), (max, 9)], self.drain())
+        self.assertEqual(3, self.q.source(len).dropped)
+        self.assertEqual(0, self.q.source(len).pending)
+
+    def test_drop_oldest(self):
+        self.q.set_policy(len, authbox.api.DROP_OLDEST, limit=2)
+        self.q.put((max, 9))
+        for i in range(5):
+            self.q.put((len, i))
+        self.assertEqual([(max, 9), (len, 3), (len, 4)], self.drain())
+        self.assertEqual(3, self.q.source(len).dropped)
+
+    def test_drop_oldest_across_lanes(self):
+        self.q.set_policy(len, authbox.api.DROP_OLDEST, limit=2)
+        self.q.put((len, 0))
+        self.q.put((len, 1))
+        # Nothing of len's in this lane yet; the oldest is in the normal one.
+        self.q.set_priority(len, authbox.api.PRIORITY_SAFETY)
+        self.q.put((len, 2))
+        self.assertEqual(2, self.q.source(len).pending)
+        self.assertEqual([(len, 2), (len, 1)], self.drain())
+        self.assertEqual(0, self.q.source(len).pending)
+
+    def test_coalesce(self):
+        self.q.set_policy(len, authbox.api.COALESCE, limit=3)
+        for i in range(10):
+            self.q.put((len, "button"))
+        self.q.put((len, "other"))
+        self.assertEqual([(len, "button"), (len, "other")], self.drain())
+        self.assertEqual(9, self.q.source(len).coalesced)
+        self.assertEqual(0, self.q.source(len).dropped)
+        # Once dispatched, an identical event is accepted again.
+        self.q.put((len, "button"))
+        self.assertEqual([(len, "button")], self.drain())
+
+    def test_shutdown_never_dropped(self):
+        self.q.set_policy(len, authbox.api.DROP_NEWEST, limit=1)
+        self.q.put((len, 0))
+        self.q.put((len, 1))
+        self.q.put(authbox.api.SHUTDOWN_SENTINEL)
+        self.assertEqual([(len, 0), authbox.api.SHUTDOWN_SENTINEL], self.drain())
+
+    def test_storm_stays_bounded(self):
+        # A chattering reader emits far more than we could ever catch up on.
+        for i in range(10000):
+            self.q.put((len, str(i)))
+        self.assertEqual(authbox.api.DEFAULT_SOURCE_LIMIT, self.q.qsize())
+        self.assertEqual(
+            10000 - authbox.api.DEFAULT_SOURCE_LIMIT, self.q.source(len).dropped
+        )
+
+    def test_worst_case_abort_latency(self):
+        # A scan handler is in progress (blocked on `scanning`) and the queue is
+        # full of more scans behind it.  The abort should only have to wait for
+        # the scan in progress, not the backlog.
+        scan_seconds = 0.002
+        backlog = 500
+        started = threading.Event()
+        scanning = threading.Event()
+        aborted = []
+
+        def scan(badge_id):
+            if badge_id == "first":
+                started.set()
+                scanning.wait()
+            else:
+                time.sleep(scan_seconds)
+
+        def abort(source):
+            aborted.append((time.time(), self.q.qsize()))
+            self.q.put(authbox.api.SHUTDOWN_SENTINEL)
+
+        dispatcher = authbox.api.BaseDispatcher(None)
+        dispatcher.event_queue = self.q
+        self.q.set_priority(abort, authbox.api.PRIORITY_SAFETY)
+        self.q.set_policy(scan, authbox.api.DROP_NEWEST, limit=backlog + 1)
+        th = threading.Thread(target=dispatcher.run_loop)
+        th.start()
+        self.q.put((scan, "first"))
+        started.wait()
+        for i in range(backlog):
+            self.q.put((scan, str(i)))
+        t0 = time.time()
+        self.q.put((abort, "off_button"))
+        scanning.set()
+        th.join(backlog * scan_seconds * 10)
+        self.assertFalse(th.is_alive())
+        abort_time, scans_left = aborted[0]
+        # Nothing in the backlog ran first, and we didn't pay for any of it.
+        self.assertEqual(backlog, scans_left)
+        self.assertLess(abort_time - t0, backlog * scan_seconds / 2)
+
+
+class WorkerPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.q = authbox.api.EventQueue()
+        self.pool = authbox.api.WorkerPool(self.q, 2)
+
+    def tearDown(self):
+        self.q.close()
+
+    def done(self, job):
+        pass
+
+    def next_job(self):
+        func, job = self.q.get(timeout=5)
+        self.assertEqual(self.done, func)
+        return job
+
+    def test_result(self):
+        job = self.pool.submit(sum, ([1, 2],), self.done, context="ctx")
+        self.assertIs(job, self.next_job())
+        self.assertEqual(3, job.result)
+        self.assertEqual("ctx", job.context)
+        self.assertFalse(job.timed_out)
+        self.assertIsNone(job.exception)
+
+    def test_completions_never_dropped(self):
+        self.q.source_limit = 2
+        jobs = [self.pool.submit(sum, ([i],), self.done) for i in range(5)]
+        for job in jobs:
+            job.wait(5)
+        self.assertEqual(set(jobs), set(self.next_job() for _ in jobs))
+        self.assertEqual(0, self.q.source(self.done).dropped)
+
+    def test_exception(self):
+        job = self.pool.submit(int, ("x",), self.done)
+        self.assertIs(job, self.next_job())
+        self.assertIsInstance(job.exception, ValueError)
+
+    def test_does_not_block_dispatcher(self):
+        # One slow job doesn't hold up a fast one.
+        release = threading.Event()
+        slow = self.pool.submit(release.wait, (5,), self.done)
+        fast = self.pool.submit(len, ("ab",), self.done)
+        self.assertIs(fast, self.next_job())
+        release.set()
+        self.assertIs(slow, self.next_job())
+
+    def test_timeout(self):
+        release = threading.Event()
+        job = self.pool.submit(release.wait, (5,), self.done, timeout=0.05)
+        self.assertIs(job, self.next_job())
+        self.assertTrue(job.timed_out)
+        release.set()
+        # Its eventual result isn't posted.
+        self.assertRaises(queue.Empty, self.q.get, timeout=0.1)
+
+    def test_command_timeout_kills(self):
+        t0 = time.time()
+        job = self.pool.submit_command(["sleep", "10"], self.done, timeout=0.05)
+        self.assertIs(job, self.next_job())
+        self.assertTrue(job.timed_out)
+        self.assertLess(time.time() - t0, 5)
+
+    def test_command(self):
+        self.pool.submit_command(["false"], self.done)
+        self.assertEqual(1, self.next_job().result)
+
+    def test_no_callback(self):
+        job = self.pool.submit(len, ("ab",))
+        for i in range(100):
+            if job.done:
+                break
+            time.sleep(0.01)
+        self.assertEqual(2, job.result)
+        self.assertTrue(self.q.empty())
+
 
 class T(object):
     def __init__(self):
@@ -84,9 +444,17 @@ class T(object):
         self.kwargs = None
 
     def meth(self, *args, **kwargs):
+        barrier = kwargs.pop("barrier", None)
+        if barrier is not None:
+            barrier.wait()
         self.called += 1
         self.args = args
         self.kwargs = kwargs
+        self.thread = threading.current_thread()
+        return self.called
+
+    def fail(self):
+        raise ValueError(self)
 
 
 class MultiProxyTest(unittest.TestCase):
@@ -107,6 +475,69 @@ class MultiProxyTest(unittest.TestCase):
         self.assertEqual(self.b.args, ("a",))
         self.assertEqual(self.c.args, ("a",))
 
+    def test_method_proxy_is_cached(self):
+        self.assertIs(self.mp.meth, self.mp.meth)
+        self.assertEqual(0, self.mp.called)
+        self.a.called = 5
+        self.assertEqual(5, self.mp.called)
+
+    def test_results(self):
+        self.b.called = 1
+        self.assertEqual([1, 2, 1], self.mp.meth())
+
+    def test_errors_are_collected(self):
+        self.b.fail = self.b.meth
+        with self.assertRaises(authbox.api.MultiProxyError) as cm:
+            self.mp.fail()
+        e = cm.exception
+        self.assertEqual([None, 1, None], e.results)
+        self.assertEqual([self.a, self.c], [obj for obj, _ in e.errors])
+        self.assertIsInstance(e.errors[0][1], ValueError)
+
+    def test_parallel(self):
+        mp = authbox.api.MultiProxy([self.a, self.b, self.c], parallel=True)
+        self.assertEqual([1, 1, 1], mp.meth("x"))
+        # All three calls have to be running at once to get past this.
+        barrier = threading.Barrier(3, timeout=5)
+        self.assertEqual([2, 2, 2], mp.meth("y", barrier=barrier))
+        self.assertEqual(("y",), self.c.args)
+        threads = {self.a.thread, self.b.thread, self.c.thread}
+        self.assertEqual(3, len(threads))
+        self.assertIn(threading.current_thread(), threads)
+        self.assertEqual(2, len(mp.workers.threads) - 1)
+
+    def test_parallel_busy_workers(self):
+        workers = authbox.api.WorkerPool(None, 1)
+        release = threading.Event()
+        workers.submit(release.wait)
+        self.addCleanup(release.set)
+        mp = authbox.api.MultiProxy([self.a, self.b], parallel=True, workers=workers)
+        # Made by the caller rather than waiting for the worker.
+        self.assertEqual([1, 1], mp.meth())
+        self.assertIs(threading.current_thread(), self.b.thread)
+
+    def test_parallel_errors(self):
+        mp = authbox.api.MultiProxy([self.a, self.b, self.c], parallel=True)
+        with self.assertRaises(authbox.api.MultiProxyError) as cm:
+            mp.fail()
+        self.assertEqual(3, len(cm.exception.errors))
+        self.assertEqual([1, 1, 1], mp.meth())
+
+    def test_parallel_from_config(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(SAMPLE_CONFIG + b"[dispatcher]\nparallel = button_multi\n")
+            f.flush()
+            config = authbox.config.Config(f.name)
+        dispatcher = authbox.api.BaseDispatcher(config)
+        dispatcher.load_config_object("button_multi")
+        try:
+            self.assertTrue(dispatcher.button_multi.parallel)
+            self.assertIs(dispatcher.workers, dispatcher.button_multi.workers)
+        finally:
+            for obj in dispatcher.button_multi.objs:
+                obj.gpio_button.close()
+                obj.gpio_led.close()
+
 
 class SplitEscapedTest(unittest.TestCase):
     def test_normal(self):
@@ -0,0 +1,221 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for authbox.async_dispatcher"""
+
+import os
+import signal
+import tempfile
+import threading
+import unittest
+
+import setup_mock_pin_factory  # noqa: F401
+
+import authbox.api
+import authbox.async_dispatcher
+import authbox.badgereader_hid_keystroking
+import authbox.config
+import authbox.journal
+import authbox.wiegand
+from authbox.compat import queue
+from authbox.tests.test_badgereader_wiegand_gpio import send_frame
+from authbox.timer import Timer
+
+SAMPLE_CONFIG = b"""
+[pins]
+on_button = Button:11:38
+buzzer = Buzzer:35
+enable_output = Relay:ActiveHigh:29, Relay:ActiveHigh:31
+badge_reader = HIDKeystrokingReader:badge_scanner
+wiegand_reader = WiegandGPIOReader:15:40:100:15:card
+"""
+
+
+class Dispatcher(authbox.async_dispatcher.AsyncDispatcher):
+    def __init__(self, config):
+        super(Dispatcher, self).__init__(config)
+        self.events = []
+        self.got_event = threading.Condition()
+        self.load_config_object("on_button", on_down=self.record)
+        self.load_config_object("buzzer")
+        self.load_config_object("enable_output")
+        self.load_config_object("badge_reader", on_scan=self.record)
+        self.load_config_object("wiegand_reader", on_scan=self.record)
+        self.timer = Timer(self.event_queue, "timer", self.record)
+        self.threads.append(self.timer)
+
+    def record(self, arg):
+        with self.got_event:
+            self.events.append(arg)
+            self.got_event.notify_all()
+
+    def wait_for(self, arg, timeout=2):
+        with self.got_event:
+            self.got_event.wait_for(lambda: arg in self.events, timeout)
+        return arg in self.events
+
+
+class AsyncDispatcherTest(unittest.TestCase):
+    def setUp(self):
+        try:
+            from authbox import fake_evdev_async_for_testing
+        except ModuleNotFoundError:
+            self.fail("Test requires evdev, but evdev is not available")
+        authbox.badgereader_hid_keystroking.evdev.list_devices = (
+            fake_evdev_async_for_testing.list_devices
+        )
+        authbox.badgereader_hid_keystroking.evdev.InputDevice = (
+            fake_evdev_async_for_testing.AsyncInputDevice
+        )
+
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(SAMPLE_CONFIG)
+            f.flush()
+            config = authbox.config.Config(f.name)
+        self.dispatcher = Dispatcher(config)
+        self.loop_thread = threading.Thread(target=self.dispatcher.run_loop)
+        self.loop_thread.daemon = True
+
+    def start(self):
+        self.loop_thread.start()
+        # Wait for the loop to have started (the fake reader scans immediately).
+        self.assertTrue(self.dispatcher.wait_for("8:8"))
+
+    def tearDown(self):
+        if self.loop_thread.is_alive():
+            self.dispatcher.event_queue.put(authbox.api.SHUTDOWN_SENTINEL)
+            self.loop_thread.join(2)
+            self.assertFalse(self.loop_thread.is_alive())
+        self.dispatcher.on_button.gpio_button.close()
+        self.dispatcher.on_button.gpio_led.close()
+        self.dispatcher.buzzer.gpio_buzzer.close()
+        for relay in self.dispatcher.enable_output.objs:
+            relay.gpio_relay.close()
+        self.dispatcher.wiegand_reader.close()
+
+    def test_no_peripheral_threads(self):
+        self.start()
+        for obj in self.dispatcher.threads:
+            if isinstance(obj, threading.Thread):
+                self.assertFalse(obj.is_alive(), obj)
+        self.assertIs(self.dispatcher.timer_service, self.dispatcher.timer.service)
+
+    def test_badge_scan(self):
+        self.start()
+
+    def test_wiegand_scan(self):
+        self.start()
+        value = authbox.wiegand.H10301.encode(12, 3456)
+        send_frame(self.dispatcher.wiegand_reader, value, 26)
+        self.assertTrue(self.dispatcher.wait_for("12-3456"))
+
+    def test_button_press(self):
+        self.start()
+        self.dispatcher.on_button.gpio_button.pin.drive_low()
+        self.assertTrue(self.dispatcher.wait_for(self.dispatcher.on_button))
+
+    def test_timer(self):
+        self.start()
+        self.dispatcher.timer.set(0.01)
+        self.assertTrue(self.dispatcher.wait_for("timer"))
+
+    def test_timer_set_before_loop_starts(self):
+        self.dispatcher.timer.set(0.01)
+        self.start()
+        self.assertTrue(self.dispatcher.wait_for("timer"))
+
+    def test_timer_replace_and_extend(self):
+        self.start()
+        self.dispatcher.timer.set(100)
+        self.dispatcher.timer.set(0.05)
+        self.assertTrue(self.dispatcher.timer.extend(0.05))
+        self.assertFalse(self.dispatcher.wait_for("timer", timeout=0.05))
+        self.assertTrue(self.dispatcher.wait_for("timer"))
+        self.assertEqual(1, self.dispatcher.events.count("timer"))
+
+    def test_timer_cancel(self):
+        self.start()
+        self.dispatcher.timer.set(0.2)
+        self.dispatcher.timer.cancel()
+        self.assertFalse(self.dispatcher.wait_for("timer", timeout=0.4))
+
+    def test_blink_and_beep(self):
+        self.start()
+        button = self.dispatcher.on_button
+        buzzer = self.dispatcher.buzzer
+        button.blink_duration = 0.01
+        button.gpio_led.pin.clear_states()
+        buzzer.gpio_buzzer.pin.clear_states()
+        button.blink(2)
+        buzzer.beep(0.01, 0.01)
+        # Blink starts from off; two blinks end up back at the steady state.
+        expected_led = [False, True, False, True, False]
+        expected_buzzer = [False, True, False]
+        pause = threading.Event()
+        for i in range(100):
+            led_done = len(button.gpio_led.pin.states) >= len(expected_led)
+            buzzer_done = len(buzzer.gpio_buzzer.pin.states) >= len(expected_buzzer)
+            if led_done and buzzer_done:
+                break
+            pause.wait(0.01)
+        button.gpio_led.pin.assert_states(expected_led)
+        buzzer.gpio_buzzer.pin.assert_states(expected_buzzer)
+
+    def test_sigusr1_dumps_stats(self):
+        # Run on this (the main) thread, since only it can have signal handlers.
+        def send_signal():
+            os.kill(os.getpid(), signal.SIGUSR1)
+
+        out = []
+        self.dispatcher.dump_stats = lambda: out.append(self.dispatcher.handler_stats())
+        old = signal.getsignal(signal.SIGUSR1)
+        # Never flushed by its thread, which isn't started.
+        journal = tempfile.NamedTemporaryFile()
+        self.addCleanup(journal.close)
+        self.dispatcher.journal = authbox.journal.Journal(journal.name)
+        self.dispatcher.event_queue.put((len, "x"))
+        self.dispatcher.event_queue.put((send_signal,))
+        self.dispatcher.event_queue.put(authbox.api.SHUTDOWN_SENTINEL)
+        self.dispatcher.run_loop()
+        self.assertEqual(1, len(out))
+        self.assertIn("len", out[0])
+        self.assertEqual(old, signal.getsignal(signal.SIGUSR1))
+        # What was recorded is written out when the loop ends.
+        self.assertIn(b'"len"', journal.read())
+
+
+class LoopQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = authbox.async_dispatcher.asyncio.new_event_loop()
+        self.q = authbox.async_dispatcher.LoopQueue(self.loop, 1)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_full_and_empty(self):
+        self.q.put_nowait(1)
+        self.assertRaises(queue.Full, self.q.put_nowait, 2)
+        self.assertEqual(1, self.q.get_nowait())
+        self.assertRaises(queue.Empty, self.q.get_nowait)
+
+    def test_async_get_from_other_thread(self):
+        threading.Timer(0.05, self.q.put, ["x"]).start()
+        self.assertEqual("x", self.loop.run_until_complete(self.q.async_get(1)))
+
+    def test_async_get_timeout(self):
+        self.assertRaises(
+            authbox.async_dispatcher.asyncio.TimeoutError,
+            self.loop.run_until_complete,
+            self.q.async_get(0.01),
+        )
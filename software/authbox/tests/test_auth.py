@@ -0,0 +1,380 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for authbox.auth"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import authbox.acl
+import authbox.auth
+import authbox.config
+from authbox.api import JobTimeout
+from authbox.fake_auth_server_for_testing import FakeAuthServer
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class AuthCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = authbox.auth.AuthCache(60, 10, 3, clock=self.clock)
+
+    def test_miss(self):
+        self.assertIsNone(self.cache.get("1"))
+        self.assertEqual(1, self.cache.misses)
+
+    def test_positive_and_negative_ttls(self):
+        self.cache.put("1", True)
+        self.cache.put("2", False)
+        self.assertTrue(self.cache.get("1"))
+        self.assertFalse(self.cache.get("2"))
+        self.assertEqual(2, self.cache.hits)
+        self.clock.now += 10
+        self.assertTrue(self.cache.get("1"))
+        self.assertIsNone(self.cache.get("2"))
+        self.clock.now += 50
+        self.assertIsNone(self.cache.get("1"))
+        self.assertEqual(0, len(self.cache))
+
+    def test_zero_ttl_disables(self):
+        cache = authbox.auth.AuthCache(60, 0, 3, clock=self.clock)
+        cache.put("1", True)
+        cache.put("1", False)
+        self.assertIsNone(cache.get("1"))
+
+    def test_lru_eviction(self):
+        for badge in "123":
+            self.cache.put(badge, True)
+        self.cache.get("1")
+        self.cache.put("4", True)
+        self.assertEqual(3, len(self.cache))
+        self.assertIsNone(self.cache.get("2"))
+        self.assertTrue(self.cache.get("1"))
+        self.assertTrue(self.cache.get("4"))
+
+    def test_invalidate(self):
+        self.cache.put("1", True)
+        self.cache.put("2", True)
+        self.cache.invalidate("1")
+        self.cache.invalidate("missing")
+        self.assertIsNone(self.cache.get("1"))
+        self.assertTrue(self.cache.get("2"))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("2"))
+
+    def test_stale(self):
+        cache = authbox.auth.AuthCache(0, 10, 3, clock=self.clock, stale_ttl=60)
+        cache.put("1", True)
+        cache.put("2", False)
+        self.assertIsNone(cache.get("1"))
+        self.assertTrue(cache.get_stale("1"))
+        self.clock.now += 30
+        self.assertIsNone(cache.get("2"))
+        self.assertFalse(cache.get_stale("2"))
+        self.clock.now += 30
+        self.assertIsNone(cache.get_stale("1"))
+        self.assertIsNone(cache.get("1"))
+        self.assertEqual(1, len(cache))
+        self.assertIsNone(self.cache.get_stale("missing"))
+
+    def test_from_config(self):
+        c = authbox.config.Config(None)
+        c._config.add_section("auth")
+        c._config.set("auth", "cache_ttl", "5m")
+        cache = authbox.auth.AuthCache.from_config(c)
+        self.assertEqual(300, cache.positive_ttl)
+        self.assertEqual(0, cache.negative_ttl)
+        self.assertEqual(1024, cache.max_size)
+
+
+class LocalAclTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "members.acl")
+        authbox.acl.build(self.path, [("1", ["Laser"]), ("2", ["Lathe"])])
+        self.config = authbox.config.Config(None)
+        self.config._config.add_section("auth")
+        self.config._config.set("auth", "tool", "Laser")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_not_configured(self):
+        self.assertIsNone(authbox.auth.LocalAcl.from_config(self.config))
+
+    def test_first(self):
+        self.config._config.set("auth", "acl", self.path)
+        local_acl = authbox.auth.LocalAcl.from_config(self.config)
+        self.assertTrue(local_acl.check("1"))
+        self.assertIsNone(local_acl.check("2"))
+
+    def test_only(self):
+        self.config._config.set("auth", "acl", self.path)
+        self.config._config.set("auth", "acl_mode", "only")
+        local_acl = authbox.auth.LocalAcl.from_config(self.config)
+        self.assertTrue(local_acl.check("1"))
+        self.assertFalse(local_acl.check("2"))
+
+    def test_bad_mode(self):
+        self.config._config.set("auth", "acl", self.path)
+        self.config._config.set("auth", "acl_mode", "sometimes")
+        self.assertRaises(ValueError, authbox.auth.LocalAcl.from_config, self.config)
+
+    def test_swap_closes_old(self):
+        class Index(object):
+            def __init__(self):
+                self.closed = False
+                self.entered = threading.Event()
+                self.release = threading.Event()
+
+            def lookup(self, badge_id, tool):
+                self.entered.set()
+                self.release.wait(5)
+                assert not self.closed
+                return True
+
+            def close(self):
+                self.closed = True
+
+        first, second, third = Index(), Index(), Index()
+        local_acl = authbox.auth.LocalAcl(first, "Laser")
+        t = threading.Thread(target=local_acl.check, args=("1",))
+        t.start()
+        self.assertTrue(first.entered.wait(5))
+        # Still in use, so closed by the lookup once it's done.
+        local_acl.swap(second)
+        self.assertFalse(first.closed)
+        first.release.set()
+        t.join(5)
+        self.assertTrue(first.closed)
+        # Not in use, so closed right away.
+        local_acl.swap(third)
+        self.assertTrue(second.closed)
+        self.assertFalse(third.closed)
+
+
+HELPER = r"""
+import json, sys
+for line in iter(sys.stdin.readline, ""):
+    request = json.loads(line)
+    allowed = request["badge_id"] == "1234" and request["tool"] == "Laser"
+    # No braces, which the helper command line would take as placeholders.
+    response = dict(id=request["id"], allowed=allowed, request=request)
+    if request["badge_id"] == "error":
+        response = dict(id=request["id"], error="no database")
+    sys.stdout.write(json.dumps(response) + "\n")
+    sys.stdout.flush()
+"""
+
+
+class BackendTest(unittest.TestCase):
+    def setUp(self):
+        self.config = authbox.config.Config(None)
+        self.config._config.add_section("auth")
+        self.config._config.set("auth", "tool", "Laser")
+        self.config._config.set("auth", "duration", "90s")
+        self.config._config.set("auth", "command", "test {} = 1234")
+        self.config._config.set("auth", "deauth_command", "false")
+
+    def test_default_is_command(self):
+        backend = authbox.auth.backend_from_config(self.config)
+        self.assertIsInstance(backend, authbox.auth.CommandBackend)
+        self.assertTrue(backend.authorize("1234"))
+        self.assertFalse(backend.authorize("1234 -o x"))
+        self.assertFalse(backend.authorize("1234", authbox.auth.STATE_CANCEL))
+        self.assertRaises(
+            Exception, backend.authorize, "1234", authbox.auth.STATE_EXTEND
+        )
+
+    def test_bad_command_fails_early(self):
+        self.config._config.set("auth", "deauth_command", "echo 'unterminated")
+        self.assertRaises(
+            authbox.config.TemplateError, authbox.auth.backend_from_config, self.config
+        )
+
+    def test_unknown(self):
+        self.config._config.set("auth", "backend", "carrier-pigeon")
+        self.assertRaises(ValueError, authbox.auth.backend_from_config, self.config)
+
+    def test_protocol_params(self):
+        params = authbox.auth.protocol_params(
+            self.config, "auth", "1234", authbox.auth.STATE_INITIAL
+        )
+        self.assertEqual(
+            {
+                "badge_id": "1234",
+                "state": "initial",
+                "tool": "Laser",
+                "auth_minutes": 2,
+            },
+            params,
+        )
+        params = authbox.auth.protocol_params(
+            self.config, "auth", "1234", authbox.auth.STATE_CANCEL
+        )
+        self.assertNotIn("auth_minutes", params)
+
+    def test_coprocess(self):
+        self.config._config.set("auth", "backend", "coprocess")
+        self.config._config.set(
+            "auth", "helper", "%s -c '%s'" % (sys.executable, HELPER)
+        )
+        backend = authbox.auth.backend_from_config(self.config)
+        try:
+            self.assertTrue(backend.authorize("1234", timeout=5))
+            self.assertFalse(backend.authorize("5678", timeout=5))
+            self.assertIsNone(backend.authorize("error", timeout=5))
+            self.assertEqual(1, backend.helper.starts)
+        finally:
+            backend.close()
+
+    def test_http(self):
+        server = FakeAuthServer(["1234"], api_key="sekrit")
+        server.start()
+        self.config._config.set("auth", "backend", "http")
+        self.config._config.set("auth", "base_url", server.base_url)
+        self.config._config.set("auth", "api_key", "sekrit")
+        backend = authbox.auth.backend_from_config(self.config)
+        try:
+            self.assertTrue(backend.authorize("1234", timeout=5))
+            self.assertFalse(backend.authorize("5678", timeout=5))
+            self.assertTrue(
+                backend.authorize("1234", authbox.auth.STATE_CANCEL, timeout=5)
+            )
+            self.assertEqual(1, backend.pool.connects)
+        finally:
+            backend.close()
+            server.stop()
+        self.assertEqual(
+            {
+                "api_key": "sekrit",
+                "auth_minutes": "2",
+                "badge_id": "1234",
+                "state": "initial",
+                "tool": "Laser",
+            },
+            server.requests[0],
+        )
+        self.assertEqual("cancel", server.requests[2]["state"])
+
+    def test_http_other_status_is_no_answer(self):
+        server = FakeAuthServer(["1234"])
+        server.start()
+        self.config._config.set("auth", "backend", "http")
+        self.config._config.set("auth", "base_url", server.base_url)
+        backend = authbox.auth.backend_from_config(self.config)
+        try:
+            server.check_status = 503
+            self.assertIsNone(backend.authorize("1234", timeout=5))
+            self.assertIsNone(backend.authorize("5678", timeout=5))
+            self.config._config.set("auth", "path", "/wrong")
+            server.check_status = None
+            wrong_path = authbox.auth.HttpBackend(self.config)
+            try:
+                self.assertIsNone(wrong_path.authorize("1234", timeout=5))
+            finally:
+                wrong_path.close()
+        finally:
+            backend.close()
+            server.stop()
+
+
+class FakeBackend(authbox.auth.AuthBackend):
+    def __init__(self, name, result, delay=0, error=None):
+        self.name = name
+        self.result = result
+        self.delay = delay
+        self.error = error
+        self.called = threading.Event()
+
+    def authorize(self, badge_id, state=authbox.auth.STATE_INITIAL, timeout=None):
+        self.called.set()
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.result
+
+
+class HedgedBackendTest(unittest.TestCase):
+    def test_primary_answers(self):
+        primary = FakeBackend("primary", False)
+        fallback = FakeBackend("fallback", True)
+        backend = authbox.auth.HedgedBackend([primary, fallback], 5)
+        self.assertEqual((False, "primary"), backend.answer("1", timeout=5))
+        self.assertFalse(fallback.called.is_set())
+
+    def test_hedges_after_delay(self):
+        primary = FakeBackend("primary", True, delay=1)
+        fallback = FakeBackend("fallback", False)
+        backend = authbox.auth.HedgedBackend([primary, fallback], 0.05)
+        t0 = time.time()
+        self.assertEqual((False, "fallback"), backend.answer("1", timeout=5))
+        self.assertLess(time.time() - t0, 0.5)
+
+    def test_slow_primary_still_wins(self):
+        # Answers nothing, so the primary's answer is used.
+        primary = FakeBackend("primary", True, delay=0.2)
+        fallback = FakeBackend("fallback", None)
+        backend = authbox.auth.HedgedBackend([primary, fallback], 0.05)
+        self.assertEqual((True, "primary"), backend.answer("1", timeout=5))
+        self.assertTrue(fallback.called.is_set())
+
+    def test_failure_moves_on_immediately(self):
+        primary = FakeBackend("primary", None, error=IOError("down"))
+        fallback = FakeBackend("fallback", True)
+        backend = authbox.auth.HedgedBackend([primary, fallback], 10)
+        t0 = time.time()
+        self.assertTrue(backend.authorize("1", timeout=5))
+        self.assertLess(time.time() - t0, 1)
+
+    def test_no_answer(self):
+        backend = authbox.auth.HedgedBackend(
+            [FakeBackend("a", None), FakeBackend("b", None, error=IOError())], 0
+        )
+        self.assertRaises(authbox.auth.NoAnswer, backend.answer, "1", timeout=5)
+
+    def test_timeout(self):
+        backend = authbox.auth.HedgedBackend(
+            [FakeBackend("a", True, delay=1), FakeBackend("b", None, delay=1)], 0.01
+        )
+        self.assertRaises(JobTimeout, backend.answer, "1", timeout=0.1)
+
+    def test_from_config(self):
+        config = authbox.config.Config(None)
+        config._config.add_section("auth")
+        config._config.set("auth", "command", "false")
+        config._config.set("auth", "backends", "command, acl, cache")
+        self.assertRaises(ValueError, authbox.auth.backend_from_config, config)
+        cache = authbox.auth.AuthCache(0, 0, 10, stale_ttl=60)
+        local_acl = authbox.auth.LocalAcl(None, "Laser")
+        backend = authbox.auth.backend_from_config(
+            config, local_acl=local_acl, auth_cache=cache
+        )
+        self.assertIsInstance(backend, authbox.auth.HedgedBackend)
+        self.assertEqual(
+            ["command", "acl", "cache"], [b.name for b in backend.backends]
+        )
+        self.assertEqual(1, backend.hedge_delay)
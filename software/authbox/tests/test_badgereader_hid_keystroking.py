@@ -16,6 +16,8 @@
 
 import unittest
 
+import evdev
+
 import authbox.badgereader_hid_keystroking
 
 from authbox.compat import queue
@@ -50,3 +52,30 @@ class BadgereaderTest(unittest.TestCase):
         self.assertEqual(self.record, item[0])
         self.assertEqual("8:8", item[1])
         self.assertRaises(queue.Empty, self.q.get, block=False)
+
+    def key(self, code, value=1):
+        return evdev.events.InputEvent(0, 0, evdev.ecodes.EV_KEY, code, value)
+
+    def test_feed(self):
+        events = [
+            # "a", then shift "a", then an unknown key and a release, ignored
+            self.key(30),
+            self.key(42),
+            self.key(30),
+            self.key(42, 0),
+            self.key(200),
+            self.key(31, 0),
+            self.key(31),
+        ]
+        for event in events:
+            self.assertIsNone(self.badgereader.feed(event))
+        self.assertEqual("aAs", self.badgereader.feed(self.key(28)))
+        # Starts over after ENTER.
+        self.badgereader.feed(self.key(2))
+        self.assertEqual("1", self.badgereader.feed(self.key(28)))
+
+    def test_long_badge_cut_off(self):
+        limit = authbox.badgereader_hid_keystroking.MAX_BADGE_LENGTH
+        for i in range(limit + 10):
+            self.badgereader.feed(self.key(2))
+        self.assertEqual("1" * limit, self.badgereader.feed(self.key(28)))
@@ -0,0 +1,118 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for authbox.badgereader_wiegand_cdev and authbox.gpio_cdev"""
+
+import os
+import unittest
+
+import authbox.badgereader_wiegand_cdev
+import authbox.badgereader_wiegand_gpio
+import authbox.gpio_cdev
+from authbox import wiegand
+from authbox.compat import queue
+from authbox.fake_gpio_cdev_for_testing import FakeChip
+
+RECORDING = os.path.join(os.path.dirname(__file__), "wiegand_edges.txt")
+
+
+class LineEventReaderTest(unittest.TestCase):
+    def test_struct_sizes(self):
+        self.assertEqual(592, authbox.gpio_cdev.LINE_REQUEST.size)
+        self.assertEqual(48, authbox.gpio_cdev.LINE_EVENT.size)
+        self.assertEqual(0xC250B407, authbox.gpio_cdev.GPIO_V2_GET_LINE_IOCTL)
+
+    def test_board_to_line(self):
+        self.assertEqual(4, authbox.gpio_cdev.board_to_line("7"))
+        self.assertRaises(ValueError, authbox.gpio_cdev.board_to_line, "1")
+
+    def test_read_events_batch(self):
+        # A pipe stands in for the line request's fd.
+        r, w = os.pipe()
+        reader = authbox.gpio_cdev.LineEventReader.__new__(
+            authbox.gpio_cdev.LineEventReader
+        )
+        reader.fd = r
+        self.addCleanup(reader.close)
+        self.addCleanup(os.close, w)
+        self.assertEqual([], reader.read_events(0))
+        os.write(
+            w,
+            authbox.gpio_cdev.LINE_EVENT.pack(1500000000, 2, 4, 1, 1)
+            + authbox.gpio_cdev.LINE_EVENT.pack(1502000000, 2, 27, 2, 1),
+        )
+        self.assertEqual([(1.5, 4, 2), (1.502, 27, 2)], reader.read_events(1))
+
+    def test_no_chip(self):
+        self.assertRaises(
+            OSError, authbox.gpio_cdev.LineEventReader, "/nonexistent", [4]
+        )
+
+
+class WiegandCdevReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.q = queue.Queue()
+
+    def on_scan(self, badge):
+        pass
+
+    def make_reader(self, chip, *args):
+        reader = authbox.badgereader_wiegand_cdev.WiegandCdevReader(
+            self.q, "r", "7", "13", *args, on_scan=self.on_scan, chip=chip
+        )
+        self.addCleanup(reader.close)
+        return reader
+
+    def test_replay_recording(self):
+        reader = self.make_reader(FakeChip.load(RECORDING), 100, 15, "card")
+        reader.start()
+        self.assertEqual((self.on_scan, "12-3456"), self.q.get(timeout=5))
+        self.assertEqual((self.on_scan, "200-65000"), self.q.get(timeout=5))
+        # The noise edge was a frame of its own, and dropped.
+        self.assertEqual(1, reader.rejected)
+
+    def test_batches(self):
+        # Reading late gets a whole frame at once, still split correctly.
+        chip = FakeChip.from_frames(
+            [(wiegand.H10301.encode(1, 2), 26), (wiegand.H10301.encode(3, 4), 26)],
+            4,
+            27,
+            bit_ns=100000,
+            # Under the 15ms timeout; it's the adaptive gap that splits them.
+            gap_ns=10000000,
+        )
+        reader = self.make_reader(chip)
+        events = chip.read_events(0)
+        while len(events) < 52:
+            events.extend(chip.read_events(1))
+        reader.add_edges(events)
+        self.assertEqual((wiegand.H10301.encode(1, 2), 26), reader.take_frame()[0])
+        self.assertLess(reader.bit_interval, 0.001)
+
+    def test_gap_adapts(self):
+        reader = self.make_reader(FakeChip([]))
+        self.assertEqual(reader.timeout_in_seconds, reader.gap())
+        reader.bit_interval = 0.002
+        self.assertAlmostEqual(0.008, reader.gap())
+        reader.bit_interval = 0.0001
+        self.assertEqual(authbox.badgereader_wiegand_gpio.MIN_GAP, reader.gap())
+        reader.bit_interval = 1
+        self.assertEqual(reader.timeout_in_seconds, reader.gap())
+
+    def test_save_and_load(self):
+        chip = FakeChip.load(RECORDING)
+        path = RECORDING + ".tmp"
+        self.addCleanup(os.unlink, path)
+        chip.save(path)
+        self.assertEqual(chip.events, FakeChip.load(path).events)
@@ -22,9 +22,18 @@ import unittest
 import setup_mock_pin_factory
 
 import authbox.badgereader_wiegand_gpio
+import authbox.wiegand
 from authbox.compat import queue
 
 
+def send_frame(reader, value, length):
+    """Pulses D0 or D1 for each bit, first bit first."""
+    for i in range(length - 1, -1, -1):
+        device = reader.d1_input_device if value >> i & 1 else reader.d0_input_device
+        device.pin.drive_high()
+        device.pin.drive_low()
+
+
 class BadgereaderWiegandGPIOTest(unittest.TestCase):
     def setUp(self):
         self.q = queue.Queue()
@@ -35,7 +44,7 @@ class BadgereaderWiegandGPIOTest(unittest.TestCase):
             "40",
             on_scan=self.on_scan,
         )
-    
+
     def tearDown(self):
         self.b.close()
 
@@ -67,13 +76,80 @@ class BadgereaderWiegandGPIOTest(unittest.TestCase):
         self.b.run_inner()
         self.assertEqual(self.q.get(block=False), (self.on_scan, "10"))
 
-    def test_limited_queue_size(self):
+    def test_limited_frame_size(self):
         self.b.d1_input_device.pin.drive_low()
         for i in range(500):
-            # Send a 0            
+            # Send a 0
             self.b.d0_input_device.pin.drive_high()
             self.b.d0_input_device.pin.drive_low()
         self.b.run_inner()
         self.assertEqual(self.q.get(block=False), (self.on_scan, "0" * 100))
         # Make sure that state is reset.
-        self.assertTrue(self.b.bitqueue.empty())
+        self.assertEqual((None, None), self.b.take_frame())
+
+    def test_bad_parity_dropped(self):
+        value = authbox.wiegand.H10301.encode(12, 3456)
+        send_frame(self.b, value ^ 1, 26)
+        send_frame_later = threading.Timer(0.1, send_frame, (self.b, value, 26))
+        send_frame_later.start()
+        # The corrupted one never reaches on_scan.
+        self.b.run_inner()
+        self.assertTrue(self.q.empty())
+        self.assertEqual(1, self.b.rejected)
+        self.b.run_inner()
+        self.assertEqual(
+            self.q.get(block=False), (self.on_scan, authbox.wiegand.to_bits(value, 26))
+        )
+
+    def test_back_to_back_frames(self):
+        first = authbox.wiegand.H10301.encode(1, 2)
+        second = authbox.wiegand.H10301.encode(3, 4)
+        send_frame(self.b, first, 26)
+        time.sleep(0.05)
+        send_frame(self.b, second, 26)
+        # Even though nothing read the first frame before the second started.
+        self.b.run_inner()
+        self.b.run_inner()
+        self.assertEqual(
+            [
+                (self.on_scan, authbox.wiegand.to_bits(first, 26)),
+                (self.on_scan, authbox.wiegand.to_bits(second, 26)),
+            ],
+            [self.q.get(block=False), self.q.get(block=False)],
+        )
+
+    def test_gap_fixed(self):
+        # Callback times are too rough to adapt to.
+        send_frame(self.b, authbox.wiegand.H10301.encode(1, 2), 26)
+        self.assertIsNotNone(self.b.bit_interval)
+        self.assertEqual(self.b.timeout_in_seconds, self.b.gap())
+
+    def test_frame_bits_completes_early(self):
+        reader = authbox.badgereader_wiegand_gpio.WiegandGPIOReader(
+            self.q, "c", "16", "18", 100, 1000, "bits", 26, on_scan=self.on_scan
+        )
+        self.addCleanup(reader.close)
+        send_frame(reader, authbox.wiegand.H10301.encode(1, 2), 26)
+        # Without waiting out the (1s) gap.
+        frame, delay = reader.take_frame()
+        self.assertEqual((authbox.wiegand.H10301.encode(1, 2), 26), frame)
+
+    def test_card_output(self):
+        reader = authbox.badgereader_wiegand_gpio.WiegandGPIOReader(
+            self.q, "c", "16", "18", 100, 15, "card", on_scan=self.on_scan
+        )
+        self.addCleanup(reader.close)
+        send_frame(reader, authbox.wiegand.CORPORATE_1000.encode(1234, 567890), 35)
+        reader.run_inner()
+        self.assertEqual(self.q.get(block=False), (self.on_scan, "1234-567890"))
+        # Unknown formats can't be decoded, so they're dropped.
+        self.assertIsNone(reader.badge_for((5, 3)))
+        self.assertRaises(
+            ValueError,
+            authbox.badgereader_wiegand_gpio.WiegandGPIOReader,
+            self.q,
+            "d",
+            "22",
+            "24",
+            output="octal",
+        )
@@ -0,0 +1,35 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for authbox.compat"""
+
+import unittest
+
+import authbox.compat
+from authbox.compat import monotonic
+
+
+class PollingCallTest(unittest.TestCase):
+    # The Python 2 fallback, tested directly since it's not what Python 3 uses.
+    def test_exit_status(self):
+        self.assertEqual(0, authbox.compat._polling_call(["true"], timeout=5))
+        self.assertEqual(1, authbox.compat._polling_call(["false"], timeout=5))
+        self.assertEqual(1, authbox.compat._polling_call(["false"]))
+
+    def test_timeout_kills(self):
+        start = monotonic()
+        with self.assertRaises(authbox.compat.TimeoutExpired) as cm:
+            authbox.compat._polling_call(["sleep", "10"], timeout=0.1)
+        self.assertLess(monotonic() - start, 5)
+        self.assertEqual(0.1, cm.exception.timeout)
@@ -49,6 +49,20 @@ class ConfigTest(unittest.TestCase):
         c = authbox.config.Config(None)
         self.assertEqual(999, c.get_int_seconds("section", "a", 999))
 
+    def test_get_int(self):
+        c = authbox.config.Config(None)
+        c._config.add_section("section")
+        c._config.set("section", "a", "4")
+        self.assertEqual(4, c.get_int("section", "a", 2))
+        self.assertEqual(2, c.get_int("section", "b", 2))
+
+    def test_get_list(self):
+        c = authbox.config.Config(None)
+        c._config.add_section("section")
+        c._config.set("section", "a", "x, y,,z ")
+        self.assertEqual(["x", "y", "z"], c.get_list("section", "a"))
+        self.assertEqual([], c.get_list("section", "b"))
+
     def test_get(self):
         c = authbox.config.Config(None)
         c._config.add_section("section")
@@ -57,6 +71,41 @@ class ConfigTest(unittest.TestCase):
         self.assertEqual("1x2", c.get("section", "a"))
 
 
+class CommandTemplateTest(unittest.TestCase):
+    def test_format(self):
+        t = authbox.config.CommandTemplate("curl -f 'a b' x={0}&y={0} {} {{lit}}")
+        self.assertEqual(
+            ["curl", "-f", "a b", "x=1 2&y=1 2", "1 2", "{lit}"], t.format("1 2")
+        )
+        self.assertEqual(
+            ["curl", "-f", "a b", "x=';&y=';", "';", "{lit}"], t.format("';")
+        )
+        self.assertRaises(TypeError, t.format)
+
+    def test_no_args(self):
+        t = authbox.config.CommandTemplate("helper --tool x", 0)
+        self.assertEqual(["helper", "--tool", "x"], t.format())
+
+    def test_invalid(self):
+        cls = authbox.config.CommandTemplate
+        self.assertRaises(authbox.config.TemplateError, cls, "echo 'unterminated")
+        self.assertRaises(authbox.config.TemplateError, cls, "")
+        self.assertRaises(authbox.config.TemplateError, cls, "echo {1}")
+        self.assertRaises(authbox.config.TemplateError, cls, "echo {}{}")
+        self.assertRaises(authbox.config.TemplateError, cls, "echo {")
+        self.assertRaises(authbox.config.TemplateError, cls, "echo {}", 0)
+
+    def test_get_command(self):
+        c = authbox.config.Config(None)
+        c._config.add_section("section")
+        c._config.set("section", "tool", "Laser Cutter")
+        c._config.set("section", "command", "check {} {tool}")
+        self.assertEqual(
+            ["check", "1", "Laser", "Cutter"],
+            c.get_command("section", "command").format("1"),
+        )
+
+
 class OneSectionConfig(object):
     def __init__(self, contents):
         self.contents = contents
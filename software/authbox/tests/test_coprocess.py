@@ -0,0 +1,104 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for authbox.coprocess"""
+
+import sys
+import threading
+import unittest
+
+import authbox.coprocess
+from authbox.api import JobTimeout
+
+# Answers {"echo": x} with x, in reverse order for pairs marked "slow"; exits
+# on {"exit": true} and ignores {"hang": true}.
+HELPER = r"""
+import json, sys
+held = None
+for line in iter(sys.stdin.readline, ""):
+    request = json.loads(line)
+    if request.get("exit"):
+        sys.exit(3)
+    if request.get("hang"):
+        continue
+    if request.get("slow") and held is None:
+        held = request
+        continue
+    for r in (request, held):
+        if r is not None:
+            sys.stdout.write(json.dumps({"id": r["id"], "echo": r.get("echo")}) + "\n")
+    held = None
+    sys.stdout.write("not json\n")
+    sys.stdout.flush()
+"""
+
+
+class CoprocessTest(unittest.TestCase):
+    def setUp(self):
+        self.helper = authbox.coprocess.Coprocess([sys.executable, "-c", HELPER])
+
+    def tearDown(self):
+        self.helper.close()
+
+    def test_call(self):
+        self.assertEqual("a", self.helper.call({"echo": "a"}, 5)["echo"])
+        self.assertEqual("b", self.helper.call({"echo": "b"}, 5)["echo"])
+        self.assertEqual(1, self.helper.starts)
+
+    def test_out_of_order(self):
+        results = {}
+
+        def call(x):
+            results[x] = self.helper.call({"echo": x, "slow": True}, 5)["echo"]
+
+        first = threading.Thread(target=call, args=("first",))
+        first.start()
+        # Make sure "first" is sent before "second".
+        while not self.helper._pending:
+            pass
+        call("second")
+        first.join(5)
+        self.assertEqual({"first": "first", "second": "second"}, results)
+
+    def test_pipes_full_both_ways(self):
+        # Bigger than a pipe's buffer, so the helper blocks writing a response
+        # while requests are still being written to it.
+        big = "x" * 200000
+        results = []
+
+        def call():
+            results.append(self.helper.call({"echo": big}, 10)["echo"] == big)
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join(20)
+        self.assertEqual([True] * 8, results)
+
+    def test_restart_after_exit(self):
+        self.assertRaises(
+            authbox.coprocess.CoprocessError, self.helper.call, {"exit": True}, 5
+        )
+        self.assertEqual("a", self.helper.call({"echo": "a"}, 5)["echo"])
+        self.assertEqual(2, self.helper.starts)
+
+    def test_timeout_restarts(self):
+        self.assertRaises(JobTimeout, self.helper.call, {"hang": True}, 0.1)
+        self.assertEqual("a", self.helper.call({"echo": "a"}, 5)["echo"])
+        self.assertEqual(2, self.helper.starts)
+
+    def test_missing_helper(self):
+        helper = authbox.coprocess.Coprocess(["/nonexistent/helper"])
+        self.assertRaises(authbox.coprocess.CoprocessError, helper.call, {}, 1)
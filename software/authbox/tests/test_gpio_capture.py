@@ -0,0 +1,169 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for authbox.gpio_capture"""
+
+import os
+import signal
+import threading
+import unittest
+
+import authbox.badgereader_wiegand_cdev
+import authbox.gpio_capture
+from authbox.compat import monotonic, queue
+from authbox.fake_gpio_cdev_for_testing import FakeChip
+
+RECORDING = os.path.join(os.path.dirname(__file__), "wiegand_edges.txt")
+
+
+class EdgeRingTest(unittest.TestCase):
+    def setUp(self):
+        self.ring = authbox.gpio_capture.EdgeRing(4)
+        self.addCleanup(self.ring.close)
+
+    def edges(self, *offsets):
+        return [(float(i), i, 2) for i in offsets]
+
+    def test_put_and_take(self):
+        self.assertEqual([], self.ring.take())
+        self.ring.put(self.edges(1, 2, 3))
+        self.assertEqual(self.edges(1, 2, 3), self.ring.take())
+        self.assertEqual([], self.ring.take())
+        # Wraps around.
+        self.ring.put(self.edges(4, 5, 6))
+        self.assertEqual(self.edges(4, 5, 6), self.ring.take())
+        self.assertEqual(0, self.ring.overruns)
+
+    def test_overrun(self):
+        self.ring.put(self.edges(1, 2))
+        self.assertEqual(self.edges(1, 2), self.ring.take())
+        self.ring.put(self.edges(3, 4, 5, 6, 7, 8, 9))
+        self.assertEqual(self.edges(6, 7, 8, 9), self.ring.take())
+        self.assertEqual(3, self.ring.overruns)
+
+    def test_edge_being_written_not_taken(self):
+        # As if the writer had only got as far as marking the first slot.
+        authbox.gpio_capture.SEQ.pack_into(self.ring.buf, 0, 1)
+        authbox.gpio_capture.EDGE.pack_into(
+            self.ring.buf, authbox.gpio_capture.SEQ.size, 1.0, 1, 2
+        )
+        self.assertEqual([], self.ring.take())
+        authbox.gpio_capture.SEQ.pack_into(self.ring.buf, 0, 2)
+        self.assertEqual([(1.0, 1, 2)], self.ring.take())
+
+    def test_resume(self):
+        self.ring.put(self.edges(1, 2, 3))
+        self.assertEqual(self.edges(1, 2, 3), self.ring.take())
+        # A new writer, forked before any of those were put.
+        self.ring.written = 0
+        self.ring.resume()
+        self.ring.put(self.edges(4, 5))
+        self.assertEqual(self.edges(4, 5), self.ring.take())
+
+    def test_resume_after_unfinished_edge(self):
+        self.ring.put(self.edges(1))
+        # The writer died while writing edge 2.
+        pos = authbox.gpio_capture.SLOT_SIZE
+        authbox.gpio_capture.SEQ.pack_into(self.ring.buf, pos, 3)
+        self.assertEqual(self.edges(1), self.ring.take())
+        self.ring.resume()
+        self.ring.put(self.edges(2, 3))
+        self.assertEqual(self.edges(2, 3), self.ring.take())
+        self.assertEqual(0, self.ring.overruns)
+
+
+class CaptureProcessTest(unittest.TestCase):
+    def read(self, capture, count):
+        events = []
+        deadline = monotonic() + 5
+        while len(events) < count and monotonic() < deadline:
+            events.extend(capture.read_events(1))
+        return events
+
+    def test_capture(self):
+        chip = FakeChip.load(RECORDING)
+        capture = authbox.gpio_capture.CaptureProcess(chip)
+        self.addCleanup(capture.close)
+        events = self.read(capture, len(chip.events))
+        self.assertEqual(
+            [offset for _, offset, _ in chip.events],
+            [offset for _, offset, _ in events],
+        )
+        # The child did the reading.
+        self.assertEqual(0, chip.reads)
+
+    def test_restart(self):
+        chip = FakeChip.load(RECORDING)
+        offsets = [offset for _, offset, _ in chip.events]
+        capture = authbox.gpio_capture.CaptureProcess(chip)
+        self.addCleanup(capture.close)
+        events = self.read(capture, len(offsets))
+        self.assertEqual(offsets, [offset for _, offset, _ in events])
+        os.kill(capture._process.pid, signal.SIGKILL)
+        capture._process.join()
+        capture.check()
+        self.assertEqual(2, capture.starts)
+        # The new child has its own copy of the (unread) fake chip, so it
+        # captures the same edges again; none are lost to old numbering.
+        events = self.read(capture, len(offsets))
+        self.assertEqual(offsets, [offset for _, offset, _ in events])
+        self.assertEqual(0, capture.ring.overruns)
+
+    def test_close_waits_for_reader(self):
+        capture = authbox.gpio_capture.CaptureProcess(FakeChip([]))
+        self.addCleanup(capture.close)
+        capture.check_interval = 10
+        errors = []
+
+        def read():
+            try:
+                while not capture.stopped:
+                    capture.read_events(10)
+            except Exception as e:
+                errors.append(e)
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        t0 = monotonic()
+        capture.close()
+        reader.join(5)
+        self.assertFalse(reader.is_alive())
+        self.assertLess(monotonic() - t0, 5)
+        self.assertEqual([], errors)
+
+
+class WiegandProcessReaderTest(unittest.TestCase):
+    def on_scan(self, badge):
+        pass
+
+    def test_replay_recording(self):
+        q = queue.Queue()
+        reader = authbox.badgereader_wiegand_cdev.WiegandProcessReader(
+            q,
+            "r",
+            "7",
+            "13",
+            100,
+            15,
+            "card",
+            on_scan=self.on_scan,
+            chip=FakeChip.load(RECORDING),
+        )
+        self.addCleanup(reader.close)
+        reader.start()
+        self.assertEqual((self.on_scan, "12-3456"), q.get(timeout=5))
+        self.assertEqual((self.on_scan, "200-65000"), q.get(timeout=5))
+        self.assertEqual(1, reader.rejected)
+        reader.close()
+        self.assertFalse(reader.is_alive())
@@ -0,0 +1,139 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for authbox.http_client"""
+
+import os
+import ssl
+import time
+import unittest
+
+from authbox.api import JobTimeout
+from authbox.fake_auth_server_for_testing import FakeAuthServer
+from authbox.http_client import ConnectionPool
+
+# Self-signed, for localhost and 127.0.0.1.
+CERT = os.path.join(os.path.dirname(__file__), "localhost.pem")
+
+
+class _StaleConnection(object):
+    """An idle connection the server has dropped, noticed after delay.
+
+    If sent, the request seems to go, and it's the response that fails.
+    """
+
+    sock = None
+
+    def __init__(self, delay, sent=False):
+        self.delay = delay
+        self.sent = sent
+
+    def request(self, *args):
+        time.sleep(self.delay)
+        if not self.sent:
+            raise IOError("Connection reset")
+
+    def getresponse(self):
+        raise IOError("Connection reset")
+
+    def close(self):
+        pass
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def start(self, ssl_context=None, client_context=None):
+        self.server = FakeAuthServer(["1234"], ssl_context=ssl_context)
+        self.server.start()
+        self.pool = ConnectionPool(self.server.base_url, 2, client_context)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.stop()
+
+    def test_keep_alive(self):
+        self.start()
+        for badge_id, status in (("1234", 200), ("5678", 403), ("1234", 200)):
+            got, _ = self.pool.request(
+                "GET", "/api/v1/check?badge_id=%s" % badge_id, timeout=5
+            )
+            self.assertEqual(status, got)
+        self.assertEqual(1, self.pool.connects)
+        self.assertEqual(1, self.server.connections)
+
+    def test_reconnects_after_server_closes(self):
+        self.start()
+        self.pool.request("GET", "/api/v1/check", timeout=5)
+        # Like an idle timeout on the server side.
+        self.pool._idle[0].sock.shutdown(2)
+        status, _ = self.pool.request("GET", "/api/v1/check?badge_id=1234", timeout=5)
+        self.assertEqual(200, status)
+        self.assertEqual(2, self.pool.connects)
+
+    def test_retry_gets_remaining_time(self):
+        self.start()
+        self.pool._idle.append(_StaleConnection(0.2))
+        timeouts = []
+        new_connection = self.pool._new_connection
+
+        def record(timeout):
+            timeouts.append(timeout)
+            return new_connection(timeout)
+
+        self.pool._new_connection = record
+        status, _ = self.pool.request("GET", "/api/v1/check?badge_id=1234", timeout=5)
+        self.assertEqual(200, status)
+        self.assertEqual(1, len(timeouts))
+        self.assertLessEqual(timeouts[0], 4.8)
+
+    def test_no_retry_after_deadline(self):
+        self.start()
+        self.pool._idle.append(_StaleConnection(0.2))
+        self.assertRaises(
+            JobTimeout,
+            self.pool.request,
+            "GET",
+            "/api/v1/check?badge_id=1234",
+            timeout=0.1,
+        )
+        self.assertEqual(0, self.pool.connects)
+
+    def test_only_idempotent_resent(self):
+        self.start()
+        self.pool._idle.append(_StaleConnection(0, sent=True))
+        self.assertRaises(
+            IOError, self.pool.request, "POST", "/api/v1/report", 5, b"{}"
+        )
+        self.assertEqual(0, self.pool.connects)
+        self.pool._idle.append(_StaleConnection(0, sent=True))
+        status, _ = self.pool.request("GET", "/api/v1/check?badge_id=1234", timeout=5)
+        self.assertEqual(200, status)
+        # Failing to send at all is safe to retry, whatever the method.
+        self.pool._idle.append(_StaleConnection(0))
+        status, _ = self.pool.request("POST", "/api/v1/report", 5, b'{"events": []}')
+        self.assertEqual(200, status)
+        self.assertEqual(2, self.pool.connects)
+
+    def test_tls_session_resumed(self):
+        server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        server_context.load_cert_chain(CERT)
+        client_context = ssl.create_default_context(cafile=CERT)
+        self.start(server_context, client_context)
+        status, _ = self.pool.request("GET", "/api/v1/check?badge_id=1234", timeout=5)
+        self.assertEqual(200, status)
+        self.assertIsNotNone(self.pool.tls_session)
+        self.pool.close()
+        status, _ = self.pool.request("GET", "/api/v1/check?badge_id=1234", timeout=5)
+        self.assertEqual(200, status)
+        self.assertEqual(2, self.pool.connects)
+        self.assertEqual(1, self.pool.tls_resumed)
@@ -0,0 +1,144 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for authbox.journal"""
+
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import authbox.config
+import authbox.journal
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, "journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_batched(self):
+        journal = authbox.journal.Journal(self.path)
+        journal.record("auth", badge_id="1234", allowed=True, source="cache")
+        journal.record("relay_on", badge_id="1234")
+        # Nothing is written until a flush.
+        self.assertEqual(0, os.path.getsize(self.path))
+        journal.flush()
+        journal.flush()
+        self.assertEqual(1, journal.batches)
+        records = list(authbox.journal.query(self.path))
+        self.assertEqual(["auth", "relay_on"], [r["event"] for r in records])
+        self.assertTrue(records[0]["allowed"])
+        self.assertLessEqual(records[0]["monotonic"], records[1]["monotonic"])
+        self.assertAlmostEqual(time.time(), records[0]["time"], delta=60)
+        journal.close()
+
+    def test_writer_thread(self):
+        journal = authbox.journal.Journal(self.path, flush_interval=0.01)
+        journal.start()
+        journal.record("abort", args=["off_button"])
+        deadline = time.time() + 5
+        while not journal.batches and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(1, len(list(authbox.journal.query(self.path))))
+        journal.close()
+
+    def test_writer_waits_for_records(self):
+        journal = authbox.journal.Journal(self.path, flush_interval=0.01)
+        flushes = []
+        flush = journal.flush
+        journal.flush = lambda: flushes.append(flush())
+        journal.start()
+        time.sleep(0.1)
+        self.assertEqual([], flushes)
+        journal.record("abort", args=["off_button"])
+        deadline = time.time() + 5
+        while not journal.batches and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(1, len(flushes))
+        journal.close()
+
+    def test_close_flushes_and_stops_writer(self):
+        journal = authbox.journal.Journal(self.path, flush_interval=60)
+        journal.start()
+        journal.record("abort", args=["off_button"])
+        start = time.time()
+        journal.close()
+        self.assertLess(time.time() - start, 30)
+        self.assertFalse(journal._writer.is_alive())
+        self.assertEqual(1, len(list(authbox.journal.query(self.path))))
+
+    def test_rotation(self):
+        journal = authbox.journal.Journal(self.path, max_size=200, keep=2)
+        for i in range(10):
+            journal.record("badge_scan", args=[str(i)])
+            journal.flush()
+        self.assertEqual(
+            [self.path + ".2", self.path + ".1", self.path],
+            authbox.journal.journal_files(self.path),
+        )
+        self.assertFalse(os.path.exists(self.path + ".3"))
+        for name in authbox.journal.journal_files(self.path):
+            self.assertLess(os.path.getsize(name), 400)
+        # The oldest were dropped, and the rest are in order.
+        args = [r["args"][0] for r in authbox.journal.query(self.path)]
+        self.assertEqual([str(i) for i in range(10 - len(args), 10)], args)
+        journal.close()
+
+    def test_query(self):
+        journal = authbox.journal.Journal(self.path)
+        journal.record("badge_scan", args=["1234"])
+        journal.record("badge_scan", args=["12345"])
+        journal.record("auth", badge_id="1234", allowed=False, source="command")
+        journal.record("on_button_down", args=["on_button"])
+        journal.flush()
+        # Damaged lines are skipped.
+        with open(self.path, "a") as f:
+            f.write('{"event": "trunc')
+        journal.close()
+
+        records = list(authbox.journal.query(self.path, badge_id="1234"))
+        self.assertEqual(["badge_scan", "auth"], [r["event"] for r in records])
+        now = time.time()
+        recent = list(authbox.journal.query(self.path, since=now - 60))
+        self.assertEqual(4, len(recent))
+        self.assertEqual([], list(authbox.journal.query(self.path, since=now + 60)))
+        self.assertEqual([], list(authbox.journal.query(self.path, until=now - 60)))
+
+    def test_main(self):
+        journal = authbox.journal.Journal(self.path)
+        journal.record("auth", badge_id="1234", allowed=True, source="acl")
+        journal.close()
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            authbox.journal.main(
+                [self.path, "--badge", "1234", "--since", "2018-01-01"]
+            )
+        self.assertIn("auth allowed=True badge_id=1234 source=acl", out.getvalue())
+
+    def test_from_config(self):
+        config = authbox.config.Config(None)
+        self.assertIsNone(authbox.journal.Journal.from_config(config))
+        config._config.add_section("journal")
+        config._config.set("journal", "path", self.path)
+        config._config.set("journal", "flush_interval", "2s")
+        journal = authbox.journal.Journal.from_config(config)
+        self.assertEqual(2, journal.flush_interval)
+        journal.close()
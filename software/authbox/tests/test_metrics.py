@@ -0,0 +1,69 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for authbox.metrics"""
+
+import timeit
+import unittest
+
+import authbox.metrics
+
+
+class HistogramTest(unittest.TestCase):
+    def setUp(self):
+        self.h = authbox.metrics.Histogram()
+
+    def test_empty(self):
+        self.assertEqual(
+            {"count": 0, "p50": 0.0, "p99": 0.0, "max": 0.0}, self.h.summary()
+        )
+
+    def test_percentiles(self):
+        # 1ms..100ms
+        for i in range(1, 101):
+            self.h.record(i / 1000.0)
+        summary = self.h.summary()
+        self.assertEqual(100, summary["count"])
+        self.assertEqual(0.1, summary["max"])
+        # Upper bounds, accurate to a quarter octave.
+        self.assertGreaterEqual(summary["p50"], 0.050)
+        self.assertLess(summary["p50"], 0.050 * 1.2)
+        self.assertGreaterEqual(summary["p99"], 0.099)
+        self.assertLessEqual(summary["p99"], 0.1)
+
+    def test_extremes(self):
+        self.h.record(0)
+        self.h.record(1e-9)
+        self.h.record(1e9)
+        self.assertEqual(3, self.h.count)
+        self.assertEqual(1e9, self.h.percentile(100))
+        self.assertEqual(1e-6, self.h.percentile(50))
+
+    def test_record_is_cheap(self):
+        # Generous, but catches accidentally doing something per-bucket.
+        per_call = timeit.timeit(lambda: self.h.record(0.0123), number=10000) / 10000
+        self.assertLess(per_call, 20e-6)
+
+
+class FormatStatsTest(unittest.TestCase):
+    def test_format(self):
+        fast = authbox.metrics.HandlerStats("fast")
+        fast.record(0.001, 0.001)
+        slow = authbox.metrics.HandlerStats("slow")
+        slow.record(0.001, 2.5)
+        lines = authbox.metrics.format_stats([fast, slow]).splitlines()
+        self.assertEqual(3, len(lines))
+        self.assertTrue(lines[0].startswith("handler"))
+        self.assertTrue(lines[1].startswith("slow"))
+        self.assertIn("2500.0ms", lines[1])
@@ -0,0 +1,221 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for authbox.reporting"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import authbox.auth
+import authbox.config
+import authbox.reporting
+from authbox.fake_auth_server_for_testing import FakeAuthServer
+
+
+class FakeSender(object):
+    def __init__(self, fail=0):
+        self.batches = []
+        self.fail = fail
+        self.delivered = threading.Event()
+
+    def __call__(self, events):
+        if self.fail:
+            self.fail -= 1
+            raise IOError("unreachable")
+        badge_ids = [e["badge_id"] for e in events]
+        if "bad" in badge_ids:
+            # Delivers the ones before it, like BackendSender.
+            if badge_ids[0] == "bad":
+                raise authbox.reporting.RejectedEvents(1, "bad badge")
+            events = events[: badge_ids.index("bad")]
+        self.batches.append([e["badge_id"] for e in events])
+        return len(events)
+
+
+class SessionReporterTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "sessions.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def make(self, send, path=None, **kwargs):
+        reporter = authbox.reporting.SessionReporter(path, send, **kwargs)
+        reporter._uploader.retry_delay = 0.01
+        return reporter
+
+    def test_batches(self):
+        send = FakeSender()
+        reporter = self.make(send, batch_size=2, fields={"tool": "Laser"})
+        for badge_id in "123":
+            event = reporter.record("cancel", badge_id)
+        self.assertEqual("Laser", event["tool"])
+        self.assertEqual(3, event["seq"])
+        reporter.start()
+        self.assertTrue(reporter.wait_until_delivered(5))
+        self.assertEqual([["1", "2"], ["3"]], send.batches)
+        self.assertEqual(3, reporter.delivered)
+
+    def test_retry(self):
+        send = FakeSender(fail=2)
+        reporter = self.make(send)
+        reporter.record("cancel", "1")
+        reporter.start()
+        self.assertTrue(reporter.wait_until_delivered(5))
+        self.assertEqual([["1"]], send.batches)
+        self.assertEqual(2, reporter.failures)
+
+    def test_rejected_set_aside(self):
+        send = FakeSender()
+        reporter = self.make(send, self.path)
+        for badge_id in ("1", "bad", "2"):
+            reporter.record("cancel", badge_id)
+        reporter.start()
+        self.assertTrue(reporter.wait_until_delivered(5))
+        self.assertEqual([["1"], ["2"]], send.batches)
+        self.assertEqual(2, reporter.delivered)
+        self.assertEqual(1, reporter.rejected)
+        self.assertEqual(0, reporter.failures)
+        with open(self.path + ".rejected") as f:
+            self.assertEqual(["bad"], [json.loads(line)["badge_id"] for line in f])
+        # Not sent again after a restart.
+        self.assertEqual(0, self.make(FakeSender(), self.path).pending())
+
+    def test_survives_restart(self):
+        reporter = self.make(FakeSender(), self.path)
+        reporter.record("extend", "1")
+        reporter.record("cancel", "1")
+        # Never started, as if the box lost power; plus a torn write.
+        with open(self.path, "a") as f:
+            f.write('{"seq": 3, "sta')
+        send = FakeSender()
+        reporter = self.make(send, self.path)
+        self.assertEqual(2, reporter.pending())
+        reporter.start()
+        self.assertTrue(reporter.wait_until_delivered(5))
+        self.assertEqual([["1", "1"]], send.batches)
+        # Delivered events aren't sent again, and numbering carries on.
+        reporter = self.make(FakeSender(), self.path)
+        self.assertEqual(0, reporter.pending())
+        self.assertEqual(3, reporter.record("cancel", "2")["seq"])
+
+    def test_compaction(self):
+        old_size = authbox.reporting.COMPACT_SIZE
+        authbox.reporting.COMPACT_SIZE = 100
+        try:
+            reporter = self.make(FakeSender(), self.path)
+            for i in range(5):
+                reporter.record("cancel", str(i))
+            reporter.start()
+            self.assertTrue(reporter.wait_until_delivered(5))
+        finally:
+            authbox.reporting.COMPACT_SIZE = old_size
+        self.assertEqual(0, os.path.getsize(self.path))
+        reporter.record("cancel", "5")
+        self.assertTrue(reporter.wait_until_delivered(5))
+        reporter = self.make(FakeSender(), self.path)
+        self.assertEqual(0, reporter.pending())
+        self.assertEqual(7, reporter.record("cancel", "6")["seq"])
+
+    def test_backend_sender_partial(self):
+        class Backend(authbox.auth.AuthBackend):
+            def __init__(self):
+                self.calls = []
+
+            def authorize(self, badge_id, state, timeout):
+                if badge_id == "bad":
+                    raise IOError("unreachable")
+                self.calls.append((badge_id, state))
+                return False
+
+        backend = Backend()
+        send = authbox.reporting.BackendSender(backend, 1)
+        events = [
+            {"badge_id": "1", "state": "cancel"},
+            {"badge_id": "bad", "state": "cancel"},
+        ]
+        self.assertEqual(1, send(events))
+        self.assertRaises(IOError, send, events[1:])
+        self.assertEqual([("1", "cancel")], backend.calls)
+
+    def test_backend_sender_classifies_errors(self):
+        config = authbox.config.Config(None)
+        config._config.add_section("auth")
+        config._config.set("auth", "command", "true")
+        config._config.set("auth", "deauth_command", "true")
+        send = authbox.reporting.BackendSender(authbox.auth.CommandBackend(config), 1)
+        self.assertEqual(1, send([{"badge_id": "1", "state": "cancel"}]))
+        # No extend_command, so extend events are skipped.
+        events = [
+            {"badge_id": "1", "state": "extend"},
+            {"badge_id": "1", "state": "cancel"},
+        ]
+        self.assertEqual(2, send(events))
+
+        class Backend(authbox.auth.AuthBackend):
+            answer = None
+
+            def authorize(self, badge_id, state, timeout):
+                if isinstance(self.answer, Exception):
+                    raise self.answer
+                return self.answer
+
+        backend = Backend()
+        send = authbox.reporting.BackendSender(backend, 1)
+        # No answer is retried.
+        self.assertRaises(authbox.auth.NoAnswer, send, events)
+        backend.answer = ValueError("bad template")
+        with self.assertRaises(authbox.reporting.RejectedEvents) as cm:
+            send(events)
+        self.assertEqual(1, cm.exception.count)
+
+    def test_from_config_checks_backend(self):
+        config = authbox.config.Config(None)
+        config._config.add_section("auth")
+        config._config.set("auth", "command", "true")
+        # Like a config from before reporting: no extend or deauth commands.
+        backend = authbox.auth.CommandBackend(config)
+        authbox.reporting.SessionReporter.from_config(config, backend)
+        # But an explicit target has to be usable.
+        config._config.add_section("reporting")
+        config._config.set("reporting", "url", "localhost:8080/report")
+        self.assertRaises(
+            ValueError, authbox.reporting.SessionReporter.from_config, config, backend
+        )
+
+    def test_http_batches_deduped(self):
+        server = FakeAuthServer()
+        server.start()
+        try:
+            send = authbox.reporting.HttpBatchSender(
+                server.base_url + "/api/v1/report", 5
+            )
+            reporter = self.make(send)
+            event = reporter.record("cancel", "1")
+            reporter.start()
+            self.assertTrue(reporter.wait_until_delivered(5))
+            # As if the response had been lost.
+            send([event])
+            server.fail_reports = True
+            self.assertRaises(IOError, send, [event])
+            send = authbox.reporting.HttpBatchSender(server.base_url + "/wrong", 5)
+            self.assertRaises(authbox.reporting.RejectedEvents, send, [event])
+        finally:
+            server.stop()
+        self.assertEqual([event["id"]], list(server.events))
@@ -0,0 +1,129 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for authbox.sound"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import wave
+
+import authbox.config
+import authbox.sound
+
+
+def write_wav(path, frames, rate=8000, channels=1):
+    w = wave.open(path, "wb")
+    w.setsampwidth(2)
+    w.setframerate(rate)
+    w.setnchannels(channels)
+    w.writeframes(frames)
+    w.close()
+
+
+class SoundTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.out = os.path.join(self.tempdir, "out")
+        self.sad = os.path.join(self.tempdir, "sad.wav")
+        self.warning = os.path.join(self.tempdir, "warning.wav")
+        write_wav(self.sad, b"\x01\x00" * 400)
+        write_wav(self.warning, b"\x02\x00" * 400)
+        self.config = authbox.config.Config(None)
+        self.config._config.add_section("sounds")
+        self.config._config.set("sounds", "enable", "1")
+        self.config._config.set("sounds", "sad_filename", self.sad)
+        self.config._config.set("sounds", "warning_filename", self.warning)
+        self.config._config.set("sounds", "rate", "8000")
+        self.sink = None
+
+    def tearDown(self):
+        if self.sink is not None:
+            self.sink.close()
+        shutil.rmtree(self.tempdir)
+
+    def wait_for_output(self, predicate, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with open(self.out, "rb") as f:
+                data = f.read()
+            if predicate(data):
+                return data
+            time.sleep(0.01)
+        self.fail("Timed out; got %d bytes" % len(data))
+
+    def test_load_wav(self):
+        pcm = authbox.sound.load_clip(self.sad, 8000, 1)
+        self.assertEqual(b"\x01\x00" * 400, pcm)
+        self.assertRaises(ValueError, authbox.sound.load_clip, self.sad, 22050, 1)
+
+    def test_load_with_decoder(self):
+        raw = os.path.join(self.tempdir, "raw")
+        with open(raw, "wb") as f:
+            f.write(b"\x05\x00" * 10)
+        decoder = authbox.config.CommandTemplate("cat {}")
+        self.assertEqual(
+            b"\x05\x00" * 10, authbox.sound.load_clip(raw, 8000, 1, decoder)
+        )
+
+    def test_null_sink(self):
+        self.config._config.set("sounds", "enable", "0")
+        sink = authbox.sound.sink_from_config(self.config, ("sad", "warning"))
+        self.assertIsInstance(sink, authbox.sound.NullSink)
+        sink.play("sad")
+        self.assertEqual("sad", sink.playing)
+        sink.stop()
+        self.assertIsNone(sink.playing)
+        self.assertEqual(["sad"], sink.played)
+        self.assertRaises(KeyError, sink.play, "missing")
+
+    def test_command_sink(self):
+        self.config._config.set("sounds", "command", "true {}")
+        sink = authbox.sound.sink_from_config(self.config, ("sad", "warning"))
+        self.assertIsInstance(sink, authbox.sound.CommandSink)
+        self.assertEqual(["true", self.sad], sink.commands["sad"])
+
+    def test_pipe_sink(self):
+        player = "sh -c 'exec cat >> %s'" % self.out
+        self.config._config.set("sounds", "player", player)
+        open(self.out, "w").close()
+        self.sink = authbox.sound.sink_from_config(self.config, ("sad", "warning"))
+        self.assertIsInstance(self.sink, authbox.sound.PipeSink)
+        self.sink.start()
+
+        self.sink.play("sad")
+        data = self.wait_for_output(lambda d: len(d) == 800)
+        self.assertEqual(b"\x01\x00" * 400, data)
+        # Played once, then quiet.
+        deadline = time.time() + 5
+        while self.sink.playing and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(self.sink.playing)
+
+        # Looping, until replaced.
+        self.sink.play("warning", loop=True)
+        self.wait_for_output(lambda d: len(d) > 800 + 1600)
+        self.sink.play("sad")
+        self.wait_for_output(lambda d: d.endswith(b"\x01\x00" * 400))
+        self.sink.stop()
+        self.assertEqual(1, self.sink.starts)
+
+    def test_bad_wav_fails_at_startup(self):
+        self.config._config.set("sounds", "player", "cat")
+        self.config._config.set("sounds", "rate", "44100")
+        self.assertRaises(
+            ValueError, authbox.sound.sink_from_config, self.config, ("sad",)
+        )
@@ -14,6 +14,8 @@
 
 """Tests for authbox.timer"""
 
+import threading
+import time
 import unittest
 
 import setup_mock_pin_factory
@@ -25,22 +27,112 @@ from authbox.compat import queue
 class TimerTest(unittest.TestCase):
     def setUp(self):
         self.q = queue.Queue()
-        self.t = authbox.timer.Timer(self.q, "t", self.callback)
+        self.service = authbox.timer.TimerService()
+        self.t = authbox.timer.Timer(self.q, "t", self.callback, self.service)
 
     def callback(self, config_name):
         pass
 
-    def test_set_exception(self):
+    def test_set_replaces(self):
+        self.t.set(100)
         self.t.set(1)
-        with self.assertRaises(Exception):
-            self.t.set(1)
+        self.assertLessEqual(self.t.remaining(), 1)
+        self.assertEqual(1, len([e for e in self.service._heap if e[-1]]))
+
+    def test_extend(self):
+        self.assertFalse(self.t.extend(10))
+        self.assertIsNone(self.t.remaining())
+        self.t.set(10)
+        self.assertTrue(self.t.extend(5))
+        self.assertGreater(self.t.remaining(), 14)
+        self.assertLessEqual(self.t.remaining(), 15)
+
+    def test_wall_clock_jump(self):
+        real_time = time.time
+        self.t.set(60)
+        deadline = self.service._pending[self.t][authbox.timer._DEADLINE]
+        waits = []
+        self.service._changed.wait = waits.append
+        try:
+            # NTP steps the clock an hour forward, then a day back.
+            for offset in (3600, -86400):
+                time.time = lambda: real_time() + offset
+                self.service.run_inner()
+                self.assertEqual(
+                    deadline, self.service._pending[self.t][authbox.timer._DEADLINE]
+                )
+                self.assertGreater(self.t.remaining(), 59)
+                self.assertLessEqual(self.t.remaining(), 60)
+        finally:
+            time.time = real_time
+        # Neither jump fired it or changed how long the service waits.
+        self.assertTrue(self.q.empty())
+        self.assertEqual(2, len(waits))
+        for delay in waits:
+            self.assertGreater(delay, 59)
+            self.assertLessEqual(delay, 60)
 
     def test_set(self):
         self.t.set(0.001)
-        self.t.run_inner()
+        # The first pass may only sleep until the deadline.
+        self.service.run_inner()
+        self.service.run_inner()
         self.assertEqual(1, self.q.qsize())
+        self.assertEqual((self.callback, "t"), self.q.get_nowait())
+        self.assertIsNone(self.t.remaining())
 
-    def test_cancel_drains_queue(self):
-        self.t.set_queue.put(None)
+    def test_cancel(self):
+        self.t.set(0.001)
         self.t.cancel()
-        self.assertTrue(self.t.set_queue.empty())
+        self.assertIsNone(self.t.remaining())
+        # Can be set again after a cancel.
+        self.t.set(0.001)
+        self.t.cancel()
+        self.assertEqual([], [e for e in self.service._heap if e[-1]])
+
+    def test_default_service(self):
+        t = authbox.timer.Timer(self.q, "t", self.callback)
+        self.assertIs(authbox.timer.default_service(), t.service)
+
+    def test_move_to(self):
+        self.t.set(100)
+        other = authbox.timer.TimerService()
+        self.t.move_to(other)
+        self.assertIsNone(self.service.remaining(self.t))
+        self.assertGreater(other.remaining(self.t), 99)
+
+
+class TimerServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.q = queue.Queue()
+        self.service = authbox.timer.TimerService()
+
+    def test_one_thread_many_timers(self):
+        before = threading.active_count()
+        timers = [authbox.timer.Timer(self.q, i, None, self.service) for i in range(50)]
+        for t in timers:
+            t.start()
+        # Scheduled in reverse, so they need sorting.  Far enough apart that
+        # a pause between set() calls can't reorder them.
+        for i, t in enumerate(reversed(timers)):
+            t.set(0.01 * (50 - i))
+        timers[10].cancel()
+        self.assertEqual(before + 1, threading.active_count())
+        fired = [self.q.get(timeout=2)[1] for i in range(49)]
+        self.assertEqual([i for i in range(50) if i != 10], fired)
+        self.assertTrue(self.q.empty())
+
+    def test_heap_compaction(self):
+        t = authbox.timer.Timer(self.q, "t", None, self.service)
+        for i in range(1000):
+            self.service.set(t, 100)
+        self.assertLess(len(self.service._heap), 20)
+        self.assertEqual(1, len([e for e in self.service._heap if e[-1]]))
+
+    def test_earlier_deadline_wakes_service(self):
+        slow = authbox.timer.Timer(self.q, "slow", None, self.service)
+        fast = authbox.timer.Timer(self.q, "fast", None, self.service)
+        slow.set(100)
+        self.service.ensure_started()
+        fast.set(0.01)
+        self.assertEqual("fast", self.q.get(timeout=2)[1])
@@ -0,0 +1,67 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for authbox.wiegand"""
+
+import unittest
+
+from authbox import wiegand
+
+
+class WiegandTest(unittest.TestCase):
+    def test_h10301(self):
+        # Facility 1, card 1: even parity 1, odd parity 0.
+        value = int("1" "00000001" "0000000000000001" "0", 2)
+        self.assertEqual(value, wiegand.H10301.encode(1, 1))
+        self.assertEqual(("H10301", 1, 1), wiegand.decode(value, 26))
+        self.assertEqual(("H10301", 0, 0), wiegand.decode(1, 26))
+
+    def test_round_trip(self):
+        for fmt, facility, card in [
+            (wiegand.H10301, 255, 65535),
+            (wiegand.H10306, 65535, 1),
+            (wiegand.CORPORATE_1000, 4095, 1048575),
+            (wiegand.CORPORATE_1000, 1234, 567890),
+            (wiegand.H10304, 54321, 524287),
+        ]:
+            value = fmt.encode(facility, card)
+            self.assertEqual(
+                (fmt.name, facility, card), wiegand.decode(value, fmt.length)
+            )
+
+    def test_every_single_bit_error_caught(self):
+        for fmt in wiegand.FORMATS.values():
+            value = fmt.encode(100, 1000)
+            for i in range(fmt.length):
+                self.assertFalse(fmt.check(value ^ (1 << i)), (fmt.name, i))
+                self.assertRaises(
+                    wiegand.WiegandError, wiegand.decode, value ^ (1 << i), fmt.length
+                )
+
+    def test_corporate_1000_parity(self):
+        value = wiegand.CORPORATE_1000.encode(1, 1)
+        self.assertEqual(
+            "11" "000000000001" "00000000000000000001" "1",
+            wiegand.to_bits(value, 35),
+        )
+
+    def test_unknown_length(self):
+        self.assertRaises(wiegand.WiegandError, wiegand.decode, 5, 3)
+
+    def test_out_of_range(self):
+        self.assertRaises(ValueError, wiegand.H10301.encode, 256, 0)
+
+    def test_to_bits(self):
+        self.assertEqual("0101", wiegand.to_bits(5, 4))
+        self.assertEqual("", wiegand.to_bits(0, 0))
@@ -12,56 +12,183 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Abstraction around RPi.GPIO for relay type outputs.
+"""One-shot timers that deliver a callback through the event queue.
+
+All Timers share one TimerService thread (unless given another service), which
+keeps their deadlines in a heap.  Deadlines are on the monotonic clock, so
+stepping the wall clock (e.g. NTP syncing at boot) neither shortens nor
+stretches a session.
 """
 
 from __future__ import print_function
 
+import heapq
 import threading
-import time
 
 from authbox.api import BaseDerivedThread
-from authbox.compat import queue
+from authbox.compat import monotonic
 
+# Entries in TimerService._heap are lists of these, so that replaced and
+# cancelled entries can be marked dead in place and skipped when they surface.
+_DEADLINE, _SEQUENCE, _TIMER, _LIVE = range(4)
 
-class Timer(BaseDerivedThread):
-    def __init__(self, event_queue, config_name, callback):
-        super(Timer, self).__init__(event_queue, config_name)
-        self.set_queue = queue.Queue(1)
-        self.cancel_condition = threading.Condition()
-        self.callback = callback
+
+class TimerService(BaseDerivedThread):
+    """Runs the deadlines for any number of Timers from one thread.
+
+    set, cancel and replace are O(log n) in the number of pending timers.
+    """
+
+    def __init__(self, event_queue=None, config_name="timers"):
+        super(TimerService, self).__init__(event_queue, config_name)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._heap = []
+        # Timer -> its live heap entry
+        self._pending = {}
+        self._sequence = 0
+        self._start_requested = False
+
+    def ensure_started(self):
+        with self._lock:
+            if self._start_requested:
+                return
+            self._start_requested = True
+        self.start()
+
+    def set(self, timer, delay):
+        """Schedules timer to fire after delay seconds, replacing any pending."""
+        with self._lock:
+            self._remove(timer)
+            self._push(timer, monotonic() + delay)
+
+    def extend(self, timer, delta):
+        """Moves a pending timer's deadline delta seconds later.
+
+        Returns False (and does nothing) if timer isn't pending.
+        """
+        with self._lock:
+            entry = self._pending.get(timer)
+            if entry is None:
+                return False
+            self._remove(timer)
+            self._push(timer, entry[_DEADLINE] + delta)
+            return True
+
+    def _push(self, timer, deadline):
+        # Called with self._lock held.
+        self._sequence += 1
+        entry = [deadline, self._sequence, timer, True]
+        heapq.heappush(self._heap, entry)
+        self._pending[timer] = entry
+        if self._heap[0] is entry:
+            self._changed.notify()
+
+    def cancel(self, timer):
+        with self._lock:
+            self._remove(timer)
+
+    def remaining(self, timer):
+        """Returns the seconds until timer fires, or None if it isn't pending."""
+        with self._lock:
+            entry = self._pending.get(timer)
+            if entry is None:
+                return None
+            return max(0, entry[_DEADLINE] - monotonic())
+
+    def _remove(self, timer):
+        # Called with self._lock held.
+        entry = self._pending.pop(timer, None)
+        if entry is not None:
+            entry[_LIVE] = False
+            if len(self._heap) > 2 * len(self._pending) + 16:
+                # Too many dead entries; rebuild without them.
+                self._heap = [e for e in self._heap if e[_LIVE]]
+                heapq.heapify(self._heap)
 
     def run_inner(self):
-        # TODO: This is not robust to spurious wakeups, see details in
-        # https://bugs.python.org/issue1175933 that
-
-        # TODO add a KILL sentinel
-        timeout = self.set_queue.get(block=True)
-        print(self, "got", timeout)
-        with self.cancel_condition:
-            # Instead of a sleep we just pass it as a timeout here (so it's
-            # interruptable if someone sets cancel_condition)
-            t0 = time.time()
-            self.cancel_condition.wait(timeout)
-            expired = (time.time()) - t0 >= timeout
-            print(self, "expired", expired)
-            if expired:
-                # The idea here is that we call callback once per set_queue item
-                self.event_queue.put((self.callback, self.config_name))
+        """Waits for, and fires, the next timer."""
+        with self._lock:
+            while self._heap and not self._heap[0][_LIVE]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                self._changed.wait()
+                return
+            entry = self._heap[0]
+            delay = entry[_DEADLINE] - monotonic()
+            if delay > 0:
+                # Waking early (spuriously, or because the heap changed) just
+                # means we go around again and recompute from the deadline.
+                self._changed.wait(delay)
+                return
+            heapq.heappop(self._heap)
+            del self._pending[entry[_TIMER]]
+        entry[_TIMER].fire()
+
+
+_default_service = None
+_default_service_lock = threading.Lock()
+
+
+def default_service():
+    """Returns the TimerService shared by Timers that weren't given one."""
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            _default_service = TimerService()
+        return _default_service
+
+
+class Timer(object):
+    """A one-shot timer; when it expires, callback(config_name) is queued.
+
+    This is a handle onto a TimerService, and has no thread of its own.  Like
+    the other peripherals it does need to be started, typically by being in
+    BaseDispatcher.threads.
+    """
+
+    def __init__(self, event_queue, config_name, callback, service=None):
+        self.event_queue = event_queue
+        self.config_name = config_name
+        self.callback = callback
+        self.service = service or default_service()
+
+    def __repr__(self):
+        return "<Timer %s>" % (self.config_name,)
+
+    def start(self):
+        self.service.ensure_started()
 
     def set(self, delay):
-        # TODO this should replace
-        try:
-            self.set_queue.put_nowait(delay)
-        except queue.Full:
-            raise Exception("There is already a queued timeout")
+        """Fires after delay seconds, replacing any pending deadline."""
+        print(self, "set", delay)
+        self.service.set(self, delay)
+
+    def extend(self, delta):
+        """Pushes the pending deadline back by delta seconds.
+
+        Returns False if the timer wasn't set (or already fired).
+        """
+        print(self, "extend", delta)
+        return self.service.extend(self, delta)
 
     def cancel(self):
         print(self, "cancel")
-        with self.cancel_condition:
-            self.cancel_condition.notify()
-        try:
-            while True:
-                self.set_queue.get_nowait()
-        except queue.Empty:
-            pass
+        self.service.cancel(self)
+
+    def remaining(self):
+        """Seconds until this fires, or None if it isn't set."""
+        return self.service.remaining(self)
+
+    def fire(self):
+        # Called by the service; the idea is that we call callback once per set.
+        print(self, "expired")
+        self.event_queue.put((self.callback, self.config_name))
+
+    def move_to(self, service):
+        """Switches services, keeping any pending deadline."""
+        remaining = self.service.remaining(self)
+        self.service.cancel(self)
+        self.service = service
+        if remaining is not None:
+            service.set(self, remaining)
@@ -0,0 +1,152 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Parity checking and decoding of common Wiegand card formats.
+
+A frame is an int holding the bits in the order they arrived (the first bit is
+the most significant), plus its length.  Bit positions below are numbered from
+1 at the first bit, as in the format specs.
+"""
+
+import collections
+
+Credential = collections.namedtuple("Credential", "format facility card")
+
+
+class WiegandError(ValueError):
+    """A frame of unknown length, or with bad parity."""
+
+
+def _ones(value):
+    return bin(value).count("1")
+
+
+class WiegandFormat(object):
+    def __init__(self, name, length, facility, card, parity):
+        """facility and card are (first, last) positions, or None.
+
+        parity is a list of ("even" or "odd", parity bit position, [positions
+        it covers]).  A bit that covers other parity bits must come after them.
+        """
+        self.name = name
+        self.length = length
+        self._facility = self._field(facility)
+        self._card = self._field(card)
+        self._parity = [
+            (kind == "odd", self._mask([position]), self._mask(covered))
+            for kind, position, covered in parity
+        ]
+
+    def _mask(self, positions):
+        return sum(1 << (self.length - p) for p in positions)
+
+    def _field(self, span):
+        if span is None:
+            return None
+        first, last = span
+        # (shift, mask)
+        return self.length - last, (1 << (last - first + 1)) - 1
+
+    def check(self, value):
+        """Returns whether every parity bit in value is right."""
+        for odd, bit, covered in self._parity:
+            if _ones(value & (bit | covered)) % 2 != odd:
+                return False
+        return True
+
+    def decode(self, value):
+        if not self.check(value):
+            raise WiegandError("Bad parity", self.name, value)
+        return Credential(
+            self.name, self._get(self._facility, value), self._get(self._card, value)
+        )
+
+    def encode(self, facility, card):
+        """Returns the frame for facility and card, with parity set."""
+        value = self._put(self._facility, facility) | self._put(self._card, card)
+        for odd, bit, covered in self._parity:
+            if _ones(value & covered) % 2 != odd:
+                value |= bit
+        return value
+
+    @staticmethod
+    def _get(field, value):
+        if field is None:
+            return None
+        shift, mask = field
+        return (value >> shift) & mask
+
+    @staticmethod
+    def _put(field, number):
+        if field is None:
+            return 0
+        shift, mask = field
+        if not 0 <= number <= mask:
+            raise ValueError("Out of range", number)
+        return number << shift
+
+
+def _span(first, last, skip=None):
+    return [p for p in range(first, last + 1) if skip is None or not skip(p)]
+
+
+H10301 = WiegandFormat(
+    "H10301",
+    26,
+    (2, 9),
+    (10, 25),
+    [("even", 1, _span(2, 13)), ("odd", 26, _span(14, 25))],
+)
+H10306 = WiegandFormat(
+    "H10306",
+    34,
+    (2, 17),
+    (18, 33),
+    [("even", 1, _span(2, 17)), ("odd", 34, _span(18, 33))],
+)
+CORPORATE_1000 = WiegandFormat(
+    "C1000",
+    35,
+    (3, 14),
+    (15, 34),
+    [
+        ("even", 2, _span(3, 34, lambda p: p % 3 == 2)),
+        ("odd", 35, _span(2, 33, lambda p: p % 3 == 1)),
+        # Covers the other two parity bits, so it goes last.
+        ("odd", 1, _span(2, 35)),
+    ],
+)
+H10304 = WiegandFormat(
+    "H10304",
+    37,
+    (2, 17),
+    (18, 36),
+    [("even", 1, _span(2, 19)), ("odd", 37, _span(19, 36))],
+)
+
+# By length; each length has one well-known format.
+FORMATS = dict((f.length, f) for f in (H10301, H10306, CORPORATE_1000, H10304))
+
+
+def decode(value, length):
+    """Returns the Credential in a frame; raises WiegandError if it's unusable."""
+    fmt = FORMATS.get(length)
+    if fmt is None:
+        raise WiegandError("Unknown format", length)
+    return fmt.decode(value)
+
+
+def to_bits(value, length):
+    """Returns the frame as a string of 0's and 1's."""
+    return format(value, "0%db" % length) if length else ""
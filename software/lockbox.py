@@ -22,54 +22,55 @@ from __future__ import print_function
 import atexit
 import os
 import sys
-import subprocess
-import shlex
 
-from authbox.api import BaseDispatcher
+from authbox.acl_sync import AclSync
+from authbox.api import BaseDispatcher, DROP_OLDEST, PRIORITY_SAFETY
+from authbox.auth import ScanChecker
 from authbox.config import Config
 from authbox.timer import Timer
 
-DEVNULL = open('/dev/null', 'r+')
-
 class Dispatcher(BaseDispatcher):
   def __init__(self, config):
     super(Dispatcher, self).__init__(config)
 
+    # Relay-off must not wait behind queued badge scans.
+    self.event_queue.set_priority(self.disable, PRIORITY_SAFETY)
+    # If scans pile up, only the most recent ones matter.
+    self.event_queue.set_policy(self.badge_scan, DROP_OLDEST, limit=4)
     self.load_config_object('badge_reader', on_scan=self.badge_scan)
     self.load_config_object('output_relay')
 
     self.disable_timer = Timer(self.event_queue, 'disable_timer', self.disable)
     # Otherwise, start them manually!
     self.threads.extend([self.disable_timer])
+    # Asks the cache, ACL and [auth] backend about scans; see authbox.auth.
+    self.scan_checker = ScanChecker(
+        config, self.workers, self.auth_answered, self.journal)
+    self.auth_cache = self.scan_checker.auth_cache
+    self.local_acl = self.scan_checker.local_acl
+    self.auth_backend = self.scan_checker.backend
+    # Optionally keeps the ACL up to date in the background; see [acl_sync].
+    self.acl_sync = AclSync.from_config(config, self.local_acl, self.auth_cache)
+    if self.acl_sync is not None:
+      self.threads.append(self.acl_sync)
 
 
-  def _get_command_line(self, section, key, format_args):
-    """Constructs a command line, safely.
-
-    The value can contain {key}, {}, and {5} style interpolation:
-      - {key} will be resolved in the config.get; those are considered safe and
-        spaces will separate args.
-      - {} works on each arg independently (probably not what you want).
-      - {5} works fine.
-    """
-    value = self.config.get(section, key)
-    pieces = shlex.split(value)
-    return [p.format(*format_args) for p in pieces]
-
   def badge_scan(self, badge_id):
-    # Malicious badge "numbers" that contain spaces require this extra work.
-    command = self._get_command_line('auth', 'command', [badge_id])
-    # TODO timeout
     # TODO test with missing command
-    rc = subprocess.call(command)
+    # The backend is asked on a worker thread so that the relay can still be
+    # turned off meanwhile; the answer comes to auth_answered.
+    self.scan_checker.check(badge_id)
 
-    if rc == 0:
+  def auth_answered(self, badge_id, authorized):
+    if authorized:
       self.disable_timer.cancel()
       self.output_relay.on()
+      self.audit('relay_on', badge_id=badge_id)
       self.disable_timer.set(self.config.get_int_seconds('auth', 'duration', '1s'))
 
   def disable(self, source=None):
     self.output_relay.off()
+    self.audit('relay_off')
 
 def main(args):
   if not args:
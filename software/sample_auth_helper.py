@@ -0,0 +1,54 @@
+#!/usr/bin/python
+#
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Sample helper for [auth] backend = coprocess.
+
+Like sample_auth_check.sh, this allows badges that are a line in
+authorized.txt and logs every request to log.txt, but it's started once and
+then answers one JSON request per line on stdin.  Usage:
+
+  sample_auth_helper.py <tool>
+"""
+from __future__ import print_function
+
+import datetime
+import json
+import sys
+
+
+def load_authorized(filename):
+  try:
+    with open(filename) as f:
+      return set(line.strip() for line in f if line.strip())
+  except IOError:
+    return set()
+
+
+def main(args):
+  tool = args[0] if args else ''
+  for line in iter(sys.stdin.readline, ''):
+    request = json.loads(line)
+    with open('log.txt', 'a') as log:
+      log.write('%s,%s,%s,%s,%s\n' % (
+          datetime.datetime.now(), request.get('badge_id'), tool,
+          request.get('state'), request.get('auth_minutes', '')))
+    # Re-read each time so edits take effect without a restart.
+    allowed = request.get('badge_id') in load_authorized('authorized.txt')
+    print(json.dumps({'id': request['id'], 'allowed': allowed}))
+    sys.stdout.flush()
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -25,6 +25,7 @@ from gpiozero.pins.mock import MockFactory
 
 import two_button
 
+import authbox.acl
 import authbox.api
 import authbox.badgereader_hid_keystroking
 from authbox import fake_gpio_for_testing
@@ -60,12 +61,20 @@ class SimpleDispatcherTest(unittest.TestCase):
     authbox.badgereader_hid_keystroking.evdev.list_devices = fake_evdev_device_for_testing.list_devices
     authbox.badgereader_hid_keystroking.evdev.InputDevice = fake_evdev_device_for_testing.InputDevice
 
+    self.dispatcher = self.make_dispatcher(SAMPLE_CONFIG)
+
+  def make_dispatcher(self, config_bytes):
     with tempfile.NamedTemporaryFile() as f:
-      f.write(SAMPLE_CONFIG)
+      f.write(config_bytes)
       f.flush()
       config = authbox.config.Config(f.name)
 
-    self.dispatcher = two_button.Dispatcher(config)
+    return two_button.Dispatcher(config)
+
+  def dispatch_one(self):
+    """Runs the next event, e.g. the result of the auth command."""
+    item = self.dispatcher.event_queue.get(timeout=5)
+    self.dispatcher._dispatch(item)
 
   def is_relay_on(self):
     relay = getattr(self.dispatcher, "enable_output")
@@ -78,13 +87,103 @@ class SimpleDispatcherTest(unittest.TestCase):
     # Badge scan sets authorized flag, but doesn't enable relay until button
     # press.
     self.dispatcher.badge_scan('1234')
+    self.dispatch_one()
     self.assertTrue(self.dispatcher.authorized)
     self.assertFalse(self.is_relay_on())
     # "On" button pressed
     self.dispatcher.on_button_down(None)
     self.assertTrue(self.dispatcher.authorized)
     self.assertTrue(self.is_relay_on())
+    # "On" pressed again extends the session
+    self.dispatcher.on_button_down(None)
     # "Off" button pressed
     self.dispatcher.abort(None)
     self.assertFalse(self.dispatcher.authorized)
     self.assertFalse(self.is_relay_on())
+    # Reported in the background
+    self.assertEqual(2, self.dispatcher.reporter.pending())
+
+  def test_abort_during_scan(self):
+    self.dispatcher.badge_scan('1234')
+    # "Off" pressed while the auth command is still running; its result
+    # shouldn't authorize anyone.
+    self.dispatcher.abort(None)
+    self.dispatch_one()
+    self.assertFalse(self.dispatcher.authorized)
+
+  def test_auth_timeout(self):
+    config = SAMPLE_CONFIG.replace(b'command = touch enabled', b'command = sleep 10')
+    config = config.replace(b'[auth]', b'[auth]\ntimeout=0.1s')
+    config += b'[sounds]\nenable=0\n'
+    Device.pin_factory = MockFactory()
+    self.dispatcher = self.make_dispatcher(config)
+    t0 = time.time()
+    self.dispatcher.badge_scan('1234')
+    self.dispatch_one()
+    self.assertLess(time.time() - t0, 5)
+    self.assertFalse(self.dispatcher.authorized)
+    self.assertEqual(['sad'], self.dispatcher.sounds.played)
+
+  def test_cached_answer(self):
+    config = SAMPLE_CONFIG.replace(b'[auth]', b'[auth]\ncache_ttl=1m')
+    Device.pin_factory = MockFactory()
+    self.dispatcher = self.make_dispatcher(config)
+    self.dispatcher.badge_scan('1234')
+    self.dispatch_one()
+    self.assertTrue(self.dispatcher.authorized)
+    self.dispatcher.abort(None)
+    # The second scan is answered without running the command.
+    self.dispatcher.badge_scan('1234')
+    self.assertIsNone(self.dispatcher.scan_checker.pending)
+    self.assertTrue(self.dispatcher.authorized)
+    self.assertEqual(1, self.dispatcher.auth_cache.hits)
+
+  def test_offline_acl(self):
+    with tempfile.NamedTemporaryFile(suffix='.acl') as f:
+      authbox.acl.build(f.name, [('1234', ['Laser'])])
+      config = SAMPLE_CONFIG.replace(
+          b'[auth]', b'[auth]\ntool=Laser\nacl_mode=only\nacl=' + f.name.encode())
+      config += b'[sounds]\nenable=0\n'
+      Device.pin_factory = MockFactory()
+      self.dispatcher = self.make_dispatcher(config)
+    self.dispatcher.badge_scan('5678')
+    self.assertFalse(self.dispatcher.authorized)
+    self.dispatcher.badge_scan('1234')
+    self.assertIsNone(self.dispatcher.scan_checker.pending)
+    self.assertTrue(self.dispatcher.authorized)
+
+  def test_hedged_fallback_to_cache(self):
+    config = SAMPLE_CONFIG.replace(b'command = touch enabled', b'command = sleep 10')
+    config = config.replace(
+        b'[auth]',
+        b'[auth]\nbackends=command, cache\nhedge_delay=0.05s\nstale_cache_ttl=1h')
+    Device.pin_factory = MockFactory()
+    self.dispatcher = self.make_dispatcher(config)
+    self.dispatcher.auth_cache.put('1234', True)
+    t0 = time.time()
+    self.dispatcher.badge_scan('1234')
+    self.dispatch_one()
+    self.assertLess(time.time() - t0, 5)
+    self.assertTrue(self.dispatcher.authorized)
+    # A stale answer isn't made fresh again by being used.
+    self.assertIsNone(self.dispatcher.auth_cache.get('1234'))
+
+  def test_hedged_fallback_to_acl(self):
+    with tempfile.NamedTemporaryFile(suffix='.acl') as f:
+      authbox.acl.build(f.name, [('1234', ['Laser'])])
+      config = SAMPLE_CONFIG.replace(
+          b'command = touch enabled', b'command = sleep 10')
+      config = config.replace(
+          b'[auth]',
+          b'[auth]\ntool=Laser\nbackends=command, acl\nhedge_delay=0.05s\nacl='
+          + f.name.encode())
+      Device.pin_factory = MockFactory()
+      self.dispatcher = self.make_dispatcher(config)
+    # Asked after the command, not before it.
+    self.dispatcher.badge_scan('1234')
+    self.assertIsNotNone(self.dispatcher.scan_checker.pending)
+    self.assertFalse(self.dispatcher.authorized)
+    t0 = time.time()
+    self.dispatch_one()
+    self.assertLess(time.time() - t0, 5)
+    self.assertTrue(self.dispatcher.authorized)
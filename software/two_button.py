@@ -22,20 +22,29 @@ from __future__ import print_function
 import atexit
 import os
 import sys
-import subprocess
-import shlex
 
-from authbox.api import BaseDispatcher
+from authbox.acl_sync import AclSync
+from authbox.api import BaseDispatcher, COALESCE, DROP_OLDEST, PRIORITY_SAFETY
+from authbox.auth import STATE_CANCEL, STATE_EXTEND, ScanChecker
 from authbox.config import Config
+from authbox.reporting import SessionReporter
+from authbox.sound import sink_from_config
 from authbox.timer import Timer
 
-DEVNULL = open('/dev/null', 'r+')
 
 class Dispatcher(BaseDispatcher):
   def __init__(self, config):
     super(Dispatcher, self).__init__(config)
 
     self.authorized = False
+    self.badge_id = None
+    # Relay-off must not wait behind queued badge scans.
+    self.event_queue.set_priority(self.abort, PRIORITY_SAFETY)
+    # A chattering button only needs to be handled once, and if scans pile up
+    # only the most recent ones matter.
+    self.event_queue.set_policy(self.abort, COALESCE)
+    self.event_queue.set_policy(self.on_button_down, COALESCE)
+    self.event_queue.set_policy(self.badge_scan, DROP_OLDEST, limit=4)
     self.load_config_object('on_button', on_down=self.on_button_down)
     self.load_config_object('off_button', on_down=self.abort)
     self.load_config_object('badge_reader', on_scan=self.badge_scan)
@@ -47,28 +56,31 @@ class Dispatcher(BaseDispatcher):
     # Otherwise, start them manually!
     self.threads.extend([self.warning_timer, self.expire_timer, self.expecting_press_timer])
 
-    self.noise = None
-
-  def _get_command_line(self, section, key, format_args):
-    """Constructs a command line, safely.
-
-    The value can contain {key}, {}, and {5} style interpolation:
-      - {key} will be resolved in the config.get; those are considered safe and
-        spaces will separate args.
-      - {} works on each arg independently (probably not what you want).
-      - {5} works fine.
-    """
-    value = self.config.get(section, key)
-    pieces = shlex.split(value)
-    return [p.format(*format_args) for p in pieces]
+    # Plays sad_filename and warning_filename from [sounds], if enabled.
+    self.sounds = sink_from_config(config, ('sad', 'warning'))
+    self.threads.append(self.sounds)
+    # Asks the cache, ACL and [auth] backend about scans; see authbox.auth.
+    self.scan_checker = ScanChecker(
+        config, self.workers, self.auth_answered, self.journal)
+    self.auth_cache = self.scan_checker.auth_cache
+    self.local_acl = self.scan_checker.local_acl
+    self.auth_backend = self.scan_checker.backend
+    # Optionally keeps the ACL up to date in the background; see [acl_sync].
+    self.acl_sync = AclSync.from_config(config, self.local_acl, self.auth_cache)
+    if self.acl_sync is not None:
+      self.threads.append(self.acl_sync)
+    # Extend and cancel events, written to disk and sent in the background.
+    self.reporter = SessionReporter.from_config(config, self.auth_backend)
+    self.threads.append(self.reporter)
 
   def badge_scan(self, badge_id):
-    # Malicious badge "numbers" that contain spaces require this extra work.
-    command = self._get_command_line('auth', 'command', [badge_id])
-    # TODO timeout
     # TODO test with missing command
-    rc = subprocess.call(command)
-    if rc == 0:
+    # The backend is asked on a worker thread so that buttons and timers (abort
+    # in particular) keep working meanwhile; the answer comes to auth_answered.
+    self.scan_checker.check(badge_id)
+
+  def auth_answered(self, badge_id, authorized):
+    if authorized:
       self.buzzer.beep()
       self.authorized = True
       self.badge_id = badge_id
@@ -77,45 +89,41 @@ class Dispatcher(BaseDispatcher):
     else:
       self.off_button.blink(1)
       self.buzzer.beep()
-      if self.noise:
-        self.noise.kill()
-      if self.config.get('sounds', 'enable') == '1':
-        sound_command = self._get_command_line('sounds', 'command', [self.config.get('sounds', 'sad_filename')])
-        self.noise = subprocess.Popen(sound_command, stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL)
+      self.sounds.play('sad')
 
   def on_button_down(self, source):
     print("Button down", source)
     if not self.authorized:
       self.off_button.blink(1)
       self.buzzer.beep()
-      if self.noise:
-        self.noise.kill()
-      if self.config.get('sounds', 'enable') == '1':
-        sound_command = self._get_command_line('sounds', 'command', [self.config.get('sounds', 'sad_filename')])
-        self.noise = subprocess.Popen(sound_command, stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL)
+      self.sounds.play('sad')
       return
     self.expecting_press_timer.cancel()
+    if self.expire_timer.remaining() is not None:
+      # Already enabled, so this is extending the session.
+      self.reporter.record(STATE_EXTEND, self.badge_id)
     self.on_button.on()
     self.enable_output.on()
+    self.audit('relay_on', badge_id=self.badge_id)
     self.buzzer.off()
     self.warning_timer.cancel()
     self.expire_timer.cancel()
-    # TODO use extend time if we were already enabled, and run its command for
-    # logging.
+    # TODO use extend time if we were already enabled.
     # N.b. Duration (or extend) includes the warning time.
     self.warning_timer.set(self.config.get_int_seconds('auth', 'duration', '5m') -
                            self.config.get_int_seconds('auth', 'warning', '10s'))
     self.expire_timer.set(self.config.get_int_seconds('auth', 'duration', '5m'))
-    if self.noise:
-      self.noise.kill()
-      self.noise = None
+    self.sounds.stop()
 
   def abort(self, source):
     print("Abort", source)
     self.enable_output.off()
+    self.audit('relay_off', badge_id=self.badge_id)
+    # An answer still on its way shouldn't authorize anyone.
+    self.scan_checker.cancel()
     if self.authorized:
-      command = self._get_command_line('auth', 'deauth_command', [self.badge_id])
-      subprocess.call(command)
+      # Sent in the background, so turning off never waits on the network.
+      self.reporter.record(STATE_CANCEL, self.badge_id)
     self.off_button.blink(1)
     self.buzzer.beep()
     self.authorized = False
@@ -124,15 +132,12 @@ class Dispatcher(BaseDispatcher):
     self.expire_timer.cancel()
     self.on_button.off()
     self.buzzer.off()
-    if self.noise:
-      self.noise.kill()
-      self.noise = None
+    self.sounds.stop()
 
   def warning(self, unused_source):
     self.buzzer.beepbeep()
-    if self.config.get('sounds', 'enable') == '1':
-      sound_command = self._get_command_line('sounds', 'command', [self.config.get('sounds', 'warning_filename')])
-      self.noise = subprocess.Popen(shlex.split(sound_command), stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL)
+    # Until the session is extended or ends.
+    self.sounds.play('warning', loop=True)
     self.on_button.blink()
 
 